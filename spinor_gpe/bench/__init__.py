@@ -0,0 +1,18 @@
+"""Benchmark suite of the spinor_gpe package.
+
+Times the hot paths of a propagation, i.e. the FFTs, Hadamard products,
+normalization, ``full_step``, compiled loops, and snapshot I/O, over
+configurable grids, dtypes, and batch sizes. Each run is saved to a
+versioned results store, and runs can be compared to flag regressions:
+
+.. code-block:: console
+
+    $ python -m spinor_gpe.bench run --cases fft full_step --label main
+    $ python -m spinor_gpe.bench run --cases fft full_step --label branch
+    $ python -m spinor_gpe.bench compare main branch
+    $ python -m spinor_gpe.bench roofline branch
+
+See ``cases`` for the benchmarks, ``store`` for the results store,
+``roofline`` for the throughput model, and ``cli`` for the command line
+interface.
+"""
@@ -0,0 +1,6 @@
+"""Run the benchmark command line interface; see ``cli``."""
+import sys
+
+from spinor_gpe.bench import cli
+
+sys.exit(cli.main())
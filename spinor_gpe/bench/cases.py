@@ -0,0 +1,219 @@
+"""cases.py module.
+
+The benchmark cases and the timing of their calls.
+
+A case sets up a callable for a given grid, dtype, and batch size, with
+the same physical parameters as the original benchmark scripts: 100
+Rubidium-87 atoms in a (50, 50, 2000) Hz trap on an (8, 8) grid, with
+Raman coupling. Each call is timed until its result is ready, and
+``run_case`` reports the median and the median absolute deviation of the
+calls, the throughput in grid points per second, and the operations and
+bytes of a call from the model of ``roofline``.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+import jax
+import numpy as np
+
+from spinor_gpe.pspinor import pspinor
+from spinor_gpe.pspinor import sampling
+from spinor_gpe.pspinor import tensor_propagator as tprop
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import batch_propagator as bprop
+from spinor_gpe.bench import roofline
+
+#: The default grids, (Nx, Ny).
+GRIDS = ((64, 64), (128, 128), (256, 256), (512, 512))
+#: The wavefunction dtypes, and the propagation precision of each.
+DTYPES = {'complex64': 'single', 'complex128': 'double'}
+#: The number of steps of a compiled loop in the 'loop' case.
+LOOP_STEPS = 10
+
+W = 2 * np.pi * 50
+ATOM_NUM = 1e2
+OMEG = {'x': W, 'y': W, 'z': 40 * W}
+G_SC = {'uu': 1, 'dd': 1, 'ud': 1.04}
+
+
+def make_spinor(grid, path):
+    """Create the coupled benchmark spinor on a grid.
+
+    Parameters
+    ----------
+    grid : :obj:`tuple` of :obj:`int`
+        The (Nx, Ny) grid points.
+    path : :obj:`str`
+        The data directory of the spinor.
+
+    Returns
+    -------
+    spin : :obj:`PSpinor`
+        The spinor.
+
+    """
+    spin = pspinor.PSpinor(path + os.sep, overwrite=True, atom_num=ATOM_NUM,
+                           omeg=OMEG, g_sc=G_SC, pop_frac=(0.5, 0.5),
+                           r_sizes=(8, 8), mesh_points=tuple(grid))
+    spin.coupling_setup(wavel=790.1e-9, kin_shift=False)
+    return spin
+
+
+def make_propagator(spin, dtype, batch):
+    """A propagator of the spinor in the precision of `dtype`."""
+    kwargs = {'precision': DTYPES[dtype], 'progress_rate': 0,
+              'drift_rate': 0}
+    if batch == 1:
+        return tprop.TensorPropagator(spin, 1/50, LOOP_STEPS, **kwargs)
+    return bprop.BatchPropagator.from_sweep(
+        spin, 1/50, LOOP_STEPS, {'psik': [spin.psik] * batch}, **kwargs)
+
+
+def _wavefunction(prop, batch):
+    """The packed wavefunction of a propagator, with a batch axis."""
+    return prop.psik if batch > 1 else prop.psik[None]
+
+
+def fft_case(spin, dtype, batch, work_dir):
+    """Forward 2D FFT of the packed wavefunctions."""
+    psik = _wavefunction(make_propagator(spin, dtype, batch), batch)
+    func = jax.jit(lambda psi, dr: ttools.fft_2d(psi, dr, shift=False))
+    return lambda: func(psik, spin.space['dr'])
+
+
+def hadamard_case(spin, dtype, batch, work_dir):
+    """Elementwise product of the wavefunctions with an evolution operator."""
+    prop = make_propagator(spin, dtype, batch)
+    psik = _wavefunction(prop, batch)
+    kin = prop.ops['kin'][0]
+    func = jax.jit(lambda op, psi: op * psi)
+    return lambda: func(kin, psik)
+
+
+def norm_case(spin, dtype, batch, work_dir):
+    """Normalization of the wavefunctions to the atom number."""
+    prop = make_propagator(spin, dtype, batch)
+    psik = _wavefunction(prop, batch)
+
+    def norm(psi):
+        return ttools.norm(psi, spin.space['dv_k'], ATOM_NUM,
+                           acc_dtype=prop.acc_dtype)[0]
+    func = jax.jit(jax.vmap(norm))
+    return lambda: func(psik)
+
+
+def full_step_case(spin, dtype, batch, work_dir):
+    """A single imaginary-time ``full_step``."""
+    prop = make_propagator(spin, dtype, batch)
+    return lambda: prop.full_step(prop.psik)
+
+
+def loop_case(spin, dtype, batch, work_dir):
+    """A compiled loop of `LOOP_STEPS` imaginary-time steps."""
+    prop = make_propagator(spin, dtype, batch)
+    return lambda: prop.scan_steps(prop.psik, LOOP_STEPS)[0]
+
+
+def io_case(spin, dtype, batch, work_dir):
+    """Appending `batch` samples to a snapshot store, and reading them."""
+    prop = make_propagator(spin, dtype, batch)
+    frames = np.asarray(_wavefunction(prop, batch))
+    times = np.zeros(batch)
+    store = sampling.SnapshotStore.create(
+        os.path.join(work_dir, 'io.snap'), frames.shape[1:], frames.dtype)
+
+    def write_read():
+        store.truncate(0)
+        store.append(frames, times)
+        return store[:]
+    return write_read
+
+
+#: The benchmark cases: (setup, grid point updates per call in units of
+#: the batched grid).
+CASES = {'fft': (fft_case, 1), 'hadamard': (hadamard_case, 1),
+         'norm': (norm_case, 1), 'full_step': (full_step_case, 1),
+         'loop': (loop_case, LOOP_STEPS), 'io': (io_case, 1)}
+
+
+def time_calls(func, n_repeats=None, min_time=0.2):
+    """Time the calls of a function until its results are ready.
+
+    Parameters
+    ----------
+    func : :obj:`callable`
+        The function, without arguments.
+    n_repeats : :obj:`int`, optional
+        The number of timed calls. Default is enough calls to take at least
+        `min_time` seconds, and at least 10.
+    min_time : :obj:`float`, default=0.2
+        See `n_repeats`.
+
+    Returns
+    -------
+    times : NumPy :obj:`array`
+        The duration of each call, in seconds.
+
+    """
+    # The first call compiles.
+    jax.block_until_ready(func())
+    if n_repeats is None:
+        start = time.perf_counter()
+        jax.block_until_ready(func())
+        once = time.perf_counter() - start
+        n_repeats = max(10, int(np.ceil(min_time / max(once, 1e-9))))
+    times = np.empty(n_repeats)
+    for i in range(n_repeats):
+        start = time.perf_counter()
+        jax.block_until_ready(func())
+        times[i] = time.perf_counter() - start
+    return times
+
+
+def run_case(name, grid, dtype='complex128', batch=1, n_repeats=None,
+             min_time=0.2):
+    """Run a benchmark case.
+
+    Parameters
+    ----------
+    name : :obj:`str`
+        The case; see ``CASES``.
+    grid : :obj:`tuple` of :obj:`int`
+        The (Nx, Ny) grid points.
+    dtype : :obj:`str`, default='complex128'
+        The wavefunction dtype; see ``DTYPES``.
+    batch : :obj:`int`, default=1
+        The number of wavefunctions processed together.
+    n_repeats, min_time
+        See ``time_calls``.
+
+    Returns
+    -------
+    result : :obj:`dict`
+        The 'case', 'grid', 'dtype', and 'batch'; the 'median' and the
+        normal-scaled median absolute deviation 'mad' of the call times in
+        seconds, the number of calls 'n_repeats', the 'throughput' in
+        grid points per second, and the 'flops', 'fft_flops', and 'bytes'
+        of a call; see ``roofline.case_cost``.
+
+    """
+    setup, units = CASES[name]
+    work_dir = tempfile.mkdtemp()
+    try:
+        spin = make_spinor(grid, work_dir)
+        cost = roofline.case_cost(name, grid, dtype, batch,
+                                  coupled=spin.is_coupling,
+                                  loop_steps=LOOP_STEPS)
+        times = time_calls(setup(spin, dtype, batch, work_dir), n_repeats,
+                           min_time)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    median = float(np.median(times))
+    return {'case': name, 'grid': list(grid), 'dtype': dtype, 'batch': batch,
+            'median': median,
+            'mad': float(1.4826 * np.median(np.abs(times - median))),
+            'n_repeats': len(times),
+            'throughput': float(np.prod(grid)) * batch * units / median,
+            **cost}
@@ -0,0 +1,201 @@
+"""cli.py module.
+
+The command line interface of the benchmark suite:
+
+- ``run``: runs benchmark cases over grids, dtypes, and batch sizes, and
+  saves the results to the store,
+- ``compare``: compares a run with a baseline, and exits with status 1 if
+  any case regressed,
+- ``roofline``: reports the achieved GFLOP/s and GB/s of a run against
+  the STREAM bandwidth, and whether each case is memory- or FFT-bound,
+- ``list``: lists the saved runs.
+
+For example, ``python -m spinor_gpe.bench run --cases fft loop --grids
+128x128 512x512 --dtypes complex64 --batch 1 8 --label main``.
+"""
+import argparse
+import itertools
+
+from spinor_gpe.bench import cases
+from spinor_gpe.bench import roofline as broof
+from spinor_gpe.bench import store as bstore
+
+
+def parse_grid(text):
+    """Parse a grid such as '256x512' into (Nx, Ny)."""
+    try:
+        n_x, n_y = (int(n) for n in text.lower().split('x'))
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(
+            f"Grids are given as NXxNY, e.g. 256x256, not '{text}'.") from ex
+    return n_x, n_y
+
+
+def format_result(result):
+    """Format a result as a line of the ``run`` output."""
+    grid = 'x'.join(map(str, result['grid']))
+    return (f"{result['case']:<10}{grid:>11}{result['dtype']:>12}"
+            f"{result['batch']:>6}{result['median'] * 1e3:>11.3f}ms"
+            f" +/-{result['mad'] * 1e3:>8.3f}ms"
+            f"{result['throughput'] / 1e6:>10.1f} Mpts/s")
+
+
+def format_row(row):
+    """Format a row of ``store.compare`` as a line of the ``compare`` output."""
+    case, grid, dtype, batch = row['key']
+    grid = 'x'.join(map(str, grid))
+    times = ''.join('{:>11}'.format('-' if val is None else
+                                    f'{val * 1e3:.3f}ms')
+                    for val in (row['base'], row['new']))
+    ratio = '' if row['ratio'] is None else f"{row['ratio']:>7.2f}x"
+    return (f"{case:<10}{grid:>11}{dtype:>12}{batch:>6}{times}{ratio:>9}"
+            f"  {row['status']}")
+
+
+def format_point(result, point):
+    """Format a result and its roofline point as a line of ``roofline``."""
+    grid = 'x'.join(map(str, result['grid']))
+    return (f"{result['case']:<10}{grid:>11}{result['dtype']:>12}"
+            f"{result['batch']:>6}{point['gflops']:>9.2f}"
+            f"{point['gbps']:>9.2f}{point['stream']:>8.0%}"
+            f"{point['intensity']:>8.2f}  {point['bound']}")
+
+
+def run(args):
+    """Run the benchmark cases and save the results."""
+    stream = None
+    if not args.no_stream:
+        stream = broof.stream_bandwidth(args.stream_size)
+        print(f"STREAM triad bandwidth: {stream / 1e9:.2f} GB/s")
+    results = []
+    for name, grid, dtype, batch in itertools.product(
+            args.cases, args.grids, args.dtypes, args.batch):
+        try:
+            result = cases.run_case(name, grid, dtype, batch, args.repeats,
+                                    args.min_time)
+        except (RuntimeError, MemoryError) as ex:
+            # E.g. out of device memory on the largest grids.
+            print(f"{name} {grid} {dtype} {batch}: {ex}")
+            continue
+        print(format_result(result), flush=True)
+        results.append(result)
+    path = bstore.ResultStore(args.store).save(results, args.label, stream)
+    print(f"Saved {len(results)} results to {path}.")
+    return 0
+
+
+def compare(args):
+    """Compare a run with a baseline; 1 if any case regressed."""
+    results = bstore.ResultStore(args.store)
+    new = args.new or results.runs()[-1]
+    rows = bstore.compare(results.load(args.base), results.load(new),
+                          args.threshold, args.n_sigma)
+    print(f"{'case':<10}{'grid':>11}{'dtype':>12}{'batch':>6}"
+          f"{'base':>11}{'new':>11}{'ratio':>9}")
+    for row in rows:
+        print(format_row(row))
+    n_regressed = sum(row['status'] == 'regression' for row in rows)
+    print(f"{n_regressed} regression(s) of {new} against {args.base}.")
+    return int(n_regressed > 0)
+
+
+def roofline(args):
+    """Report the throughput of a run against the STREAM bandwidth."""
+    results = bstore.ResultStore(args.store)
+    run_data = results.load(args.run or results.runs()[-1])
+    stream = run_data.get('stream')
+    if stream is None:
+        stream = broof.stream_bandwidth(args.stream_size)
+        print("The run has no STREAM bandwidth; measured it on this "
+              "machine.")
+    print(f"{run_data['label']}: STREAM triad bandwidth "
+          f"{stream / 1e9:.2f} GB/s")
+    print(f"{'case':<10}{'grid':>11}{'dtype':>12}{'batch':>6}"
+          f"{'GFLOP/s':>9}{'GB/s':>9}{'STREAM':>8}{'flop/B':>8}  bound")
+    for result in run_data['results']:
+        if 'flops' not in result:
+            continue  # Results of runs before schema version 2.
+        print(format_point(result, broof.roofline(result, stream)))
+    return 0
+
+
+def list_runs(args):
+    """List the runs of the store."""
+    results = bstore.ResultStore(args.store)
+    for label in results.runs():
+        run = results.load(label)
+        machine = run['machine']
+        print(f"{label:<30}{run['created']:>21}  {machine['backend']} "
+              f"{machine['device_kind']}  {len(run['results'])} results")
+    return 0
+
+
+def main(argv=None):
+    """Run the benchmark command line interface.
+
+    Parameters
+    ----------
+    argv : :obj:`list` of :obj:`str`, optional
+        The arguments. Default is those of the command line.
+
+    Returns
+    -------
+    status : :obj:`int`
+        The exit status.
+
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m spinor_gpe.bench',
+        description="Benchmark the hot paths of spinor_gpe propagations.")
+    parser.add_argument('--store', default=bstore.STORE_DIR,
+                        help="The results directory (default "
+                             f"{bstore.STORE_DIR}).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run benchmark cases.")
+    run_parser.add_argument('--cases', nargs='+', default=sorted(cases.CASES),
+                            choices=sorted(cases.CASES))
+    run_parser.add_argument('--grids', nargs='+', type=parse_grid,
+                            default=list(cases.GRIDS), metavar='NXxNY')
+    run_parser.add_argument('--dtypes', nargs='+', default=['complex128'],
+                            choices=sorted(cases.DTYPES))
+    run_parser.add_argument('--batch', nargs='+', type=int, default=[1])
+    run_parser.add_argument('--repeats', type=int, default=None,
+                            help="Timed calls per case; default is enough "
+                                 "to take --min-time.")
+    run_parser.add_argument('--min-time', type=float, default=0.2)
+    run_parser.add_argument('--label', default=None,
+                            help="The name of the run; default is its time.")
+    run_parser.add_argument('--no-stream', action='store_true',
+                            help="Skip measuring the STREAM bandwidth.")
+    run_parser.add_argument('--stream-size', type=int, default=2**23,
+                            help="Elements of the STREAM arrays.")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser(
+        'compare', help="Compare a run with a baseline.")
+    compare_parser.add_argument('base', help="The baseline run.")
+    compare_parser.add_argument('new', nargs='?', default=None,
+                                help="The new run; default is the latest.")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="Relative slowdown flagged as a "
+                                     "regression (default 0.1).")
+    compare_parser.add_argument('--n-sigma', type=float, default=3.0,
+                                help="Slowdown in units of the timing "
+                                     "noise flagged as a regression.")
+    compare_parser.set_defaults(func=compare)
+
+    roof_parser = commands.add_parser(
+        'roofline', help="Report a run against the memory bandwidth.")
+    roof_parser.add_argument('run', nargs='?', default=None,
+                             help="The run; default is the latest.")
+    roof_parser.add_argument('--stream-size', type=int, default=2**23,
+                             help="Elements of the STREAM arrays, if the "
+                                  "run has no bandwidth.")
+    roof_parser.set_defaults(func=roofline)
+
+    list_parser = commands.add_parser('list', help="List the saved runs.")
+    list_parser.set_defaults(func=list_runs)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,183 @@
+"""roofline.py module.
+
+A throughput model of the benchmark cases, against the measured memory
+bandwidth.
+
+Every case is modeled as a sequence of passes over the wavefunction: 2D
+FFTs, which take 5 N log2(N) floating-point operations for N grid points,
+and elementwise Hadamard passes, which each read their operands and write
+their result once. ``case_cost`` counts the operations and bytes of a
+call, so that the measured times give the achieved GFLOP/s and GB/s. The
+bytes are those of the unfused passes; XLA fuses neighbouring passes of
+``full_step``, so its effective bandwidth may exceed what the hardware
+moves.
+
+``stream_bandwidth`` measures the bandwidth of a STREAM triad on the
+default device, i.e. the host memory bandwidth on CPU nodes. A case whose
+bytes take at least half of its time at this bandwidth is memory-bound;
+otherwise it is bound by its FFTs, or, without FFTs, by overhead such as
+the dispatch of small kernels.
+"""
+import time
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from spinor_gpe.pspinor import splitting
+
+#: Floating-point operations per element of the elementwise passes.
+PASS_FLOPS = {'hadamard': 6, 'norm': 6, 'interaction': 20, 'coupling': 14}
+
+
+def fft_flops(grid, n_ffts=1):
+    """The operations of `n_ffts` 2D FFTs of a grid, 5 N log2(N) each."""
+    n_points = float(np.prod(grid))
+    return 5 * n_points * np.log2(n_points) * n_ffts
+
+
+def pass_bytes(n_elements, itemsize, n_operands=2):
+    """The bytes touched by an elementwise pass.
+
+    Parameters
+    ----------
+    n_elements : :obj:`int`
+        The number of complex elements written.
+    itemsize : :obj:`int`
+        The bytes of a complex element.
+    n_operands : :obj:`int`, default=2
+        The number of elements read per element written, e.g. 2 for the
+        product of an operator and the wavefunction.
+
+    Returns
+    -------
+    n_bytes : :obj:`float`
+        The bytes read and written.
+
+    """
+    return float(n_elements) * itemsize * (n_operands + 1)
+
+
+def case_cost(name, grid, dtype='complex128', batch=1, coupled=True,
+              imag=True, scheme='magic_gamma', loop_steps=10):
+    """Count the operations and bytes of a call of a benchmark case.
+
+    Parameters
+    ----------
+    name : :obj:`str`
+        The case; see ``cases.CASES``.
+    grid : :obj:`tuple` of :obj:`int`
+        The (Nx, Ny) grid points.
+    dtype : :obj:`str`, default='complex128'
+        The wavefunction dtype.
+    batch : :obj:`int`, default=1
+        The number of two-component wavefunctions per call.
+    coupled : :obj:`bool`, default=True
+        Whether the steps apply the coupling operator.
+    imag : :obj:`bool`, default=True
+        Whether the steps are in imaginary time, and thus renormalize.
+    scheme : :obj:`str`, default='magic_gamma'
+        The splitting scheme of a step; see ``splitting.SCHEMES``.
+    loop_steps : :obj:`int`, default=10
+        The steps of a call of the 'loop' case.
+
+    Returns
+    -------
+    cost : :obj:`dict`
+        The 'flops' and 'bytes' of a call, and the 'fft_flops' among them.
+
+    """
+    itemsize = np.dtype(dtype).itemsize
+    n_comps = 2 * batch
+    n_elements = float(np.prod(grid)) * n_comps
+    if name == 'fft':
+        ffts = fft_flops(grid, n_comps)
+        return {'flops': ffts, 'fft_flops': ffts,
+                'bytes': pass_bytes(n_elements, itemsize, 1)}
+    if name in ('hadamard', 'norm'):
+        return {'flops': PASS_FLOPS[name] * n_elements, 'fft_flops': 0.0,
+                'bytes': pass_bytes(n_elements, itemsize)}
+    if name == 'io':
+        # Written to the store and read back.
+        return {'flops': 0.0, 'fft_flops': 0.0,
+                'bytes': 2 * n_elements * itemsize}
+
+    n_real = splitting.get_scheme(scheme).n_stages
+    # Kinetic and potential products; two interaction and, if coupled, two
+    # coupling passes per real-space sub-step; renormalizations.
+    passes = {'hadamard': 2 * n_real + 1, 'interaction': 2 * n_real,
+              'coupling': 2 * n_real if coupled else 0,
+              'norm': n_real + 1 if imag else 0}
+    ffts = fft_flops(grid, 2 * n_real * n_comps)
+    flops = ffts + sum(PASS_FLOPS[k] * n * n_elements
+                       for k, n in passes.items())
+    n_bytes = (2 * n_real * pass_bytes(n_elements, itemsize, 1)
+               + sum(n * pass_bytes(n_elements, itemsize)
+                     for n in passes.values()))
+    steps = loop_steps if name == 'loop' else 1
+    return {'flops': steps * flops, 'fft_flops': steps * ffts,
+            'bytes': steps * n_bytes}
+
+
+def stream_bandwidth(n_elements=2**23, n_repeats=10):
+    """Measure the bandwidth of a STREAM triad on the default device.
+
+    Parameters
+    ----------
+    n_elements : :obj:`int`, default=2**23
+        The length of the float64 arrays, which should be well beyond the
+        caches.
+    n_repeats : :obj:`int`, default=10
+        The number of timed triads.
+
+    Returns
+    -------
+    bandwidth : :obj:`float`
+        The best bandwidth of a triad ``a = b + s * c``, counting 24 bytes
+        per element as STREAM does, in bytes/s.
+
+    """
+    triad = jax.jit(lambda b, c: b + 3.0 * c)
+    arr_b = jnp.ones(n_elements, dtype=jnp.float64)
+    arr_c = jnp.full(n_elements, 2.0, dtype=jnp.float64)
+    jax.block_until_ready(triad(arr_b, arr_c))
+    best = np.inf
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        jax.block_until_ready(triad(arr_b, arr_c))
+        best = min(best, time.perf_counter() - start)
+    return 24.0 * n_elements / best
+
+
+def roofline(result, bandwidth):
+    """Place a benchmark result against the measured bandwidth.
+
+    Parameters
+    ----------
+    result : :obj:`dict`
+        See ``cases.run_case``.
+    bandwidth : :obj:`float`
+        The STREAM bandwidth, in bytes/s.
+
+    Returns
+    -------
+    point : :obj:`dict`
+        The achieved 'gflops' and 'gbps', the arithmetic 'intensity' in
+        flops per byte, the fraction 'stream' of the bandwidth achieved,
+        and the 'bound': 'memory' if the bytes take at least half of the
+        time at the STREAM bandwidth, else 'fft' if the FFTs make up most of
+        the operations, else 'overhead'.
+
+    """
+    seconds = result['median']
+    point = {'gflops': result['flops'] / seconds / 1e9,
+             'gbps': result['bytes'] / seconds / 1e9,
+             'intensity': result['flops'] / result['bytes'],
+             'stream': result['bytes'] / seconds / bandwidth}
+    if point['stream'] >= 0.5:
+        point['bound'] = 'memory'
+    elif result['fft_flops'] > result['flops'] / 2:
+        point['bound'] = 'fft'
+    else:
+        point['bound'] = 'overhead'
+    return point
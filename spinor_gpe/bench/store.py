@@ -0,0 +1,197 @@
+"""store.py module.
+
+The versioned store of benchmark results, and the comparison of runs.
+
+Each run is a JSON file in the store directory, named after its label,
+with the results of all of its cases and a description of the machine and
+software it ran on. The format of the files is versioned by
+``SCHEMA_VERSION``, so that older runs remain comparable: version 2 added
+the operations and bytes of each result, and the STREAM bandwidth of the
+run, for ``roofline``.
+"""
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+
+import jax
+import numpy as np
+
+#: The version of the format of a run file.
+SCHEMA_VERSION = 2
+#: The default store directory.
+STORE_DIR = 'benchmarks/results'
+
+
+def machine_info():
+    """Describe the machine and software of a run.
+
+    Returns
+    -------
+    info : :obj:`dict`
+        The host name, platform, Python and JAX versions, the JAX backend,
+        the kind and number of its devices, and the git commit of the
+        working tree, if any.
+
+    """
+    devices = jax.devices()
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'node': platform.node(), 'platform': platform.platform(),
+            'python': platform.python_version(), 'jax': jax.__version__,
+            'backend': jax.default_backend(),
+            'device_kind': devices[0].device_kind,
+            'n_devices': len(devices), 'commit': commit}
+
+
+def result_key(result):
+    """The (case, grid, dtype, batch) identifying a result across runs."""
+    return (result['case'], tuple(result['grid']), result['dtype'],
+            result['batch'])
+
+
+class ResultStore:
+    """A directory of benchmark runs.
+
+    Attributes
+    ----------
+    path : :obj:`str`
+        The store directory.
+
+    """
+
+    def __init__(self, path=STORE_DIR):
+        """Open a store, which is created on the first save.
+
+        Parameters
+        ----------
+        path : :obj:`str`, default=``STORE_DIR``
+            The store directory.
+
+        """
+        self.path = path
+
+    def save(self, results, label=None, stream=None):
+        """Save the results of a run.
+
+        Parameters
+        ----------
+        results : :obj:`list` of :obj:`dict`
+            See ``cases.run_case``.
+        label : :obj:`str`, optional
+            The name of the run, e.g. a branch name. Default is the time of
+            the run. An existing run of the same label is replaced.
+        stream : :obj:`float`, optional
+            The STREAM bandwidth of the machine, in bytes/s; see
+            ``roofline.stream_bandwidth``.
+
+        Returns
+        -------
+        path : :obj:`str`
+            The run file.
+
+        """
+        created = datetime.datetime.now().isoformat()
+        label = label or created[:19].replace(':', '-')
+        run = {'schema': SCHEMA_VERSION, 'label': label, 'created': created,
+               'machine': machine_info(), 'stream': stream,
+               'results': results}
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, label + '.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(run, file, indent=1)
+        return path
+
+    def runs(self):
+        """The labels of the saved runs, oldest first."""
+        paths = glob.glob(os.path.join(self.path, '*.json'))
+        runs = [self.load(p) for p in paths]
+        return [run['label'] for run in sorted(runs,
+                                               key=lambda r: r['created'])]
+
+    def load(self, label):
+        """Load a run.
+
+        Parameters
+        ----------
+        label : :obj:`str`
+            The label of a run in the store, or the path of a run file.
+
+        Returns
+        -------
+        run : :obj:`dict`
+            The 'schema', 'label', 'created' time, 'machine', 'stream'
+            bandwidth, and 'results'.
+
+        """
+        path = label
+        if not os.path.isfile(path):
+            path = os.path.join(self.path, label + '.json')
+        with open(path, encoding='utf-8') as file:
+            run = json.load(file)
+        assert run.get('schema', 0) <= SCHEMA_VERSION, (
+            f"The run {label} has a newer format {run['schema']}.")
+        return run
+
+
+def compare(base, new, threshold=0.1, n_sigma=3.0):
+    """Compare the results of two runs.
+
+    A result is a regression if its median time grew by more than the
+    fraction `threshold`, and by more than `n_sigma` times the combined
+    median absolute deviations of both runs, so that timing noise is not
+    flagged. Improvements are flagged the same way.
+
+    Parameters
+    ----------
+    base, new : :obj:`dict`
+        The baseline and the new run; see ``ResultStore.load``.
+    threshold : :obj:`float`, default=0.1
+        The relative change of the median time above which a result
+        changed.
+    n_sigma : :obj:`float`, default=3.0
+        The change in units of the timing noise above which a result
+        changed.
+
+    Returns
+    -------
+    rows : :obj:`list` of :obj:`dict`
+        For each result of either run, its 'key', the baseline and new
+        'base' and 'new' median times (`None` where missing), their
+        'ratio', and the 'status': {'regression', 'improvement', 'ok',
+        'new', 'missing'}.
+
+    """
+    base_results = {result_key(r): r for r in base['results']}
+    new_results = {result_key(r): r for r in new['results']}
+    rows = []
+    for key in list(base_results) + [k for k in new_results
+                                     if k not in base_results]:
+        old, cur = base_results.get(key), new_results.get(key)
+        row = {'key': key, 'base': old and old['median'],
+               'new': cur and cur['median'], 'ratio': None}
+        if old is None:
+            row['status'] = 'new'
+        elif cur is None:
+            row['status'] = 'missing'
+        else:
+            row['ratio'] = cur['median'] / old['median']
+            change = abs(cur['median'] - old['median'])
+            significant = (abs(row['ratio'] - 1) > threshold
+                           and change > n_sigma * np.hypot(old['mad'],
+                                                           cur['mad']))
+            if not significant:
+                row['status'] = 'ok'
+            elif row['ratio'] > 1:
+                row['status'] = 'regression'
+            else:
+                row['status'] = 'improvement'
+        rows.append(row)
+    return rows
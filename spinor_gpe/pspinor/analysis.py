@@ -0,0 +1,212 @@
+"""analysis.py module.
+
+Vectorized analysis of sampled wavefunctions.
+
+The functions of this module act on stacks of (n, 2, Ny, Nx) centered
+k-space samples, e.g. those of a ``sampling.SnapshotStore``, and compute
+the observables of all n frames in a single vectorized pass on-device.
+``map_chunks`` streams a stack through such a function in chunks, so that
+memory stays bounded for records much larger than memory, and ``analyze``
+collects the time series of the common observables:
+
+>>> store = SnapshotStore('psik_sampled0-Trial_000.snap')
+>>> series = analyze(store, ps.space, hamiltonian(ps))
+>>> plt.plot(series['times'], series['com'][:, 0, 0])
+
+"""
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import tensor_propagator as tprop
+
+
+@jax.jit
+def real_space(psiks, delta_r):
+    """The (n, 2, Ny, Nx) real-space wavefunctions of a stack of samples."""
+    return ttools.ifft_2d(jnp.asarray(psiks), delta_r)
+
+
+@jax.jit
+def densities(psiks, delta_r):
+    """The (n, 2, Ny, Nx) real-space densities of a stack of samples."""
+    return ttools.density(real_space(psiks, delta_r))
+
+
+@jax.jit
+def frame_stats(psiks, x_mesh, y_mesh, delta_r, dv_r):
+    """Compute the density moments of a stack of samples.
+
+    Parameters
+    ----------
+    psiks : :obj:`Array`
+        The (n, 2, Ny, Nx) centered k-space samples.
+    x_mesh, y_mesh : :obj:`Array`
+        The real-space coordinate grids.
+    delta_r : :obj:`Array`
+        The real-space mesh spacings.
+    dv_r : :obj:`float`
+        The real-space volume element.
+
+    Returns
+    -------
+    stats : :obj:`dict` of :obj:`Array`
+        - 'pops': the (n, 2) populations of the spin components,
+        - 'com': the (n, 2, 2) (x, y) center of mass of each component,
+        - 'width': the (n, 2, 2) (x, y) rms width of each component,
+        - 'separation': the (n,) phase separation of the components; see
+          ``PropResult.calc_separation``.
+
+        The center and width of an empty component are NaN.
+
+    """
+    dens = densities(psiks, delta_r)
+    mass = jnp.sum(dens, axis=(-2, -1))
+    weights = dens / mass[..., None, None]
+
+    def moment(grid):
+        return jnp.sum(weights * grid, axis=(-2, -1))
+    com = jnp.stack([moment(x_mesh), moment(y_mesh)], axis=-1)
+    second = jnp.stack([moment(x_mesh**2), moment(y_mesh**2)], axis=-1)
+    width = jnp.sqrt(jnp.maximum(second - com**2, 0))
+
+    squares = jnp.sum(dens**2, axis=(-2, -1))
+    overlap = jnp.sum(dens[:, 0] * dens[:, 1], axis=(-2, -1))
+    separation = 1 - overlap / jnp.sqrt(squares[:, 0] * squares[:, 1])
+    return {'pops': mass * dv_r, 'com': com, 'width': width,
+            'separation': separation}
+
+
+@jax.jit
+def frame_energies(psiks, ham, delta_r, dv_r, dv_k):
+    """Compute the energy components of a stack of samples.
+
+    Parameters
+    ----------
+    psiks : :obj:`Array`
+        The (n, 2, Ny, Nx) centered k-space samples.
+    ham : :obj:`dict` of :obj:`Array`
+        The energy grids and scattering strengths; see ``hamiltonian``.
+    delta_r : :obj:`Array`
+        The real-space mesh spacings.
+    dv_r, dv_k : :obj:`float`
+        The real- and k-space volume elements.
+
+    Returns
+    -------
+    energies : :obj:`Array`
+        The (n, 4) [<kin.>, <pot.>, <int.>, <coupl.>] energies of each
+        sample; see ``tensor_propagator.energy_terms``.
+
+    """
+    def energies(psik):
+        return tprop.energy_terms(psik, ham['kin_eng'], ham['pot_eng'],
+                                  ham['coupling'], ham['expon'], ham['g_uu'],
+                                  ham['g_ud'], ham['g_dd'], delta_r, dv_r,
+                                  dv_k)
+    return jax.vmap(energies)(ttools.fft_order(jnp.asarray(psiks)))
+
+
+def hamiltonian(spin):
+    """Collect the energy grids of a spinor for ``frame_energies``.
+
+    Parameters
+    ----------
+    spin : :obj:`PSpinor`
+        The spinor whose Hamiltonian evaluates the energies.
+
+    Returns
+    -------
+    ham : :obj:`dict` of :obj:`Array`
+        The packed kinetic energy grids 'kin_eng', in FFT order, and
+        potential energy grids 'pot_eng', the 'coupling' grid or `None`,
+        the coupling phase 'expon', and the scattering strengths 'g_uu',
+        'g_ud', and 'g_dd'.
+
+    """
+    if spin.rot_coupling:
+        expon = jnp.array(0.0)
+    else:
+        expon = 2 * spin.kL_recoil * jnp.asarray(spin.space['x_mesh'])
+    return {'kin_eng': ttools.fft_order(ttools.pack(spin.kin_eng_spin)),
+            'pot_eng': ttools.pack(spin.pot_eng_spin),
+            'coupling': (jnp.asarray(spin.coupling) if spin.is_coupling
+                         else None),
+            'expon': expon, 'g_uu': spin.g_sc['uu'], 'g_ud': spin.g_sc['ud'],
+            'g_dd': spin.g_sc['dd']}
+
+
+def map_chunks(func, psiks, chunk=64):
+    """Apply a vectorized function to a stack of samples, chunk by chunk.
+
+    Each chunk is read, e.g. from a memory-mapped store, and processed
+    on-device while the results of the previous chunk are transferred to
+    the host, so at most two chunks are held in memory at once.
+
+    Parameters
+    ----------
+    func : :obj:`callable`
+        Maps a (m, 2, Ny, Nx) chunk of samples to an array, or a pytree of
+        arrays, with a leading axis of length m.
+    psiks : :obj:`SnapshotStore` or array-like
+        The (n, 2, Ny, Nx) centered k-space samples.
+    chunk : :obj:`int`, default=64
+        The number of samples per chunk.
+
+    Returns
+    -------
+    results : NumPy :obj:`array` or pytree thereof
+        The outputs of `func` for all n samples, concatenated on the host.
+
+    """
+    outputs = []
+    pending = None
+    for start in range(0, len(psiks), chunk):
+        result = func(jnp.asarray(psiks[start:start + chunk]))
+        if pending is not None:
+            outputs.append(jax.tree.map(np.asarray, pending))
+        pending = result
+    if pending is None:
+        return None
+    outputs.append(jax.tree.map(np.asarray, pending))
+    return jax.tree.map(lambda *arrs: np.concatenate(arrs), *outputs)
+
+
+def analyze(psiks, space, ham=None, chunk=64):
+    """Compute the time series of the observables of sampled wavefunctions.
+
+    Parameters
+    ----------
+    psiks : :obj:`SnapshotStore` or array-like
+        The (n, 2, Ny, Nx) centered k-space samples.
+    space : :obj:`dict`
+        See ``pspinor.PSpinor``; uses 'x_mesh', 'y_mesh', 'dr', 'dv_r', and
+        'dv_k'.
+    ham : :obj:`dict`, optional
+        The Hamiltonian of the energies, from ``hamiltonian``. Default is
+        not to compute the energies.
+    chunk : :obj:`int`, default=64
+        The number of samples analyzed together; see ``map_chunks``.
+
+    Returns
+    -------
+    series : :obj:`dict` of NumPy :obj:`array`
+        The 'pops', 'com', 'width', and 'separation' of ``frame_stats``, the
+        'energies' of ``frame_energies`` if `ham` is given, and the sampled
+        'times' if `psiks` is a snapshot store.
+
+    """
+    grids = [jnp.asarray(space[k]) for k in ('x_mesh', 'y_mesh', 'dr')]
+    dv_r, dv_k = space['dv_r'], space['dv_k']
+
+    def observables(block):
+        out = frame_stats(block, *grids, dv_r)
+        if ham is not None:
+            out['energies'] = frame_energies(block, ham, grids[2], dv_r, dv_k)
+        return out
+
+    series = map_chunks(observables, psiks, chunk) or {}
+    if hasattr(psiks, 'times'):
+        series['times'] = psiks.times
+    return series
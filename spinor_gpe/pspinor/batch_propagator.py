@@ -0,0 +1,189 @@
+"""batch_propagator.py module."""
+import copy
+from functools import partial
+
+import jax
+import jax.numpy as jnp
+
+from spinor_gpe.pspinor import compile_cache
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import tensor_propagator as tprop
+from spinor_gpe.pspinor import prop_result
+
+
+class BatchPropagator(tprop.TensorPropagator):
+    """Propagates an ensemble of spinors in a single vectorized loop.
+
+    Each member of the ensemble may have its own initial wavefunction,
+    scattering strengths, atom number, coupling, detuning, and kinetic and
+    potential energy grids, but all members share the same spatial grid and
+    time step. The arrays of all members are stacked along a leading batch
+    axis, and ``full_step`` is vectorized over this axis with ``jax.vmap``,
+    so that a parameter sweep runs as one compiled program.
+
+    Attributes
+    ----------
+    members : :obj:`list` of :obj:`TensorPropagator`
+        The propagators of the individual ensemble members.
+    batch_size : :obj:`int`
+        The number of members in the ensemble.
+
+    See ``TensorPropagator`` for the other attributes; those that differ
+    between members carry a leading batch axis.
+
+    """
+
+    batched = True
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, spins, t_step, n_steps, device='cpu', time='imag',
+                 is_sampling=False, n_samples=1, **kwargs):
+        """Stack the propagation arrays of several spinors.
+
+        Parameters
+        ----------
+        spins : :obj:`list` of :obj:`PSpinor`
+            The ensemble members. They must share the same mesh and, if
+            coupled, the same reference frame (`rot_coupling`).
+
+        Other parameters are the same as for ``TensorPropagator``. The
+        members' operators bypass ``op_cache.OPERATORS``, so that they are
+        freed once stacked. The `aot`, `compile_cache`, `profile`, and
+        `checkpoint_rate` options apply once, to the stacked propagation.
+
+        """
+        member_kwargs = {k: val for k, val in kwargs.items()
+                         if k not in ('aot', 'compile_cache', 'profile',
+                                      'checkpoint_rate')}
+        member_kwargs['op_cache'] = False
+        cache_dir = kwargs.get('compile_cache', False)
+        if cache_dir:
+            compile_cache.enable_persistent_cache(
+                cache_dir if isinstance(cache_dir, str) else None)
+            member_kwargs.setdefault('progress_rate', 0)
+        self.members = [tprop.TensorPropagator(spin, t_step, n_steps, device,
+                                               time, is_sampling, n_samples,
+                                               **member_kwargs)
+                        for spin in spins]
+        self.batch_size = len(self.members)
+        first = self.members[0]
+        assert all(m.psik.shape == first.psik.shape
+                   for m in self.members), (
+            "All members of the ensemble must share the same mesh.")
+        assert all(m.is_coupling == first.is_coupling
+                   for m in self.members), (
+            "All members of the ensemble must be either coupled or not.")
+        assert first.mesh is None, (
+            "Batched propagation does not support splitting the grid.")
+        assert first.tol is None, (
+            "Batched propagation does not support stopping early.")
+        assert first.protocol is None, (
+            "Batched propagation does not support time-dependent protocols.")
+
+        # Attributes shared by all members are taken from the first one.
+        for name in ('n_steps', 'progress_rate', 'device', 'paths', 't_step',
+                     'scheme', 'rand_seed', 'is_sampling', 'space',
+                     'kL_recoil', 'sample_rate', 'sample_chunk',
+                     'compression', 'resume', 'mesh', 'tol', 'criterion',
+                     'check_rate', 'adaptive', 'dt_bounds', 'dt_factor',
+                     'time', 'precision', 'acc_dtype', 'drift_rate',
+                     'drift_tol', 'renorm_rate', 'protocol', 'ham',
+                     'energy_rate', 'monitor', 'expon', 'is_coupling'):
+            setattr(self, name, getattr(first, name))
+        self.checkpoint_rate = kwargs.get('checkpoint_rate', 0)
+        self.profile = kwargs.get('profile', False)
+        if cache_dir:
+            self._check_loop_cache()
+        # The stacked operators cannot be rebuilt in another precision.
+        self.fallback = False
+
+        def stack(*arrs):
+            return jnp.stack(arrs)
+
+        self.psik = stack(*[m.psik for m in self.members])
+        # The sub-step durations are shared; the operators are stacked.
+        self.ops = {k: first.ops[k] if k == 'dt' else
+                    jax.tree.map(stack, *[m.ops[k] for m in self.members])
+                    for k in first.ops}
+        self.g_sc = {k: jnp.array([m.g_sc[k] for m in self.members])
+                     for k in first.g_sc}
+        self.atom_num = jnp.array([m.atom_num for m in self.members])
+        self.kin_eng_spin = stack(*[m.kin_eng_spin for m in self.members])
+        self.pot_eng_spin = stack(*[m.pot_eng_spin for m in self.members])
+        self.coupling = stack(*[m.coupling for m in self.members])
+
+        # The stacked copies are the ones propagated; release the originals.
+        for member in self.members:
+            member.psik = member.ops = None
+            member.kin_eng_spin = member.pot_eng_spin = None
+            member.coupling = None
+        if kwargs.get('aot', False):
+            self._step_fn = compile_cache.load_step(
+                self, cache_dir if isinstance(cache_dir, str) else None)
+        else:
+            self._set_step_fn()
+
+    @classmethod
+    def from_sweep(cls, spin, t_step, n_steps, sweep, **kwargs):
+        """Create an ensemble by sweeping attributes of a single spinor.
+
+        Each member is a shallow copy of `spin` with some of its attributes
+        replaced, so that no new data directories are created.
+
+        >>> ps = PSpinor('sweep/Trial_000')
+        >>> ps.coupling_setup()
+        >>> values = np.linspace(0, 2, 64) * ps.EL_recoil
+        >>> couplings = [np.ones_like(ps.space['x_mesh']) * v for v in values]
+        >>> prop = BatchPropagator.from_sweep(ps, 1/50, 1000,
+        ...                                   {'coupling': couplings})
+
+        Parameters
+        ----------
+        spin : :obj:`PSpinor`
+            The template spinor.
+        t_step : :obj:`float`
+            Propagation time step.
+        n_steps : :obj:`int`
+            The number of steps to propagate in time.
+        sweep : :obj:`dict` of {:obj:`str`: :obj:`list`}
+            Maps ``PSpinor`` attribute names, e.g. 'coupling', 'detuning',
+            'g_sc' or 'psik', to one value per member. Values are assigned in
+            the order of the keys, through the ``PSpinor`` property setters.
+            'g_sc' values are dicts in the same (scaled) units as
+            ``spin.g_sc``.
+        **kwargs
+            Passed on to the ``BatchPropagator`` constructor.
+
+        """
+        lengths = {len(vals) for vals in sweep.values()}
+        assert len(lengths) == 1, "All swept attributes need the same length."
+        spins = []
+        for values in zip(*sweep.values()):
+            member = copy.copy(spin)
+            member.g_sc = dict(spin.g_sc)
+            for name, val in zip(sweep, values):
+                setattr(member, name, val)
+            spins.append(member)
+        return cls(spins, t_step, n_steps, **kwargs)
+
+    def _set_step_fn(self):
+        """Select the vectorized ``full_step`` kernel of single steps."""
+        self._step_fn = jax.vmap(partial(tprop.full_step,
+                                         acc_dtype=self.acc_dtype),
+                                 in_axes=tprop.BATCH_AXES)
+
+    def full_step(self, psik):
+        """Full step forward for every member of the ensemble."""
+        return self._step_fn(psik, *self.step_args())
+
+    def _make_result(self, pops, file_name):
+        """Collect the final wavefunctions into a batched `PropResult`."""
+        psik = ttools.centered(self.psik)
+        energy = self.eng_expect(psik)
+
+        # Component-major lists of (batch, Ny, Nx) arrays.
+        psik = ttools.unpack(jnp.moveaxis(psik, 1, 0))
+        psi = ttools.ifft_2d(psik, self.space['dr'])
+
+        result = prop_result.PropResult(psi, psik, energy, pops, file_name)
+        return result
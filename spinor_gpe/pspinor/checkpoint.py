@@ -0,0 +1,140 @@
+"""checkpoint.py module.
+
+Periodic checkpoints of a propagation, from which it can be resumed.
+
+A checkpoint holds everything needed to continue a ``prop_loop`` exactly
+where it stopped: the k-space wavefunction, the number of steps taken, the
+populations so far, the propagation time (which sets the state of a
+time-dependent ``Protocol``), the precision, the random seed, and the
+number of samples in the snapshot store. Only the latest checkpoint of a
+trial is kept, and it is removed once the propagation finishes.
+"""
+import os
+import queue
+import tempfile
+import threading
+
+import numpy as np
+
+
+def checkpoint_path(paths):
+    """The path of the checkpoint file of a trial.
+
+    Parameters
+    ----------
+    paths : :obj:`dict`
+        See ``pspinor.PSpinor``.
+
+    Returns
+    -------
+    path : :obj:`str`
+        E.g. 'data/Trial_000/trial_data/checkpoint-Trial_000.npz'.
+
+    """
+    return f"{paths['trial']}checkpoint-{paths['folder']}.npz"
+
+
+def load_checkpoint(path):
+    """Load a checkpoint into a :obj:`dict` of NumPy arrays and scalars.
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        The checkpoint file.
+
+    Returns
+    -------
+    state : :obj:`dict`
+        The saved state; see ``CheckpointWriter.put``.
+
+    """
+    with np.load(path) as file:
+        return {k: file[k][()] if file[k].ndim == 0 else file[k]
+                for k in file.files}
+
+
+class CheckpointWriter:
+    """Writes checkpoints to disk in a background thread.
+
+    Device arrays handed to ``put`` are transferred to the host and saved
+    by the writer thread, so the propagation loop does not wait for them.
+    Each checkpoint is written to a temporary file first and then moved
+    over the previous one, so a crash never leaves a partial checkpoint.
+    At most one checkpoint waits to be written at a time.
+
+    Attributes
+    ----------
+    path : :obj:`str`
+        The checkpoint file.
+    n_written : :obj:`int`
+        The number of checkpoints written so far.
+
+    """
+
+    def __init__(self, path):
+        """Start the writer thread.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The checkpoint file, overwritten by every checkpoint.
+
+        """
+        self.path = path
+        self.n_written = 0
+        self._error = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def put(self, state):
+        """Queue a checkpoint to be written.
+
+        Parameters
+        ----------
+        state : :obj:`dict`
+            Maps names to arrays or scalars, e.g. 'psik', 'step', and 'pops';
+            lists of arrays are concatenated.
+
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(state)
+
+    def close(self, remove=False):
+        """Write the queued checkpoint and stop the writer thread.
+
+        Parameters
+        ----------
+        remove : :obj:`bool`, default=False
+            Remove the checkpoint file, e.g. once the propagation finished.
+
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _drain(self):
+        """Write queued checkpoints, replacing the file atomically."""
+        while True:
+            state = self._queue.get()
+            if state is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                state = {k: np.concatenate([np.asarray(v) for v in val])
+                         if isinstance(val, list) else np.asarray(val)
+                         for k, val in state.items()}
+                with tempfile.NamedTemporaryFile(
+                        'wb', dir=os.path.dirname(self.path) or None,
+                        suffix='.npz', delete=False) as file:
+                    np.savez(file, **state)
+                os.replace(file.name, self.path)
+                self.n_written += 1
+            # pylint: disable=broad-except
+            except Exception as ex:
+                self._error = ex
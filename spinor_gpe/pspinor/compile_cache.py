@@ -0,0 +1,255 @@
+"""compile_cache.py module.
+
+Tools for avoiding compilation latency in short-lived processes.
+
+JAX's persistent compilation cache stores every compiled program on disk,
+keyed on its computation, shapes, and the JAX version; it is enabled with
+``enable_persistent_cache``. Independently, ``load_step`` compiles the
+``full_step`` kernel of single steps ahead of time for a given signature of
+its arguments, and serializes the executable, so later processes load it
+without tracing or compiling. The compiled propagation loops of
+``prop_loop`` are only covered by the persistent cache, and only when they
+have no host callbacks, i.e. without a progress bar, the default of
+propagators with a `compile_cache`, and without a monitor. The persistent
+cache is turned off again with ``disable_persistent_cache``.
+
+The cache can be prewarmed for a propagation from the command line, e.g.::
+
+    python -m spinor_gpe.pspinor.compile_cache --mesh 256 256 --n-steps 1000
+
+"""
+import argparse
+from functools import partial
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import jax
+import jax.numpy as jnp
+from jax.experimental import serialize_executable
+from jax.experimental.compilation_cache import compilation_cache
+
+from spinor_gpe.pspinor import splitting
+from spinor_gpe.pspinor import tensor_propagator as tprop
+
+#: Default root directory of the compilation caches.
+CACHE_DIR = os.environ.get('SPINOR_GPE_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'spinor_gpe'))
+
+#: Revision of the step kernels, bumped whenever their computation changes,
+#: so that stale serialized executables are not loaded.
+KERNEL_REVISION = 5
+#: The JAX options set by ``enable_persistent_cache``, with their previous
+#: values.
+_SAVED_CONFIG = {}
+
+
+def enable_persistent_cache(cache_dir=None):
+    """Store all compiled programs in JAX's persistent compilation cache.
+
+    Programs are cached regardless of their size or compile time.
+
+    Parameters
+    ----------
+    cache_dir : :obj:`str`, optional
+        The root cache directory. Default is ``CACHE_DIR``, which may be set
+        through the `SPINOR_GPE_CACHE_DIR` environment variable.
+
+    Returns
+    -------
+    path : :obj:`str`
+        The directory of the XLA cache.
+
+    """
+    path = os.path.join(cache_dir or CACHE_DIR, 'xla')
+    os.makedirs(path, exist_ok=True)
+    for name, value in (('jax_compilation_cache_dir', path),
+                        ('jax_persistent_cache_min_compile_time_secs', 0),
+                        ('jax_persistent_cache_min_entry_size_bytes', 0)):
+        _SAVED_CONFIG.setdefault(name, getattr(jax.config, name))
+        jax.config.update(name, value)
+    return path
+
+
+def disable_persistent_cache():
+    """Stop storing compiled programs in the persistent compilation cache.
+
+    The JAX options set by ``enable_persistent_cache`` are restored, and the
+    cache is closed, so that it may later be enabled in another directory,
+    e.g. by the next test.
+
+    """
+    for name, value in _SAVED_CONFIG.items():
+        jax.config.update(name, value)
+    _SAVED_CONFIG.clear()
+    compilation_cache.reset_cache()
+
+
+def step_signature(prop):
+    """The signature of the arguments of a step kernel.
+
+    The readable (grid, dtype, coupling, scheme, time) part is followed by a
+    hash of the structure, shapes, and dtypes of all of ``step_args()``, so
+    that kernels are only reused for identical abstract arguments.
+
+    Parameters
+    ----------
+    prop : :obj:`TensorPropagator`
+        The propagator.
+
+    Returns
+    -------
+    signature : :obj:`str`
+        E.g. '2x256x256-complex128-coupled-magic_gamma-imag-<hash>',
+        '8x2x256x256-...' for a batch of 8, or
+        '2x256x256-complex64+float64-...' for single precision with
+        double-precision accumulation.
+
+    """
+    shape = 'x'.join(str(n) for n in prop.psik.shape)
+    dtype = str(prop.psik.dtype)
+    if prop.acc_dtype is not None:
+        dtype += f"+{prop.acc_dtype}"
+    coupled = 'uncoupled' if prop.ops['coupl'] is None else 'coupled'
+    time = 'imag' if jnp.iscomplexobj(prop.ops['dt'][0]) else 'real'
+    leaves, tree = jax.tree_util.tree_flatten(prop.step_args())
+    abstract = [(jnp.shape(leaf), str(jnp.result_type(leaf)))
+                for leaf in leaves]
+    digest = hashlib.sha1(f"{tree}{abstract}".encode()).hexdigest()[:12]
+    return f"{shape}-{dtype}-{coupled}-{prop.scheme}-{time}-{digest}"
+
+
+def load_step(prop, cache_dir=None):
+    """Load the ahead-of-time compiled ``full_step`` kernel of `prop`.
+
+    The kernel is compiled and serialized to the ``aot`` subdirectory of the
+    cache on first use for each signature, backend, and JAX version, and
+    deserialized from there afterwards, for the current ``KERNEL_REVISION``.
+
+    Parameters
+    ----------
+    prop : :obj:`TensorPropagator`
+        The propagator. Splitting the grid across devices is not supported.
+    cache_dir : :obj:`str`, optional
+        The root cache directory. Default is ``CACHE_DIR``.
+
+    Returns
+    -------
+    step : :obj:`jax.stages.Compiled`
+        The compiled kernel, called as
+        ``step(psik, *prop.step_args())``.
+
+    """
+    assert prop.mesh is None, ("Ahead-of-time compilation does not support "
+                               "splitting the grid.")
+    path = os.path.join(cache_dir or CACHE_DIR, 'aot')
+    file_name = os.path.join(path, (f"full_step-{step_signature(prop)}-"
+                                    f"{jax.default_backend()}-"
+                                    f"jax{jax.__version__}-"
+                                    f"r{KERNEL_REVISION}.pkl"))
+    if os.path.exists(file_name):
+        with open(file_name, 'rb') as file:
+            payload, in_tree, out_tree = pickle.load(file)
+        return serialize_executable.deserialize_and_load(
+            payload, in_tree, out_tree,
+            execution_devices=list(prop.psik.devices()))
+
+    step_fn = partial(tprop.full_step, acc_dtype=prop.acc_dtype)
+    if prop.batched:
+        step_fn = jax.vmap(step_fn, in_axes=tprop.BATCH_AXES)
+    compiled = jax.jit(step_fn).lower(prop.psik, *prop.step_args()).compile()
+
+    # Written to a temporary file first, so that concurrent processes never
+    # read a partial executable.
+    os.makedirs(path, exist_ok=True)
+    with tempfile.NamedTemporaryFile('wb', dir=path, delete=False) as file:
+        pickle.dump(serialize_executable.serialize(compiled), file)
+    os.replace(file.name, file_name)
+    return compiled
+
+
+def prewarm(prop, n_steps):
+    """Compile the propagation loop of `prop` without running it.
+
+    With the persistent cache enabled, later processes propagating the same
+    grid for `n_steps` load the compiled loop from disk. JAX does not cache
+    programs with host callbacks, so only loops without a progress bar,
+    i.e. with ``progress_rate=0``, are cached.
+
+    Parameters
+    ----------
+    prop : :obj:`TensorPropagator`
+        The propagator.
+    n_steps : :obj:`int`
+        The number of steps of the propagation loop.
+
+    """
+    # Loops split for drift checks and checkpoints compile once per length.
+    for length in {count for _, count in prop.loop_segments(n_steps)}:
+        tprop.scan_steps.lower(
+            prop.psik, length, prop.progress_rate, 0, *prop.step_args(),
+            **prop.loop_kwargs()).compile()
+    tprop.full_step.lower(prop.psik, *prop.step_args(),
+                          acc_dtype=prop.acc_dtype).compile()
+
+
+def main(argv=None):
+    """Prewarm the compilation caches for a propagation."""
+    # pylint: disable=import-outside-toplevel
+    from spinor_gpe.pspinor import pspinor
+
+    parser = argparse.ArgumentParser(
+        description="Prewarm the compilation caches for a propagation.")
+    parser.add_argument('--mesh', type=int, nargs=2, default=(256, 256),
+                        metavar=('NX', 'NY'), help="Grid points.")
+    parser.add_argument('--r-sizes', type=float, nargs=2, default=(16, 16),
+                        metavar=('RX', 'RY'), help="Grid half-sizes.")
+    parser.add_argument('--n-steps', type=int, default=1000)
+    parser.add_argument('--t-step', type=float, default=1/50)
+    parser.add_argument('--time', choices=('imag', 'real'), default='imag')
+    parser.add_argument('--precision', choices=('single', 'double'),
+                        default='double')
+    parser.add_argument('--progress-rate', type=int, default=0,
+                        help="Must match the propagation; loops with a "
+                             "progress bar are not cached (default 0).")
+    parser.add_argument('--scheme', default='magic_gamma',
+                        choices=sorted(splitting.SCHEMES))
+    parser.add_argument('--renorm-rate', type=int, default=0,
+                        help="Real-time drift correction rate; must match "
+                             "the propagation.")
+    parser.add_argument('--coupling', type=float, default=None,
+                        help="Uniform coupling in units of the recoil "
+                             "energy; default is no coupling.")
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--no-aot', action='store_true',
+                        help="Skip serializing the full_step kernel.")
+    args = parser.parse_args(argv)
+
+    enable_persistent_cache(args.cache_dir)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        spin = pspinor.PSpinor(tmp_dir + os.sep, overwrite=True,
+                               mesh_points=tuple(args.mesh),
+                               r_sizes=tuple(args.r_sizes))
+        if args.coupling is not None:
+            spin.coupling_setup()
+            spin.coupling_uniform(args.coupling * spin.EL_recoil)
+        prop = tprop.TensorPropagator(spin, args.t_step, args.n_steps,
+                                      time=args.time,
+                                      progress_rate=args.progress_rate,
+                                      precision=args.precision,
+                                      renorm_rate=args.renorm_rate,
+                                      scheme=args.scheme)
+        prewarm(prop, args.n_steps)
+        if not args.no_aot:
+            load_step(prop, args.cache_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"Prewarmed {step_signature(prop)} for {args.n_steps} steps.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""diagnostics.py module.
+
+Streaming diagnostics of a propagation.
+
+A ``Monitor`` evaluates a set of observables of the wavefunction on-device
+every `rate` steps inside the compiled propagation loop. The values are sent
+to the host through ``jax.debug.callback``, which only queues them; a
+background thread then hands them to pluggable sinks, so that monitoring
+does not hold up the device:
+
+>>> monitor = Monitor(['pops', 'energy', 'com'], rate=100,
+...                   sinks=[MemorySink(), CSVSink('diagnostics.csv')])
+>>> res, prop = ps.real(1/50, 10000, monitor=monitor)
+>>> monitor.close()
+>>> data = monitor.sinks[0].data
+>>> plt.plot(data['time'], data['energy'].sum(axis=-1))
+
+Observables are functions ``fn(psik, args)`` of the packed k-space
+wavefunction, in FFT order, and of the :obj:`dict` of grids described in
+``TensorPropagator.monitor_args``; they return an array or a scalar. The
+built-in ones are listed in ``OBSERVABLES``.
+"""
+import csv
+import json
+import queue
+import threading
+
+import jax.numpy as jnp
+import numpy as np
+
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import tensor_propagator as tprop
+
+
+def populations(psik, args):
+    """The (2,) populations of the spin components."""
+    return jnp.sum(ttools.density(psik), axis=(-2, -1)) * args['dv_k']
+
+
+def norm_drift(psik, args):
+    """The relative drift of the total atom number."""
+    return jnp.sum(populations(psik, args)) / args['atom_num'] - 1
+
+
+def energy(psik, args):
+    """The (4,) [<kin.>, <pot.>, <int.>, <coupl.>] energies."""
+    return tprop.energy_terms(psik, args['kin'], args['pot'],
+                              args['coupling'], args['expon'], args['g_uu'],
+                              args['g_ud'], args['g_dd'], args['dr'],
+                              args['dv_r'], args['dv_k'])
+
+
+def max_density(psik, args):
+    """The (2,) peak real-space densities of the spin components."""
+    dens = ttools.density(ttools.ifft_2d(psik, args['dr'], shift=False))
+    return jnp.max(dens, axis=(-2, -1))
+
+
+def center_of_mass(psik, args):
+    """The (2, 2) (x, y) centers of mass of the spin components."""
+    dens = ttools.density(ttools.ifft_2d(psik, args['dr'], shift=False))
+    weights = dens / jnp.sum(dens, axis=(-2, -1), keepdims=True)
+    return jnp.stack([jnp.sum(weights * args['x_mesh'], axis=(-2, -1)),
+                      jnp.sum(weights * args['y_mesh'], axis=(-2, -1))],
+                     axis=-1)
+
+
+#: The built-in observables, by name.
+OBSERVABLES = {'pops': populations, 'norm_drift': norm_drift,
+               'energy': energy, 'max_density': max_density,
+               'com': center_of_mass}
+
+
+class Sink:
+    """Receives the rows of a ``Monitor``.
+
+    Each row is a :obj:`dict` of the global 'step', the propagation 'time',
+    and one NumPy array per observable. Sinks are written to from the
+    monitor's background thread only.
+    """
+
+    def write(self, row):
+        """Record a row of observables."""
+        raise NotImplementedError()
+
+    def flush(self):
+        """Push the rows written so far to storage, e.g. flush a file."""
+
+    def close(self):
+        """Finish writing, e.g. close a file."""
+
+
+class MemorySink(Sink):
+    """Keeps the rows in memory.
+
+    Attributes
+    ----------
+    rows : :obj:`list` of :obj:`dict`
+        The rows received so far, in the order they arrived.
+
+    """
+
+    def __init__(self):
+        """Start with no rows."""
+        self.rows = []
+
+    def write(self, row):
+        """Append a row."""
+        self.rows.append(row)
+
+    @property
+    def data(self):
+        """:obj:`dict` of NumPy :obj:`array`: The rows, sorted by step.
+
+        Each entry stacks the values of all rows along a leading axis.
+        """
+        rows = sorted(self.rows, key=lambda row: row['step'])
+        if not rows:
+            return {}
+        return {k: np.stack([row[k] for row in rows]) for k in rows[0]}
+
+
+class CSVSink(Sink):
+    """Writes the rows to a CSV file, one column per array element.
+
+    The columns of an observable 'com' of shape (2, 2) are named 'com_0_0',
+    'com_0_1', etc.
+    """
+
+    def __init__(self, path):
+        """Open the file.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The CSV file, which is overwritten.
+
+        """
+        self.path = path
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._header = None
+
+    def write(self, row):
+        """Write a row, and the header before the first one."""
+        if self._header is None:
+            self._header = []
+            for key, val in row.items():
+                idx = np.ndindex(np.shape(val))
+                self._header += ['_'.join([key, *map(str, i)]) for i in idx]
+            self._writer.writerow(self._header)
+        self._writer.writerow(np.concatenate([np.ravel(v) for v in
+                                              row.values()]).tolist())
+
+    def flush(self):
+        """Flush the file."""
+        self._file.flush()
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+class JSONLSink(Sink):
+    """Writes the rows to a JSON Lines file, one object per row."""
+
+    def __init__(self, path):
+        """Open the file.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The JSON Lines file, which is overwritten.
+
+        """
+        self.path = path
+        self._file = open(path, 'w')
+
+    def write(self, row):
+        """Write a row as a JSON object of (nested) lists."""
+        self._file.write(json.dumps({k: np.asarray(v).tolist()
+                                     for k, v in row.items()}) + '\n')
+
+    def flush(self):
+        """Flush the file."""
+        self._file.flush()
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+class Monitor:
+    """Evaluates observables in the propagation loop and streams them out.
+
+    A monitor is a static argument of the compiled loop: the loop is
+    compiled once per monitor, and a propagator reuses it for all of its
+    loop segments. ``TensorPropagator.prop_loop`` flushes the monitor at
+    its end; ``close`` it once it is no longer needed, which closes the
+    sinks.
+
+    Attributes
+    ----------
+    observables : :obj:`dict` of :obj:`callable`
+        The observables, by name.
+    rate : :obj:`int`
+        Number of steps between evaluations.
+    sinks : :obj:`list` of :obj:`Sink`
+        The sinks which receive every row.
+    n_rows : :obj:`int`
+        The number of rows handed to the sinks so far.
+
+    """
+
+    def __init__(self, observables=('pops', 'energy'), rate=100, sinks=None):
+        """Configure the monitor; the sinks are opened by the caller.
+
+        Parameters
+        ----------
+        observables : :obj:`list` of :obj:`str`, or :obj:`dict`
+            Names of built-in ``OBSERVABLES``, or a :obj:`dict` that maps
+            names to observable functions or built-in names.
+        rate : :obj:`int`, default=100
+            Number of steps between evaluations.
+        sinks : :obj:`list` of :obj:`Sink`, optional
+            Defaults to a single ``MemorySink``.
+
+        """
+        if not isinstance(observables, dict):
+            observables = {name: name for name in observables}
+        self.observables = {name: OBSERVABLES[fn] if isinstance(fn, str)
+                            else fn for name, fn in observables.items()}
+        assert rate > 0, "The monitoring rate must be positive."
+        self.rate = rate
+        self.sinks = [MemorySink()] if sinks is None else list(sinks)
+        self.n_rows = 0
+        self._error = None
+        self._queue = None
+        self._thread = None
+
+    def evaluate(self, psik, args):
+        """Evaluate all observables on-device.
+
+        Parameters
+        ----------
+        psik : :obj:`Array`
+            The packed (2, Ny, Nx) k-space wavefunction, in FFT order.
+        args : :obj:`dict` of :obj:`Array`
+            See ``TensorPropagator.monitor_args``.
+
+        Returns
+        -------
+        values : :obj:`dict` of :obj:`Array`
+            The value of each observable.
+
+        """
+        return {name: fn(psik, args) for name, fn in self.observables.items()}
+
+    def start(self):
+        """Start the thread which drains the queued rows into the sinks."""
+        if self._thread is not None:
+            return
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def emit(self, step, time, values):
+        """Queue a row of observables (host callback).
+
+        Only queues the values, so that the device is not held up by the
+        sinks.
+        """
+        if self._queue is None:
+            self.start()
+        # In the order of `observables`, rather than that of the pytree.
+        self._queue.put({'step': int(step), 'time': float(time),
+                         **{k: np.asarray(values[k])
+                            for k in self.observables}})
+
+    def flush(self):
+        """Wait until all queued rows are written, and flush the sinks."""
+        if self._queue is not None:
+            self._queue.join()
+        if self._error is not None:
+            raise self._error
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        """Write the queued rows, stop the thread, and close the sinks."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = self._thread = None
+        for sink in self.sinks:
+            sink.close()
+        if self._error is not None:
+            raise self._error
+
+    def _drain(self):
+        """Hand queued rows to the sinks until `None` is queued."""
+        while True:
+            row = self._queue.get()
+            try:
+                if row is None:
+                    break
+                if self._error is not None:
+                    continue
+                for sink in self.sinks:
+                    sink.write(row)
+                self.n_rows += 1
+            # pylint: disable=broad-except
+            except Exception as ex:
+                self._error = ex
+            finally:
+                self._queue.task_done()
+
@@ -0,0 +1,341 @@
+"""fft_backends.py module.
+
+Registry of the FFT backends of ``tensor_tools``.
+
+Every backend implements the same interface, ``FFTBackend``: n-dimensional
+forward and inverse transforms and the shifts of the zero-frequency
+component, over given axes, with NumPy's normalization. The backend of a
+transform follows from the type of its input: JAX arrays, including those
+traced inside the propagators' compiled steps, always use 'jax', and
+PyTorch tensors use 'torch'. Host NumPy arrays, e.g. those of the setup of
+a ``PSpinor``, can use any available host backend:
+
+- 'numpy': ``numpy.fft``, i.e. pocketfft; always available,
+- 'scipy': ``scipy.fft``, pocketfft with multithreading over all cores,
+- 'pyfftw': FFTW through pyFFTW, if installed, with its plans cached per
+  shape, dtype, and axes.
+
+On CPU-only nodes, the multithreaded backends can be considerably faster
+than NumPy's. Host arrays use the fixed ``DEFAULT_HOST`` backend, so that
+results do not depend on timing. With ``set_default('auto')``, or
+``backend='auto'``, they instead use the backend that ``fastest`` finds by
+timing each available host backend on their shape and dtype; the choice is
+cached, so each shape is timed once per process. Backends are looked up by
+name with ``get_backend``, and new ones are added with ``register``.
+"""
+import os
+import time
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import scipy.fft
+import torch
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+#: The axes of a 2D transform of a (..., Ny, Nx) array.
+AXES_2D = (-2, -1)
+
+
+class FFTBackend:
+    """The interface of an FFT backend.
+
+    Attributes
+    ----------
+    name : :obj:`str`
+        The name under which the backend is registered.
+    host : :obj:`bool`
+        Whether the backend transforms host NumPy arrays, and so is a
+        candidate of ``fastest``.
+
+    """
+
+    name = None
+    host = True
+
+    def available(self):
+        """Whether the backend's library can be used."""
+        return True
+
+    def fftn(self, arr, axes=AXES_2D):
+        """The unnormalized forward FFT of `arr` over `axes`."""
+        raise NotImplementedError()
+
+    def ifftn(self, arr, axes=AXES_2D):
+        """The inverse FFT of `arr` over `axes`, normalized by 1/N."""
+        raise NotImplementedError()
+
+    def fftshift(self, arr, axes=AXES_2D):
+        """Move the zero-frequency component of `arr` to the center."""
+        return np.fft.fftshift(arr, axes=axes)
+
+    def ifftshift(self, arr, axes=AXES_2D):
+        """Move the zero-frequency component of `arr` to the origin."""
+        return np.fft.ifftshift(arr, axes=axes)
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self.name}')"
+
+
+class JaxBackend(FFTBackend):
+    """``jax.numpy.fft``, for JAX arrays and traced values."""
+
+    name = 'jax'
+    host = False
+
+    def fftn(self, arr, axes=AXES_2D):
+        return jnp.fft.fftn(arr, axes=axes)
+
+    def ifftn(self, arr, axes=AXES_2D):
+        return jnp.fft.ifftn(arr, axes=axes)
+
+    def fftshift(self, arr, axes=AXES_2D):
+        return jnp.fft.fftshift(arr, axes=axes)
+
+    def ifftshift(self, arr, axes=AXES_2D):
+        return jnp.fft.ifftshift(arr, axes=axes)
+
+
+class TorchBackend(FFTBackend):
+    """``torch.fft``, for PyTorch tensors."""
+
+    name = 'torch'
+    host = False
+
+    def fftn(self, arr, axes=AXES_2D):
+        return torch.fft.fftn(arr, dim=axes)
+
+    def ifftn(self, arr, axes=AXES_2D):
+        return torch.fft.ifftn(arr, dim=axes)
+
+    def fftshift(self, arr, axes=AXES_2D):
+        return torch.fft.fftshift(arr, dim=axes)
+
+    def ifftshift(self, arr, axes=AXES_2D):
+        return torch.fft.ifftshift(arr, dim=axes)
+
+
+class NumpyBackend(FFTBackend):
+    """``numpy.fft`` (pocketfft), single-threaded."""
+
+    name = 'numpy'
+
+    def fftn(self, arr, axes=AXES_2D):
+        return np.fft.fftn(arr, axes=axes)
+
+    def ifftn(self, arr, axes=AXES_2D):
+        return np.fft.ifftn(arr, axes=axes)
+
+
+class ScipyBackend(FFTBackend):
+    """``scipy.fft`` (pocketfft), multithreaded over `workers`.
+
+    Attributes
+    ----------
+    workers : :obj:`int`
+        The number of threads; -1 uses all cores.
+
+    """
+
+    name = 'scipy'
+
+    def __init__(self, workers=-1):
+        self.workers = workers
+
+    def fftn(self, arr, axes=AXES_2D):
+        return scipy.fft.fftn(arr, axes=axes, workers=self.workers)
+
+    def ifftn(self, arr, axes=AXES_2D):
+        return scipy.fft.ifftn(arr, axes=axes, workers=self.workers)
+
+
+class FFTWBackend(FFTBackend):
+    """FFTW through pyFFTW, with cached plans.
+
+    Planning is done once per (shape, dtype, axes, direction); later
+    transforms copy their input into the plan's aligned arrays and reuse it.
+
+    Attributes
+    ----------
+    threads : :obj:`int`
+        The number of threads of the plans.
+    planner_effort : :obj:`str`
+        The FFTW planner flag, e.g. 'FFTW_ESTIMATE' or 'FFTW_MEASURE'.
+    plans : :obj:`dict`
+        The cached ``pyfftw.FFTW`` plans, by (shape, dtype, axes,
+        direction).
+
+    """
+
+    name = 'pyfftw'
+
+    def __init__(self, threads=None, planner_effort='FFTW_MEASURE'):
+        self.threads = threads or os.cpu_count()
+        self.planner_effort = planner_effort
+        self.plans = {}
+
+    def available(self):
+        return pyfftw is not None
+
+    def _plan(self, arr, axes, inverse):
+        """The cached plan of a transform of arrays like `arr`."""
+        key = (arr.shape, arr.dtype.str, tuple(axes), inverse)
+        if key not in self.plans:
+            builder = pyfftw.builders.ifftn if inverse else pyfftw.builders.fftn
+            self.plans[key] = builder(
+                pyfftw.empty_aligned(arr.shape, dtype=arr.dtype), axes=axes,
+                threads=self.threads, planner_effort=self.planner_effort)
+        return self.plans[key]
+
+    def fftn(self, arr, axes=AXES_2D):
+        # The plan's output array is reused by its next call.
+        return self._plan(arr, axes, False)(arr).copy()
+
+    def ifftn(self, arr, axes=AXES_2D):
+        return self._plan(arr, axes, True)(arr).copy()
+
+
+#: The registered backends, by name.
+BACKENDS = {}
+#: The default backend of host arrays.
+DEFAULT_HOST = 'scipy'
+#: The backend of host arrays: a registered host backend, or 'auto' for the
+#: ``fastest`` available one.
+_DEFAULT = {'host': DEFAULT_HOST}
+#: The fastest host backend of each (shape, dtype) timed by ``fastest``.
+_FASTEST = {}
+
+
+def register(backend):
+    """Add an ``FFTBackend`` to the registry, under its name."""
+    BACKENDS[backend.name] = backend
+    _FASTEST.clear()
+    return backend
+
+
+def get_backend(name):
+    """Look up a registered ``FFTBackend`` by name."""
+    assert name in BACKENDS, (f"Unknown FFT backend '{name}'; choose from "
+                              f"{sorted(BACKENDS)}.")
+    return BACKENDS[name]
+
+
+def available(host=True):
+    """The names of the registered backends that can be used.
+
+    Parameters
+    ----------
+    host : :obj:`bool`, default=True
+        Only list the backends of host NumPy arrays.
+
+    Returns
+    -------
+    names : :obj:`list` of :obj:`str`
+
+    """
+    return [name for name, backend in BACKENDS.items()
+            if backend.available() and (backend.host or not host)]
+
+
+def set_default(name=DEFAULT_HOST):
+    """Set the backend of host arrays; 'auto' opts in to ``fastest``."""
+    if name != 'auto':
+        assert get_backend(name).host, (f"The '{name}' backend does not "
+                                        "transform NumPy arrays.")
+        assert get_backend(name).available(), (f"The '{name}' backend is "
+                                               "not installed.")
+    _DEFAULT['host'] = name
+
+
+def benchmark(shape, dtype=np.complex128, names=None, n_repeats=5,
+              axes=AXES_2D):
+    """Time a forward and inverse FFT with each host backend.
+
+    Parameters
+    ----------
+    shape : :obj:`tuple` of :obj:`int`
+        The shape of the transformed arrays.
+    dtype : :obj:`dtype`, default=complex128
+        Their dtype.
+    names : :obj:`list` of :obj:`str`, optional
+        The backends to time. Default is all the available host backends.
+    n_repeats : :obj:`int`, default=5
+        The number of timed calls of each backend, after a warm-up call,
+        which also plans the transforms of planning backends.
+    axes : :obj:`tuple` of :obj:`int`, default=(-2, -1)
+        The transformed axes.
+
+    Returns
+    -------
+    times : :obj:`dict` of :obj:`float`
+        The median time of a forward and inverse FFT of each backend [s].
+
+    """
+    rng = np.random.default_rng(0)
+    arr = (rng.standard_normal(shape) + 1j * rng.standard_normal(shape))
+    arr = arr.astype(dtype)
+    times = {}
+    for name in names or available():
+        backend = get_backend(name)
+        backend.ifftn(backend.fftn(arr, axes), axes)
+        calls = []
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            backend.ifftn(backend.fftn(arr, axes), axes)
+            calls.append(time.perf_counter() - start)
+        times[name] = float(np.median(calls))
+    return times
+
+
+def fastest(shape, dtype=np.complex128):
+    """The fastest available host backend for arrays of a shape and dtype.
+
+    The backends are timed with ``benchmark`` on the first call for each
+    shape and dtype, and the choice is cached.
+
+    """
+    key = (tuple(shape), np.dtype(dtype).str)
+    if key not in _FASTEST:
+        times = benchmark(shape, dtype)
+        _FASTEST[key] = min(times, key=times.get)
+    return _FASTEST[key]
+
+
+def for_array(arr, name=None):
+    """The backend that transforms an array.
+
+    Parameters
+    ----------
+    arr : NumPy :obj:`array`, JAX :obj:`Array`, or PyTorch :obj:`Tensor`
+        The array, or a component of the transformed wavefunction.
+    name : :obj:`str`, optional
+        The backend of host arrays, or 'auto' for the ``fastest`` for the
+        array's shape and dtype. Default is the one of ``set_default``,
+        initially ``DEFAULT_HOST``.
+        JAX arrays and PyTorch tensors always use the 'jax' and 'torch'
+        backends.
+
+    Returns
+    -------
+    backend : :obj:`FFTBackend`
+
+    """
+    if isinstance(arr, jax.Array):
+        return BACKENDS['jax']
+    if isinstance(arr, torch.Tensor):
+        return BACKENDS['torch']
+    name = name or _DEFAULT['host']
+    if name == 'auto':
+        name = fastest(np.shape(arr), np.result_type(arr, np.complex64))
+    return get_backend(name)
+
+
+register(JaxBackend())
+register(TorchBackend())
+register(NumpyBackend())
+register(ScipyBackend())
+register(FFTWBackend())
@@ -0,0 +1,121 @@
+"""op_cache.py module."""
+import collections
+import hashlib
+
+import jax
+import numpy as np
+
+
+def content_hash(*arrays):
+    """Hash the shapes, dtypes, and contents of several arrays.
+
+    Parameters
+    ----------
+    *arrays : NumPy :obj:`array`, :obj:`list` of :obj:`array`, or scalar
+        The arrays to hash. Lists, e.g. of spin components, are hashed
+        element by element.
+
+    Returns
+    -------
+    digest : :obj:`str`
+        The hexadecimal digest.
+
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for arr in jax.tree.leaves(list(arrays)):
+        arr = np.ascontiguousarray(arr)
+        digest.update(f"{arr.shape}{arr.dtype}".encode())
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+def tree_nbytes(tree):
+    """The total number of bytes of the arrays in a pytree."""
+    return sum(getattr(leaf, 'nbytes', 0) for leaf in jax.tree.leaves(tree))
+
+
+class OperatorCache:
+    """Least-recently-used cache of device-resident evolution operators.
+
+    Building a ``TensorPropagator`` transfers the energy grids to the device
+    and exponentiates them into evolution operators. Entries of this cache
+    hold those device arrays, so that propagators sharing a time step and
+    Hamiltonian, e.g. back-to-back runs that only differ in `n_steps`, reuse
+    them. The least recently used entries are evicted once the cached arrays
+    occupy more than `max_bytes`.
+
+    Attributes
+    ----------
+    max_bytes : :obj:`int`
+        The memory cap of the cache, in bytes.
+    nbytes : :obj:`int`
+        The memory currently occupied by cached arrays, in bytes.
+    hits : :obj:`int`
+        The number of lookups that found an entry.
+    misses : :obj:`int`
+        The number of lookups that built a new entry.
+
+    """
+
+    def __init__(self, max_bytes=2**30):
+        """Create an empty cache.
+
+        Parameters
+        ----------
+        max_bytes : :obj:`int`, default=2**30
+            The memory cap of the cache, in bytes.
+
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, build):
+        """Look up an entry, building and storing it if it is missing.
+
+        Parameters
+        ----------
+        key : :obj:`tuple`
+            A hashable key identifying the entry.
+        build : :obj:`callable`
+            Called without arguments to build a missing entry, a pytree of
+            arrays. Entries larger than `max_bytes` are returned uncached.
+
+        Returns
+        -------
+        value :
+            The cached or newly built entry.
+
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        self.misses += 1
+        value = build()
+        size = tree_nbytes(value)
+        if size <= self.max_bytes:
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.nbytes -= old_size
+        return value
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
+        self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+#: The cache shared by all propagators.
+OPERATORS = OperatorCache()
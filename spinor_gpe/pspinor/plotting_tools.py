@@ -1,11 +1,14 @@
 """plotting_tools.py module."""
 import os
 import sys
+import threading
 import time as t
 
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib import gridspec
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 from spinor_gpe.pspinor import tensor_tools as ttools
 
@@ -234,14 +237,49 @@ def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
         :obj:`matplotlib.image.AxesImage` for both spins.
 
     """
-    # pylint: disable=unused-variable
     dens = ttools.density(psi)
     phase = ttools.phase(psi, uwrap=False, dens=dens)
     densk = ttools.density(psik)
+    fig, all_plots = spins_figure(dens, phase, densk, extents, cmap=cmap,
+                                  zoom=zoom)
+
+    # Save figure
+    if save:
+        test_name = paths['data'] + 'spin_dens_phase'
+        file_name = next_available_path(test_name, paths['folder'], ext)
+        plt.savefig(file_name)
+    if show:
+        plt.show()
+    return fig, all_plots
+
+
+def spins_figure(dens, phase, densk, extents, cmap='viridis', zoom=1.0,
+                 fig=None):
+    """Lay out the densities (real & k) and phases of spin components.
+
+    Parameters
+    ----------
+    dens, phase, densk : :obj:`list` of NumPy :obj:`array`
+        The real-space densities and phases, and the momentum-space
+        densities, of both spins.
+    fig : :obj:`plt.Figure`, optional
+        An empty figure to draw on. Default is a new pyplot figure.
 
+    Other parameters are the same as for ``plot_spins``.
+
+    Returns
+    -------
+    fig : :obj:`plt.Figure`
+        The matplotlib figure for the plot.
+    all_plots : :obj:`dict` of :obj:`list`
+        See ``plot_spins``.
+
+    """
+    # pylint: disable=unused-variable
     widths = [1] * 4
     heights = [1] * 6
-    fig = plt.figure(figsize=(5.5, 6.4))
+    if fig is None:
+        fig = plt.figure(figsize=(5.5, 6.4))
     gsp = gridspec.GridSpec(6, 4, width_ratios=widths, height_ratios=heights)
 
     r_axs = [fig.add_subplot(gsp[0:2, 0:2]), fig.add_subplot(gsp[0:2, 2:])]
@@ -280,20 +318,89 @@ def plot_spins(psi, psik, extents, paths, cmap='viridis', save=True,
     all(ax.set_xlim(zoom_kext[:2]) for ax in k_axs)
     all(ax.set_ylim(zoom_kext[2:]) for ax in k_axs)
 
-    plt.tight_layout()
-
-    # Save figure
-    if save:
-        test_name = paths['data'] + 'spin_dens_phase'
-        file_name = next_available_path(test_name, paths['folder'], ext)
-        plt.savefig(file_name)
-    if show:
-        plt.show()
+    fig.tight_layout()
 
     all_plots = {'r': r_plots, 'ph': ph_plots, 'k': k_plots}
     return fig, all_plots
 
 
+#: The figure of each movie render thread; see ``init_movie_worker``.
+_MOVIE = threading.local()
+#: Serializes the layout of the movie figures; Matplotlib's mathtext parser
+#: is shared by all canvases, and is not thread-safe.
+_LAYOUT_LOCK = threading.Lock()
+
+
+def init_movie_worker(frame, extents, cmap='viridis', zoom=1.0):
+    """Lay out the movie figure once in a render thread.
+
+    Each thread draws its own figure on its own Agg canvas, outside of
+    pyplot, so that rendering leaves the backend and figures of pyplot
+    alone. The figure is laid out and drawn once under a lock, after which
+    its labels are cached by its canvas.
+
+    Parameters
+    ----------
+    frame : :obj:`dict` of NumPy :obj:`array`
+        A frame of (2, ny, nx) 'r', 'ph', and 'k' arrays, i.e. the real-space
+        densities and phases, and the momentum-space densities; see
+        ``prop_result.movie_frames``.
+    extents : :obj:`dict` of :obj:`iterable`
+        See ``plot_spins``.
+    cmap : :obj:`str`, default='viridis'
+        Matplotlib color map name for the density plots.
+    zoom : :obj:`float`, default=1.0
+        A zoom factor for the k-space density plot.
+
+    """
+    fig = Figure(figsize=(5.5, 6.4))
+    FigureCanvasAgg(fig)
+    with _LAYOUT_LOCK:
+        _MOVIE.fig, _MOVIE.plots = spins_figure(
+            list(frame['r']), list(frame['ph']), list(frame['k']), extents,
+            cmap=cmap, zoom=zoom, fig=fig)
+        fig.canvas.draw()
+
+
+def close_movie_worker():
+    """Release the movie figure of ``init_movie_worker``."""
+    fig = getattr(_MOVIE, 'fig', None)
+    _MOVIE.fig = _MOVIE.plots = None
+    if fig is not None:
+        fig.clear()
+
+
+def render_frames(frames, norm_val=1.0):
+    """Render a batch of movie frames to RGB images in a render thread.
+
+    Parameters
+    ----------
+    frames : :obj:`dict` of NumPy :obj:`array`
+        The (n, 2, ny, nx) 'r', 'ph', and 'k' arrays of `n` frames.
+    norm_val : :obj:`float`, default=1.0
+        The density color maps span from zero to the sum of the maximum
+        densities of both spins, divided by `norm_val`.
+
+    Returns
+    -------
+    images : NumPy :obj:`array`
+        The (n, height, width, 3) uint8 images.
+
+    """
+    fig, all_plots = _MOVIE.fig, _MOVIE.plots
+    images = []
+    for i in range(len(frames['r'])):
+        for key, plots in all_plots.items():
+            any(plot.set_data(d) for plot, d in zip(plots, frames[key][i]))
+        for key in ('r', 'k'):
+            vmax = np.max(frames[key][i], axis=(-2, -1)).sum() / norm_val
+            any(plot.set_clim(0, vmax) for plot in all_plots[key])
+        fig.canvas.draw()
+        # The buffer is reused by the next draw.
+        images.append(np.array(fig.canvas.buffer_rgba())[..., :3])
+    return np.stack(images)
+
+
 def plot_total(psi, psik, extents, paths, cmap='viridis', save=True,
                ext='.pdf', show=True, zoom=1.0):
     """Plot the total densities and phase of the wavefunction.
@@ -0,0 +1,215 @@
+"""profiling.py module.
+
+Timing breakdown of the phases of a propagation step.
+
+``full_step`` and ``single_step`` label each of their phases with a named
+scope, so that profiler traces, e.g. those written by a propagator with the
+`profile` option, attribute the device time of the compiled step to its
+phases. Since XLA fuses neighbouring phases, a trace of the fused kernel
+does not always separate them; ``profile_step`` instead compiles and times
+each phase on its own, with the bytes it moves from XLA's cost analysis,
+and compares their sum with the fused step:
+
+>>> report = profile_step(prop)
+>>> print(format_report(report))
+
+"""
+import time
+from functools import partial
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from spinor_gpe.pspinor import tensor_tools as ttools
+from spinor_gpe.pspinor import tensor_propagator as tprop
+
+#: The phases of a step, in the order in which they are applied.
+PHASES = ('kinetic', 'ifft', 'norm', 'interaction', 'coupling', 'potential',
+          'fft')
+
+
+def trace_dir(paths, profile=True):
+    """The directory of the profiler traces of a trial.
+
+    Parameters
+    ----------
+    paths : :obj:`dict`
+        See ``pspinor.PSpinor``.
+    profile : :obj:`bool` or :obj:`str`, default=True
+        A directory overrides the default.
+
+    Returns
+    -------
+    path : :obj:`str`
+        E.g. 'data/Trial_000/trial_data/profile/'.
+
+    """
+    if isinstance(profile, str):
+        return profile
+    return paths['trial'] + 'profile/'
+
+
+def _interaction(psi, g_mat, t_step):
+    """The interaction phase: the density-dependent evolution operator."""
+    int_eng = jnp.einsum('ij,j...->i...', g_mat, ttools.density(psi))
+    return ttools.evolution_op(t_step / 2, int_eng) * psi
+
+
+def step_phases(prop):
+    """Collect the phases of a step of a propagator as separate functions.
+
+    Parameters
+    ----------
+    prop : :obj:`TensorPropagator`
+        The propagator, with its grid on a single device.
+
+    Returns
+    -------
+    phases : :obj:`dict` of :obj:`tuple`
+        Maps the name of each phase in ``PHASES`` that the step applies to
+        (`func`, `args`, `calls`): the phase as a function of the arrays
+        `args`, and the number of times it is called in a full step of the
+        splitting scheme.
+
+    """
+    assert prop.mesh is None and not prop.batched, (
+        "Phases are only profiled on a single, unbatched grid.")
+    ops, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, _, atom_num = prop.step_args()
+    t_step = ops['dt'][0]
+    g_mat = jnp.array([[g_sc_uu, g_sc_ud], [g_sc_ud, g_sc_dd]])
+    psik = prop.psik
+    psi = ttools.ifft_2d(psik, delta_r=dr, shift=False)
+    # The real-space sub-steps, as in ``full_step``.
+    n_real = 2 * len(ops['dt']) - (len(ops['kin']) == len(ops['dt']))
+
+    def norm(psi, dv_r, atom_num):
+        return ttools.norm(psi, dv_r, atom_num, acc_dtype=prop.acc_dtype)
+
+    phases = {
+        'kinetic': (jnp.multiply, (ops['kin'][0], psik), n_real + 1),
+        'ifft': (partial(ttools.ifft_2d, shift=False), (psik, dr), n_real),
+        'interaction': (_interaction, (psi, g_mat, t_step), n_real),
+        'potential': (jnp.multiply, (ops['pot'][0], psi), n_real),
+        'fft': (partial(ttools.fft_2d, shift=False), (psi, dr), n_real)}
+    if jnp.iscomplexobj(t_step):
+        phases['norm'] = (norm, (psi, dv_r, atom_num), n_real + 1)
+    if ops['coupl'] is not None:
+        phases['coupling'] = (ttools.apply_coupling, (ops['coupl'][0], psi),
+                              2 * n_real)
+    return {name: phases[name] for name in PHASES if name in phases}
+
+
+def time_function(func, args, n_repeats=20):
+    """Compile a function and time its calls.
+
+    Parameters
+    ----------
+    func : :obj:`callable`
+        The function of the arrays `args`.
+    args : :obj:`tuple`
+        Its arguments.
+    n_repeats : :obj:`int`, default=20
+        The number of timed calls, after a warm-up call.
+
+    Returns
+    -------
+    seconds : :obj:`float`
+        The median time of a call.
+    n_bytes : :obj:`float`
+        The bytes read and written by the compiled function, from XLA's
+        cost analysis; NaN if the backend does not report it.
+
+    """
+    compiled = jax.jit(func).lower(*args).compile()
+    cost = compiled.cost_analysis()
+    if isinstance(cost, (list, tuple)):
+        cost = cost[0] if cost else None
+    n_bytes = float((cost or {}).get('bytes accessed', np.nan))
+    jax.block_until_ready(compiled(*args))
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        jax.block_until_ready(compiled(*args))
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), n_bytes
+
+
+def profile_step(prop, n_repeats=20, trace=False):
+    """Time each phase of a propagator's step and the fused full step.
+
+    Parameters
+    ----------
+    prop : :obj:`TensorPropagator`
+        The propagator, with its grid on a single device.
+    n_repeats : :obj:`int`, default=20
+        The number of timed calls of each phase.
+    trace : :obj:`bool` or :obj:`str`, default=False
+        Also record a profiler trace of the timed full steps in the trial
+        directory, or in the given directory; see ``trace_dir``.
+
+    Returns
+    -------
+    report : :obj:`dict`
+        - 'phases': for each phase of ``step_phases``, a :obj:`dict` of its
+          'calls' per full step, the median 'time' [s] and 'bytes' of a call,
+          the achieved 'bandwidth' [bytes/s], and its 'step_time' [s], the
+          time of all its calls in a full step,
+        - 'full_step': the 'time', 'bytes', and 'bandwidth' of the fused
+          ``full_step``,
+        - 'shape' and 'dtype': of the wavefunction.
+
+    """
+    phases = {}
+    for name, (func, args, calls) in step_phases(prop).items():
+        seconds, n_bytes = time_function(func, args, n_repeats)
+        phases[name] = {'calls': calls, 'time': seconds, 'bytes': n_bytes,
+                        'bandwidth': n_bytes / seconds,
+                        'step_time': calls * seconds}
+
+    step = partial(tprop.full_step, acc_dtype=prop.acc_dtype)
+    args = (prop.psik, *prop.step_args())
+    if trace:
+        with jax.profiler.trace(trace_dir(prop.paths, trace)):
+            seconds, n_bytes = time_function(step, args, n_repeats)
+    else:
+        seconds, n_bytes = time_function(step, args, n_repeats)
+    return {'phases': phases,
+            'full_step': {'time': seconds, 'bytes': n_bytes,
+                          'bandwidth': n_bytes / seconds},
+            'shape': tuple(prop.psik.shape), 'dtype': str(prop.psik.dtype)}
+
+
+def format_report(report):
+    """Format a ``profile_step`` report as a table.
+
+    Parameters
+    ----------
+    report : :obj:`dict`
+        See ``profile_step``.
+
+    Returns
+    -------
+    table : :obj:`str`
+        One row per phase, with its calls per step, time per call, bytes
+        per call, bandwidth, and share of the summed phase times, followed
+        by the sum and the fused full step.
+
+    """
+    total = sum(p['step_time'] for p in report['phases'].values())
+    lines = [f"Step phases of a {report['shape']} {report['dtype']} "
+             "wavefunction",
+             f"{'phase':<12}{'calls':>6}{'time/call':>12}{'MB/call':>10}"
+             f"{'GB/s':>9}{'share':>8}"]
+    for name, phase in report['phases'].items():
+        lines.append(f"{name:<12}{phase['calls']:>6}"
+                     f"{phase['time'] * 1e6:>10.1f}us"
+                     f"{phase['bytes'] / 1e6:>10.2f}"
+                     f"{phase['bandwidth'] / 1e9:>9.2f}"
+                     f"{phase['step_time'] / total:>8.1%}")
+    full = report['full_step']
+    lines.append(f"{'sum':<12}{'':>6}{total * 1e6:>10.1f}us")
+    lines.append(f"{'full_step':<12}{1:>6}{full['time'] * 1e6:>10.1f}us"
+                 f"{full['bytes'] / 1e6:>10.2f}"
+                 f"{full['bandwidth'] / 1e9:>9.2f}")
+    return '\n'.join(lines)
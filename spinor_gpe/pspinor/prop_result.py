@@ -1,16 +1,23 @@
 """prop_result.py module."""
+import collections
+from concurrent import futures
+from functools import partial
+import itertools
 import os
+import shutil
 import warnings
 import sys
 import subprocess
 
+import jax
+import jax.numpy as jnp
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib import gridspec
-import matplotlib.animation as ani
 
 from spinor_gpe.pspinor import tensor_tools as ttools
 from spinor_gpe.pspinor import plotting_tools as ptools
+from spinor_gpe.pspinor import sampling
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-locals
@@ -29,9 +36,13 @@ class PropResult:
         The energy expectation values: [<total>, <kin.>, <pot.>, <int.>].
     pops : :obj:`dict` of :obj:`array`
         Times and populations at every time step, {'times', 'vals'}.
+    energies : :obj:`dict` of :obj:`array` or `None`
+        With an `energy_rate`, the 'times' and (n, 4) [<kin.>, <pot.>,
+        <int.>, <coupl.>] energies 'vals' logged during the propagation;
+        see ``TensorPropagator.prop_loop``.
     sampled_path : :obj:`str`
-        Path to the .npz file where the sampled wavefunctions and times are
-        stored for this result.
+        Path to the snapshot store of the sampled wavefunctions and times of
+        this result; see ``sampling.SnapshotStore``.
     dens : :obj:`list` of :obj:`array`
         The final real-space densities.
     densk : :obj:`list` of :obj:`array`
@@ -44,6 +55,18 @@ class PropResult:
         See ``pspinor.PSpinor``.
     space : :obj:`dict` of :obj:`array`
         See ``tensor_propagator.TensorPropagator``.
+    batch_size : :obj:`int` or `None`
+        The number of ensemble members for a batched result, in which case
+        the wavefunctions have shape (batch, Ny, Nx), the energies have
+        shape (batch, 4), and the populations have shape (n_steps, batch, 2).
+        `None` for a single propagation.
+    n_iter : :obj:`int` or `None`
+        The number of full time steps taken.
+    convergence : :obj:`dict` or `None`
+        For imaginary-time propagation with a convergence tolerance, the
+        'criterion', 'tol', whether the propagation 'converged', and the
+        convergence measure 'vals' after the numbers of 'steps' at which it
+        was checked.
 
     """
 
@@ -63,14 +86,15 @@ class PropResult:
             dict of {str: NumPy :obj:`array`}. Contains the 'times' and 'vals'
             of the spin components' populations throughout the propagation.
         sampled_path : :obj:`str`, optional
-            The path to the .npz file where the sampled wavefunctions and
-            times are stored for this result.
+            The path to the snapshot store of the sampled wavefunctions of
+            this result.
 
         """
         self.psi = psi_final
         self.psik = psik_final
         self.eng_final = eng_final
         self.pops = pops
+        self.energies = None
         self.sampled_path = sampled_path
 
         self.dens = ttools.density(self.psi)
@@ -80,6 +104,41 @@ class PropResult:
         self.paths = dict()
         self.time_scale = None
         self.space = dict()
+        self.n_iter = None
+        self.convergence = None
+
+        if np.ndim(self.psi[0]) == 3:
+            self.batch_size = len(self.psi[0])
+        else:
+            self.batch_size = None
+
+    def select(self, index):
+        """Extract the result of a single member of a batched propagation.
+
+        Parameters
+        ----------
+        index : :obj:`int`
+            The index of the ensemble member.
+
+        Returns
+        -------
+        result : :obj:`PropResult`
+            The unbatched result. Sampled wavefunctions are not carried over.
+
+        """
+        assert self.batch_size is not None, "This result is not batched."
+        pops = {'times': self.pops['times'],
+                'vals': self.pops['vals'][:, index]}
+        result = PropResult([p[index] for p in self.psi],
+                            [pk[index] for pk in self.psik],
+                            self.eng_final[index], pops)
+        if self.energies is not None:
+            result.energies = {'times': self.energies['times'],
+                               'vals': self.energies['vals'][:, index]}
+        result.paths = self.paths
+        result.time_scale = self.time_scale
+        result.space = self.space
+        return result
 
     def calc_separation(self):
         """Calculate the phase separation of the two spin components."""
@@ -87,6 +146,58 @@ class PropResult:
                  / np.sqrt(np.sum(self.dens[0]**2) * np.sum(self.dens[1]**2)))
         return s
 
+    def load_samples(self, mmap=True):
+        """Load the sampled wavefunctions and times.
+
+        Parameters
+        ----------
+        mmap : :obj:`bool`, default=True
+            Return the snapshot store rather than reading the sampled
+            wavefunctions into memory, so that frames are only loaded as
+            they are used.
+
+        Returns
+        -------
+        times : NumPy :obj:`array`
+            The sampled times, in dimensionless time units.
+        psiks : :obj:`SnapshotStore` or NumPy :obj:`array`
+            The (n_samples, 2, Ny, Nx) sampled k-space wavefunctions.
+
+        """
+        psiks = sampling.SnapshotStore(self.sampled_path)
+        times = psiks.times
+        if not mmap:
+            psiks = np.asarray(psiks)
+        return times, psiks
+
+    def analyze_samples(self, spin=None, chunk=64):
+        """Compute the time series of observables of the sampled frames.
+
+        The samples are streamed from the snapshot store in chunks, and each
+        chunk is analyzed in a single vectorized pass; see
+        ``analysis.analyze``.
+
+        Parameters
+        ----------
+        spin : :obj:`PSpinor`, optional
+            The spinor whose Hamiltonian evaluates the energy components.
+            Default is not to compute the energies.
+        chunk : :obj:`int`, default=64
+            The number of samples analyzed together.
+
+        Returns
+        -------
+        series : :obj:`dict` of NumPy :obj:`array`
+            The sampled 'times', and the 'pops', 'com', 'width',
+            'separation', and optionally 'energies' of each sample.
+
+        """
+        # pylint: disable=import-outside-toplevel
+        from spinor_gpe.pspinor import analysis
+        ham = None if spin is None else analysis.hamiltonian(spin)
+        _, psiks = self.load_samples()
+        return analysis.analyze(psiks, self.space, ham, chunk)
+
     def plot_spins(self, rscale=1.0, kscale=1.0, cmap='viridis', save=True,
                    ext='.pdf', show=True, zoom=1.0):
         """Plot the densities (real & k) and phases of spin components.
@@ -162,9 +273,54 @@ class PropResult:
                                            ext=ext, show=show, zoom=zoom)
         return fig, all_plots
 
-    def plot_eng(self):
-        """Plot the sampled energy expectation values."""
-        raise NotImplementedError()
+    def plot_eng(self, scaled=True, save=True, ext='.pdf'):
+        """Plot the logged energy components as a function of time.
+
+        Parameters
+        ----------
+        scaled : :obj:`bool`, optional
+            If `scaled` is True then the time-axis will be rescaled into
+            proper time units. Otherwise, it's left in dimensionless time
+            units.
+        save : :obj:`bool`, optional
+            Saves the figure as a .pdf file (default). The filename has the
+            format "/`data_path`/eng_evolution%s-`trial_name`.pdf".
+        ext : :obj:`str`, optional
+            File extension for the saved plot image.
+        """
+        assert self.energies is not None, (
+            "No energies were logged; propagate with an `energy_rate`.")
+        if scaled:
+            xlabel = 'Time [s]'
+            scale = self.time_scale
+        else:
+            xlabel = 'Time [$1/\\omega_x$]'
+            scale = 1.0
+        times = self.energies['times'] * scale
+        vals = self.energies['vals']
+        total = np.sum(vals, axis=-1)
+
+        fig = plt.figure(figsize=(12, 4))
+        ax0 = fig.add_subplot(121)
+        lines = ax0.plot(times, vals)
+        ax0.set_ylabel('Energy [$\\hbar \\omega_x$]')
+        ax0.set_xlabel(xlabel)
+        ax0.grid(alpha=0.5)
+        ax0.legend(lines, ('Kinetic', 'Potential', 'Interaction', 'Coupling'))
+
+        ax1 = fig.add_subplot(122)
+        ax1.plot(times, np.abs(total / total[0] - 1))
+        ax1.set_xlabel(xlabel)
+        ax1.set_ylabel('Rel. Total Energy Change')
+        ax1.grid(alpha=0.5)
+        ax1.set_yscale('log')
+
+        if save:
+            test_name = self.paths['data'] + 'eng_evolution'
+            file_name = ptools.next_available_path(test_name,
+                                                   self.paths['folder'], ext)
+            plt.savefig(file_name)
+        plt.show()
 
     def plot_pops(self, scaled=True, save=True, ext='.pdf'):
         """Plot the spin populations as a function of propagation time.
@@ -218,9 +374,13 @@ class PropResult:
         raise NotImplementedError()
 
     def make_movie(self, rscale=1.0, kscale=1.0, cmap='viridis', play=False,
-                   zoom=1.0, norm_type='all'):
+                   zoom=1.0, norm_type='all', fps=5, new_shape=(256, 256),
+                   n_workers=None, batch=16):
         """Generate a movie of the wavefunctions' densities and phases.
 
+        The frames are computed and rendered by ``movie_images``, and piped
+        to ``ffmpeg`` as raw RGB video.
+
         Parameters
         ----------
         rscale : :obj:`float`, optional
@@ -234,65 +394,54 @@ class PropResult:
         play : :obj:`bool`, default=False
             If True, the movie is opened in the computer's default media
             player after it is saved.
-        kzoom : :obj:`float`, optional
+        zoom : :obj:`float`, optional
             A zoom factor for the k-space density plot.
         norm_type : :obj:`str`, optional
             {'all', 'half'} Normalizes the colormaps to the full or half sum
             of the max densites. 'half' is useful for visualizing situations
             where the population is equally divided between the two spins.
+        fps : :obj:`int`, default=5
+            Frames per second of the movie.
+        new_shape, n_workers, batch
+            See ``movie_images``.
 
         """
-        def animate(frame, n_total, val):
-            global timelast, timethis
-            psik = psiks[frame]
-            psi = ttools.ifft_2d(psik, self.space['dr'])
-
-            dens = ttools.density(psi)
-            phase = ttools.phase(psi, uwrap=False, dens=dens)
-            densk = ttools.density(psik)
-            max_r = [np.max(d) for d in dens]
-            max_k = [np.max(d) for d in densk]
-
-            any(plot.set_data(d) for plot, d in zip(all_plots['r'], dens))
-            any(plot.set_data(ph) for plot, ph in zip(all_plots['ph'], phase))
-            any(plot.set_data(dk) for plot, dk in zip(all_plots['k'], densk))
-
-            any(plot.set_clim(0, sum(max_r) / val) for plot in all_plots['r'])
-            any(plot.set_clim(0, sum(max_k) / val) for plot in all_plots['k'])
-
-            ptools.progress_message(frame, n_total)
-
         if not os.path.exists(str((self.sampled_path))):
             warnings.warn("Cannot generate propagation movie. No sampled "
                           "wavefuntion data exists.")
             return
+        if shutil.which('ffmpeg') is None:
+            warnings.warn("Cannot generate propagation movie. `ffmpeg` is "
+                          "not installed.")
+            return
 
-        if norm_type == 'all':
-            norm_val = 1.0
-        elif norm_type == 'half':
-            norm_val = 2.0
-
-        with np.load(self.sampled_path) as sampled:
-            times = sampled['times']
-            psiks = sampled['psiks']
-            # ??? Need to rebin grids for speed?
-
-        n_samples = len(times)
-        writer = ani.writers['ffmpeg'](fps=5, bitrate=-1)
-        fig, all_plots = self.plot_spins(rscale, kscale, cmap, save=False,
-                                         show=False, zoom=zoom)
-
-        # Create and then save the animation
-        anim = ani.FuncAnimation(fig, animate, frames=n_samples, blit=False,
-                                 fargs=(n_samples, norm_val,))
-
-        # Save animation
         test_name = self.paths['data'] + 'prop_movie'
         file_name = ptools.next_available_path(test_name,
                                                self.paths['folder'],
                                                '.mp4')
-        anim.save(file_name, writer=writer)
-        plt.close(fig)
+        n_total = len(sampling.SnapshotStore(self.sampled_path))
+        images = self.movie_images(rscale, kscale, cmap, zoom, norm_type,
+                                   new_shape, n_workers, batch)
+        writer = None
+        for frame, image in enumerate(images):
+            if writer is None:
+                height, width = image.shape[:2]
+                # H.264 needs even frame dimensions.
+                writer = subprocess.Popen(
+                    ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo',
+                     '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+                     '-r', str(fps), '-i', '-',
+                     '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                     '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', file_name],
+                    stdin=subprocess.PIPE)
+            writer.stdin.write(image.tobytes())
+            ptools.progress_message(frame, n_total)
+        if writer is None:
+            warnings.warn("Cannot generate propagation movie. No "
+                          "wavefunctions were sampled.")
+            return
+        writer.stdin.close()
+        assert writer.wait() == 0, "ffmpeg failed to encode the movie."
 
         if play:
             if sys.platform == "win32":
@@ -301,6 +450,76 @@ class PropResult:
                 opener ="open" if sys.platform == "darwin" else "xdg-open"
                 subprocess.call([opener, file_name])
 
+    def movie_images(self, rscale=1.0, kscale=1.0, cmap='viridis', zoom=1.0,
+                     norm_type='all', new_shape=(256, 256), n_workers=None,
+                     batch=16):
+        """Render the frames of the propagation movie, in order.
+
+        Batches of `batch` samples are streamed from the snapshot store,
+        and their densities and phases are computed on-device and rebinned
+        by ``movie_frames``. The batches are rendered to images in a pool of
+        `n_workers` threads, each holding its own figure, while the next
+        batches are computed.
+
+        Parameters
+        ----------
+        new_shape : :obj:`tuple` of :obj:`int`, default=(256, 256)
+            The rebinned shape of the frames; see ``rebin``.
+        n_workers : :obj:`int`, optional
+            The number of render threads. Defaults to the number of CPUs;
+            1 renders in the calling thread.
+        batch : :obj:`int`, default=16
+            The number of frames computed and rendered together.
+
+        Other parameters are the same as for ``make_movie``.
+
+        Yields
+        ------
+        image : NumPy :obj:`array`
+            The (height, width, 3) uint8 image of each frame.
+
+        """
+        norm_val = {'all': 1.0, 'half': 2.0}[norm_type]
+        r_sizes = self.space['r_sizes']
+        k_sizes = self.space['k_sizes']
+        extents = {'r': np.ravel(np.vstack((-r_sizes, r_sizes)).T) / rscale,
+                   'k': np.ravel(np.vstack((-k_sizes, k_sizes)).T) / kscale}
+
+        _, psiks = self.load_samples()
+        batches = (jax.tree.map(np.asarray, movie_frames(
+            psiks[i:i + batch], self.space['dr'], tuple(new_shape)))
+                   for i in range(0, len(psiks), batch))
+        first = next(batches, None)
+        if first is None:
+            return
+        init_args = (jax.tree.map(lambda arr: arr[0], first), extents, cmap,
+                     zoom)
+
+        n_workers = n_workers or os.cpu_count()
+        if n_workers == 1:
+            ptools.init_movie_worker(*init_args)
+            try:
+                for frames in itertools.chain([first], batches):
+                    yield from ptools.render_frames(frames, norm_val)
+            finally:
+                ptools.close_movie_worker()
+            return
+
+        # Threads render without forking the threads of JAX and the sample
+        # writer, and without rerunning scripts lacking a `__main__` guard.
+        with futures.ThreadPoolExecutor(
+                n_workers, initializer=ptools.init_movie_worker,
+                initargs=init_args) as pool:
+            pending = collections.deque()
+            for frames in itertools.chain([first], batches):
+                pending.append(pool.submit(ptools.render_frames, frames,
+                                           norm_val))
+                # Bound the number of frames held in memory.
+                if len(pending) > 2 * n_workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
     def rebin(self, arr, new_shape=(256, 256)):
         """Rebin a 2D `arr` to shape `new_shape` by averaging.
 
@@ -310,19 +529,73 @@ class PropResult:
         Parameters
         ----------
         arr : 2D :obj:`list` or NumPy :obj:`array`
-            The input 2D array to rebin.
+            The input 2D array to rebin; see ``rebin``.
         new_shape : :obj:`iterable`, default=(256, 256)
             The target rebinned shape.
 
         """
-        assert arr[0].shape == arr[1].shape
-        new_arr = [0, 0]
-        curr_shape = arr[0].shape
-        if new_shape < curr_shape:
-            for i, a in enumerate(arr):
-                shape = (new_shape[0], a.shape[0] // new_shape[0],
-                         new_shape[1], a.shape[1] // new_shape[1])
-                new_arr[i] = a.reshape(shape).mean(-1).mean(1)
-        else:
-            new_arr = arr
-        return new_arr
+        return rebin(arr, new_shape)
+
+
+def rebin(arr, new_shape=(256, 256)):
+    """Rebin the last two axes of `arr` to `new_shape` by averaging.
+
+    The grid is only rebinned if `new_shape` is smaller along both axes,
+    and each axis must then be a multiple of the new one.
+
+    Parameters
+    ----------
+    arr : :obj:`list` of 2D arrays, or NumPy or JAX :obj:`array`
+        The input arrays, e.g. the two components of a spinor, or a stacked
+        (..., Ny, Nx) array.
+    new_shape : :obj:`iterable`, default=(256, 256)
+        The target rebinned shape.
+
+    Returns
+    -------
+    new_arr : :obj:`list` or :obj:`array`
+        The rebinned arrays, of the same type as `arr`.
+
+    """
+    if isinstance(arr, list):
+        return [rebin(a, new_shape) for a in arr]
+    curr_shape = arr.shape[-2:]
+    if not all(new < curr for new, curr in zip(new_shape, curr_shape)):
+        return arr
+    assert all(curr % new == 0 for new, curr in zip(new_shape, curr_shape)), (
+        f"The grid {curr_shape} is not a multiple of {tuple(new_shape)}.")
+    shape = (*arr.shape[:-2], new_shape[0], curr_shape[0] // new_shape[0],
+             new_shape[1], curr_shape[1] // new_shape[1])
+    return arr.reshape(shape).mean(-1).mean(-2)
+
+
+@partial(jax.jit, static_argnames=('new_shape',))
+def movie_frames(psiks, delta_r, new_shape=(256, 256)):
+    """Compute a batch of rebinned movie frames on-device.
+
+    Parameters
+    ----------
+    psiks : :obj:`Array`
+        The (n, 2, Ny, Nx) centered k-space samples.
+    delta_r : :obj:`Array`
+        The real-space mesh spacings.
+    new_shape : :obj:`tuple` of :obj:`int`, default=(256, 256)
+        The rebinned shape of the frames; see ``rebin``. Static.
+
+    Returns
+    -------
+    frames : :obj:`dict` of :obj:`Array`
+        The (n, 2, ny, nx) real-space densities 'r' and phases 'ph', and
+        the momentum-space densities 'k'. The phases are those of the
+        rebinned wavefunction, and are zero where its density is below 1e-6
+        of the maximum.
+
+    """
+    psiks = jnp.asarray(psiks)
+    psi = ttools.ifft_2d(psiks, delta_r)
+    dens = rebin(ttools.density(psi), new_shape)
+    psi = rebin(psi, new_shape)
+    phase = jnp.angle(psi)
+    mask = dens < jnp.max(dens, axis=(-2, -1), keepdims=True) * 1e-6
+    return {'r': dens, 'ph': jnp.where(mask, 0.0, phase),
+            'k': rebin(ttools.density(psiks), new_shape)}
@@ -0,0 +1,174 @@
+"""protocol.py module.
+
+Time-dependent Hamiltonians, evaluated on-device inside the propagation loop.
+
+A ``Protocol`` holds schedules of three dimensionless factors, which scale
+the grids of a ``PSpinor`` during real-time propagation:
+
+    - 'coupling': the amplitude of the coupling grid `coupling`,
+    - 'detuning': the detuning grid `detuning`,
+    - 'trap': the trapping potential `pot_eng`,
+
+so that the potentials of the two components at time `t` are
+``trap(t) * pot_eng +/- detuning(t) * detuning / 2``. A schedule is any
+function of the time that JAX can trace, e.g. one built with ``ramp`` or
+``steps``; unset schedules are constant at one. A whole sequence, e.g. a
+coupling ramp followed by a time of flight, is then a single compiled
+propagation:
+
+>>> ps.coupling_setup()
+>>> ps.coupling_uniform(1.0 * ps.EL_recoil)
+>>> seq = Protocol(coupling=ramp([0, 2], [0, 1]),
+...                trap=steps([0, 5], [1, 0]))
+>>> res, prop = ps.real(1/1000, n_steps=10000, protocol=seq)
+
+"""
+import jax.numpy as jnp
+import numpy as np
+
+
+def constant(value):
+    """A schedule fixed at `value`."""
+    return lambda t: jnp.asarray(value)
+
+
+def ramp(times, values):
+    """A piecewise-linear schedule through the points (`times`, `values`).
+
+    The schedule is held at the first and last values outside of `times`.
+
+    Parameters
+    ----------
+    times : array-like of :obj:`float`
+        The increasing times of the points, in dimensionless time units.
+    values : array-like of :obj:`float`
+        The values of the schedule at `times`.
+
+    Returns
+    -------
+    schedule : :obj:`callable`
+        The schedule, as a function of time.
+
+    """
+    times, values = _check_points(times, values)
+    return lambda t: jnp.interp(t, times, values)
+
+
+def steps(times, values):
+    """A piecewise-constant schedule, switching to `values` at `times`.
+
+    The schedule takes the value ``values[i]`` from ``times[i]`` up to
+    ``times[i + 1]``, and the first value before ``times[0]``.
+
+    Parameters
+    ----------
+    times : array-like of :obj:`float`
+        The increasing switching times, in dimensionless time units.
+    values : array-like of :obj:`float`
+        The values of the schedule after each switch.
+
+    Returns
+    -------
+    schedule : :obj:`callable`
+        The schedule, as a function of time.
+
+    """
+    times, values = _check_points(times, values)
+
+    def schedule(t):
+        index = jnp.searchsorted(times, t, side='right') - 1
+        return values[jnp.maximum(index, 0)]
+    return schedule
+
+
+def _check_points(times, values):
+    """Validate the points of a schedule and convert them to arrays."""
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    assert times.shape == values.shape and times.ndim == 1, (
+        "A schedule needs one value per time.")
+    assert np.all(np.diff(times) > 0), "The times must be increasing."
+    return jnp.array(times), jnp.array(values)
+
+
+class Protocol:
+    """Schedules of the coupling, detuning, and trap of a propagation.
+
+    Attributes
+    ----------
+    schedules : :obj:`dict` of {:obj:`str`: :obj:`callable`}
+        The schedule of each factor, {'coupling', 'detuning', 'trap'}.
+
+    """
+
+    #: The factors that can be scheduled.
+    FACTORS = ('coupling', 'detuning', 'trap')
+
+    def __init__(self, coupling=None, detuning=None, trap=None):
+        """Collect the schedules of a sequence.
+
+        Parameters
+        ----------
+        coupling, detuning, trap : :obj:`callable` or :obj:`float`, optional
+            The schedule of each factor, as a function of the dimensionless
+            time that JAX can trace, or a constant. Default is one.
+
+        """
+        self.schedules = {}
+        for name, sched in zip(self.FACTORS, (coupling, detuning, trap)):
+            if sched is None:
+                sched = 1.0
+            if not callable(sched):
+                sched = constant(sched)
+            self.schedules[name] = sched
+
+    def __call__(self, t):
+        """The factors at time `t`, as a :obj:`dict` of scalars."""
+        return {name: sched(t) for name, sched in self.schedules.items()}
+
+    def sample(self, times):
+        """Evaluate the schedules on the host, e.g. for plotting.
+
+        Parameters
+        ----------
+        times : array-like of :obj:`float`
+            The times at which to evaluate the schedules.
+
+        Returns
+        -------
+        factors : :obj:`dict` of NumPy :obj:`array`
+            The values of each factor at `times`.
+
+        """
+        times = jnp.asarray(times, dtype=float)
+        return {name: np.broadcast_to(np.asarray(jnp.vectorize(sched)(times)),
+                                      times.shape)
+                for name, sched in self.schedules.items()}
+
+    def hamiltonian(self, t, grids):
+        """The potential and coupling grids at time `t`.
+
+        Parameters
+        ----------
+        t : :obj:`float`
+            The time.
+        grids : :obj:`dict` of :obj:`Array`
+            The (Ny, Nx) 'trap' and 'detuning' grids, and the 'coupling'
+            grid or `None`, which the factors scale.
+
+        Returns
+        -------
+        pot_eng : :obj:`Array`
+            The packed (2, Ny, Nx) potentials of the two components.
+        coupling : :obj:`Array`
+            The (Ny, Nx) coupling, or `None` without coupling.
+
+        """
+        factors = self(t)
+        detuning = factors['detuning'] * grids['detuning'] / 2
+        pot_eng = factors['trap'] * grids['trap'] + jnp.stack([detuning,
+                                                                -detuning])
+        coupling = grids['coupling']
+        if coupling is not None:
+            coupling = factors['coupling'] * coupling
+        return pot_eng, coupling
@@ -108,6 +108,9 @@ class PSpinor:
     rot_coupling : :obj:`bool`, default=True
         Option to place coupling in a rotating reference frame, i.e. no
         momentum shift on the coupling operation.
+    fft_backend : :obj:`str` or None
+        The FFT backend of the NumPy wavefunctions of the setup; None uses
+        the default of ``fft_backends``.
 
     """
 
@@ -153,11 +156,17 @@ class PSpinor:
             attempts to overwrite a directory `path` already containing data.
             `overwrite` gives the user the option to overwrite the data with
             every new instance.
+        fft_backend : :obj:`str`, optional
+            The FFT backend of the setup, e.g. of ``shift_momentum`` and
+            ``seed_vortices``; one of ``fft_backends.available()``, or
+            'auto' to time the backends on the grid and use the fastest.
+            Default is that of ``fft_backends.set_default``.
 
 
         """
         phase_factor = kwargs.get('phase_factor', 1)
         overwrite = kwargs.get('overwrite', False)
+        self.fft_backend = kwargs.get('fft_backend', None)
         # pylint: disable=too-many-arguments
         self.setup_data_path(path, overwrite)
 
@@ -273,7 +282,8 @@ class PSpinor:
         self.psi[1] = self.psi[1] * phase_factor
 
         self.psi, _ = ttools.norm(self.psi, self.space['dv_r'], self.atom_num)
-        self.psik = ttools.fft_2d(self.psi, self.space['dr'])
+        self.psik = ttools.fft_2d(self.psi, self.space['dr'],
+                                  backend=self.fft_backend)
 
         self.heal = [(8*np.pi * np.max(np.abs(p)**2) * self.a_sc)**(-1/2) for p
                      in self.psi]
@@ -535,7 +545,8 @@ class PSpinor:
             psik = self.psik
 
         shift = scale * self.kL_recoil / self.space['dk'][0]
-        input_ = ttools.fft_2d(psik, self.space['dr'])
+        input_ = ttools.fft_2d(psik, self.space['dr'],
+                               backend=self.fft_backend)
         result = [np.zeros_like(pk) for pk in psik]
 
         for i in range(len(psik)):
@@ -543,8 +554,10 @@ class PSpinor:
             negative = fourier_shift(input_[i], shift=[0, -shift], axis=1)
             result[i] = frac[0]*positive + frac[1]*negative
             frac = np.flip(frac)
-        self.psik = ttools.ifft_2d(result, self.space['dr'])
-        self.psi = ttools.ifft_2d(self.psik, self.space['dr'])
+        self.psik = ttools.ifft_2d(result, self.space['dr'],
+                                   backend=self.fft_backend)
+        self.psi = ttools.ifft_2d(self.psik, self.space['dr'],
+                                  backend=self.fft_backend)
 
     @property
     def coupling(self):
@@ -744,7 +757,8 @@ class PSpinor:
                                                                   xdiff))
                 self.psi[i] = (self.psi[i] * v_profile * v_phase)
 
-        self.psik = ttools.fft_2d(self.psi, delta_r=self.space['dr'])
+        self.psik = ttools.fft_2d(self.psi, delta_r=self.space['dr'],
+                                  backend=self.fft_backend)
 
     def seed_regular_vortices(self):
         """Seed regularly-arranged vortices into the wavefunction.
@@ -890,7 +904,7 @@ class PSpinor:
 
     # pylint: disable=too-many-arguments
     def imaginary(self, t_step, n_steps=1000, device='cpu',
-                  is_sampling=False, n_samples=1):
+                  is_sampling=False, n_samples=1, resume=False, **kwargs):
         """Perform imaginary-time propagation.
 
         Propagation is carried out in a `TensorPropagator` object. The
@@ -909,12 +923,23 @@ class PSpinor:
             Option to sample wavefunctions throughout the propagation.
         n_samples : :obj:`int`, optional
             The number of samples to collect.
+        resume : :obj:`bool` or :obj:`str`, default=False
+            Continue an interrupted propagation with the same arguments from
+            its latest checkpoint, or from the given checkpoint file. The
+            checkpoints are written every `checkpoint_rate` steps; see
+            ``TensorPropagator``.
+
+        Other Parameters
+        ----------------
+        **kwargs
+            Passed on to ``TensorPropagator``, e.g. `progress_rate`.
 
         """
         prop = tprop.TensorPropagator(self, t_step, n_steps, device,
                                       time='imag',
                                       is_sampling=is_sampling,
-                                      n_samples=n_samples)
+                                      n_samples=n_samples, resume=resume,
+                                      **kwargs)
         result = prop.prop_loop(prop.n_steps)
 
         # Include PSpinor attributes with the result object
@@ -927,7 +952,7 @@ class PSpinor:
         return result, prop
 
     def real(self, t_step, n_steps=1000, device='cpu', is_sampling=False,
-             n_samples=1):
+             n_samples=1, resume=False, **kwargs):
         """Perform real-time propagation.
 
         Propagation is carried out in a `TensorPropagator` object. The
@@ -946,12 +971,23 @@ class PSpinor:
             Option to sample wavefunctions throughout the propagation.
         n_samples : :obj:`int`, optional
             The number of samples to collect.
+        resume : :obj:`bool` or :obj:`str`, default=False
+            Continue an interrupted propagation with the same arguments from
+            its latest checkpoint, or from the given checkpoint file. The
+            checkpoints are written every `checkpoint_rate` steps; see
+            ``TensorPropagator``.
+
+        Other Parameters
+        ----------------
+        **kwargs
+            Passed on to ``TensorPropagator``, e.g. `progress_rate`.
 
         """
         prop = tprop.TensorPropagator(self, t_step, n_steps, device,
                                       time='real',
                                       is_sampling=is_sampling,
-                                      n_samples=n_samples)
+                                      n_samples=n_samples, resume=resume,
+                                      **kwargs)
         result = prop.prop_loop(prop.n_steps)
 
         # Include PSpinor attributes with the result object
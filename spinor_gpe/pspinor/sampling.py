@@ -0,0 +1,368 @@
+"""sampling.py module."""
+import bz2
+import json
+import lzma
+import os
+import queue
+import threading
+import zlib
+
+import numpy as np
+
+#: The (compress, decompress) functions of the available chunk codecs.
+CODECS = {'zlib': (lambda data: zlib.compress(data, 1), zlib.decompress),
+          'bz2': (bz2.compress, bz2.decompress),
+          'lzma': (lzma.compress, lzma.decompress)}
+
+
+class SnapshotStore:
+    """A chunked, appendable on-disk store of sampled wavefunctions.
+
+    The store is a directory holding one chunk per sample, appended to a
+    single ``data.bin`` file, an index of the byte offset and size of every
+    chunk, the sampled times, and a ``meta.json`` file with the shape, dtype,
+    and compression of the samples. Samples may be appended while the store
+    is read, e.g. by another process, and only indexed samples are visible.
+
+    Uncompressed samples are read through a memory map, and compressed ones
+    are decompressed one at a time, so frames can be streamed from stores
+    much larger than memory. Indexing returns NumPy arrays:
+
+    >>> store = SnapshotStore('psik_sampled0-Trial_000.snap')
+    >>> for psik in store:  # One (2, Ny, Nx) sample at a time.
+    ...     ...
+    >>> last = store[-1]
+
+    Attributes
+    ----------
+    path : :obj:`str`
+        The directory of the store.
+    frame_shape : :obj:`tuple` of :obj:`int`
+        The shape of a single sample, e.g. (2, Ny, Nx).
+    dtype : NumPy :obj:`dtype`
+        The data type of the samples.
+    compression : :obj:`str` or `None`
+        The codec of the chunks, {'zlib', 'bz2', 'lzma'}; see ``CODECS``.
+
+    """
+
+    def __init__(self, path):
+        """Open an existing store.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The directory of the store.
+
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        self.frame_shape = tuple(meta['shape'])
+        self.dtype = np.dtype(meta['dtype'])
+        self.compression = meta['compression']
+
+    @classmethod
+    def create(cls, path, shape, dtype=np.complex128, compression=None):
+        """Create an empty store.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            The directory of the store; it must not exist yet.
+        shape : :obj:`tuple` of :obj:`int`
+            The shape of a single sample, e.g. (2, Ny, Nx).
+        dtype : NumPy :obj:`dtype`, default=complex128
+            The data type of the samples.
+        compression : :obj:`str`, optional
+            The codec of the chunks, {'zlib', 'bz2', 'lzma'}. Default is no
+            compression, which allows memory mapping.
+
+        Returns
+        -------
+        store : :obj:`SnapshotStore`
+            The new store.
+
+        """
+        assert compression is None or compression in CODECS, (
+            f"Unknown compression '{compression}'; choose from "
+            f"{sorted(CODECS)}.")
+        os.makedirs(path)
+        for name in ('data.bin', 'index.bin', 'times.bin'):
+            open(os.path.join(path, name), 'wb').close()
+        meta = {'shape': list(shape), 'dtype': np.dtype(dtype).str,
+                'compression': compression}
+        with open(os.path.join(path, 'meta.json'), 'w',
+                  encoding='utf-8') as file:
+            json.dump(meta, file)
+        return cls(path)
+
+    def append(self, frames, times):
+        """Append samples and their times to the store.
+
+        The chunks are written before the index, so that readers never see
+        a partially written sample.
+
+        Parameters
+        ----------
+        frames : NumPy :obj:`array`
+            The (n, `frame_shape`) samples.
+        times : array-like of :obj:`float`
+            The n sampled times.
+
+        """
+        frames = np.ascontiguousarray(frames, dtype=self.dtype)
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        assert frames.shape == (len(times), *self.frame_shape), (
+            f"Expected samples of shape {self.frame_shape}, one per time.")
+        chunks = [frame.tobytes() for frame in frames]
+        if self.compression is not None:
+            chunks = [CODECS[self.compression][0](c) for c in chunks]
+
+        with open(self._file('data.bin'), 'ab') as file:
+            offset = file.tell()
+            for chunk in chunks:
+                file.write(chunk)
+        sizes = np.array([len(c) for c in chunks], dtype=np.int64)
+        index = np.stack([offset + np.cumsum(sizes) - sizes, sizes], axis=-1)
+        with open(self._file('times.bin'), 'ab') as file:
+            file.write(times.tobytes())
+        with open(self._file('index.bin'), 'ab') as file:
+            file.write(index.tobytes())
+
+    def truncate(self, n_samples):
+        """Drop all samples after the first `n_samples`, e.g. to resume.
+
+        Parameters
+        ----------
+        n_samples : :obj:`int`
+            The number of samples to keep.
+
+        """
+        index = self.index[:n_samples]
+        n_bytes = int(index[-1].sum()) if len(index) else 0
+        os.truncate(self._file('index.bin'), index.nbytes)
+        os.truncate(self._file('times.bin'), 8 * len(index))
+        os.truncate(self._file('data.bin'), n_bytes)
+
+    def astype(self, dtype):
+        """Convert the stored samples to another dtype, in place.
+
+        The samples are rewritten one at a time into a new store, whose
+        files then replace those of this one; e.g. to keep the full
+        precision of later samples once a propagation switches from single
+        to double precision.
+
+        Parameters
+        ----------
+        dtype : NumPy :obj:`dtype`
+            The new data type of the samples.
+
+        """
+        dtype = np.dtype(dtype)
+        if dtype == self.dtype:
+            return
+        new = SnapshotStore.create(self.path + '.tmp', self.frame_shape,
+                                   dtype, self.compression)
+        for i, time in enumerate(self.times):
+            new.append(self[i][None], [time])
+        # The metadata is replaced last, once the data matches it.
+        for name in ('data.bin', 'index.bin', 'times.bin', 'meta.json'):
+            os.replace(new._file(name), self._file(name))
+        os.rmdir(new.path)
+        self.dtype = dtype
+
+    @property
+    def index(self):
+        """The (n, 2) byte offset and size of every indexed chunk."""
+        return np.fromfile(self._file('index.bin'),
+                           dtype=np.int64).reshape(-1, 2)
+
+    @property
+    def times(self):
+        """The sampled times, in dimensionless time units."""
+        return np.fromfile(self._file('times.bin'),
+                           dtype=np.float64)[:len(self)]
+
+    @property
+    def shape(self):
+        """The shape (n_samples, `frame_shape`) of the stored samples."""
+        return (len(self), *self.frame_shape)
+
+    def __len__(self):
+        return os.path.getsize(self._file('index.bin')) // 16
+
+    def __getitem__(self, key):
+        """Read a sample, or a stacked array of samples for a slice."""
+        n_samples = len(self)
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += n_samples
+            if not 0 <= key < n_samples:
+                raise IndexError(f"Sample {key} is out of range for "
+                                 f"{n_samples} samples.")
+            return self._read(key, key + 1)[0]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(n_samples)
+            if step == 1:
+                return self._read(start, max(start, stop))
+            key = range(start, stop, step)
+        frames = [self[int(k)] for k in key]
+        return np.stack(frames) if frames else np.empty((0, *self.frame_shape),
+                                                        self.dtype)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def _read(self, start, stop):
+        """Read the samples `start` to `stop`, memory-mapped if possible."""
+        if self.compression is None:
+            frame_bytes = self.dtype.itemsize * int(np.prod(self.frame_shape))
+            if stop == start:
+                return np.empty((0, *self.frame_shape), self.dtype)
+            return np.memmap(self._file('data.bin'), dtype=self.dtype,
+                             mode='r', offset=start * frame_bytes,
+                             shape=(stop - start, *self.frame_shape))
+        decompress = CODECS[self.compression][1]
+        frames = np.empty((stop - start, *self.frame_shape), self.dtype)
+        with open(self._file('data.bin'), 'rb') as file:
+            for frame, (offset, size) in zip(frames, self.index[start:stop]):
+                file.seek(offset)
+                frame[...] = np.frombuffer(decompress(file.read(size)),
+                                           self.dtype).reshape(frame.shape)
+        return frames
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def __repr__(self):
+        return (f"SnapshotStore('{self.path}', shape={self.shape}, "
+                f"dtype={self.dtype}, compression={self.compression})")
+
+
+class SampleWriter:
+    """Writes chunks of sampled wavefunctions to disk in a background thread.
+
+    Chunks of samples are collected on-device, in a ring buffer filled by the
+    compiled propagation loop. Each full chunk is handed to this writer, which
+    transfers it to host memory and appends it to a ``SnapshotStore``
+    without blocking the main thread. At most `max_pending` chunks are held in
+    memory at once; further calls to ``put`` wait for the writer to catch up.
+
+    Attributes
+    ----------
+    file_name : :obj:`str`
+        Path to the directory of the snapshot store.
+    store : :obj:`SnapshotStore`
+        The store of samples.
+    n_written : :obj:`int`
+        The number of samples written to disk so far.
+
+    """
+
+    def __init__(self, file_name, shape, dtype=np.complex128, max_pending=2,
+                 fft_order=False, compression=None, append=False):
+        """Create the snapshot store and start the writer thread.
+
+        Parameters
+        ----------
+        file_name : :obj:`str`
+            Path to the directory of the store to create.
+        shape : :obj:`tuple` of :obj:`int`
+            The shape of a single sample, e.g. (2, Ny, Nx).
+        dtype : NumPy :obj:`dtype`, default=complex128
+            The data type of the samples.
+        max_pending : :obj:`int`, default=2
+            The maximum number of chunks waiting to be written.
+        fft_order : :obj:`bool`, default=False
+            Whether the samples are in FFT order, in which case they are
+            centered on the host before they are written.
+        compression : :obj:`str`, optional
+            The codec of the stored samples; see ``SnapshotStore.create``.
+        append : :obj:`bool`, default=False
+            Append to an existing store instead, e.g. to resume a
+            propagation; `shape`, `dtype`, and `compression` are then taken
+            from the store.
+
+        """
+        self.file_name = file_name
+        if append:
+            self.store = SnapshotStore(file_name)
+        else:
+            self.store = SnapshotStore.create(file_name, shape, dtype,
+                                              compression)
+        self.n_written = 0
+        self._fft_order = fft_order
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def put(self, chunk, times):
+        """Queue a chunk of samples to be written.
+
+        Parameters
+        ----------
+        chunk : :obj:`Array`
+            The device ring buffer holding the samples; it may still be
+            being computed when it is queued.
+        times : array-like of :obj:`float`
+            The times of the valid samples at the start of `chunk`.
+
+        """
+        self.call(self._write, chunk, times)
+
+    def call(self, func, *args):
+        """Queue a call to be made by the writer thread.
+
+        The call follows the chunks queued before it, so e.g. a checkpoint
+        queued after a chunk is only written once the chunk is on disk.
+
+        Parameters
+        ----------
+        func : callable
+            The function to call, with positional arguments `args`.
+
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((func, args))
+
+    def close(self):
+        """Write all queued chunks and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _write(self, chunk, times):
+        """Move a chunk from the device to the store."""
+        chunk = np.asarray(chunk[:len(times)])
+        if self._fft_order:
+            chunk = np.fft.fftshift(chunk, axes=(-2, -1))
+        self.store.append(chunk, times)
+        self.n_written += len(times)
+
+    def _drain(self):
+        """Make the queued writes and calls, in order."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is None:
+                func, args = item
+                try:
+                    func(*args)
+                # pylint: disable=broad-except
+                except Exception as ex:
+                    self._error = ex
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,209 @@
+"""shard_tools.py module.
+
+Tools for propagating a spinor whose grid is split across several devices.
+The packed (2, Ny, Nx) arrays are divided into slabs of rows along the
+y-axis, one per device of a 1D device mesh with axis name ``GRID_AXIS``.
+Inside ``shard_map``, every device holds a (2, Ny / P, Nx) block; the 2D FFT
+is done as a slab (pencil) decomposition, with a local transform along x, an
+all-to-all transpose, a local transform along y, and a transpose back.
+
+On a CPU-only host, several devices can be emulated by setting
+``XLA_FLAGS=--xla_force_host_platform_device_count=N`` before JAX starts.
+"""
+from functools import partial
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.sharding import Mesh, NamedSharding, PartitionSpec as P
+
+try:
+    from jax import shard_map
+except ImportError:
+    from jax.experimental.shard_map import shard_map
+
+GRID_AXIS = 'grid'
+
+#: Partition specs of the packed spinor, the packed energy operators, and the
+#: packed 2x2 coupling operator: rows are split across the mesh. Each entry
+#: of `OPS_SPEC` applies to a whole tuple of sub-step operators.
+SPINOR_SPEC = P(None, GRID_AXIS, None)
+COUPL_SPEC = P(None, None, GRID_AXIS, None)
+OPS_SPEC = {'dt': P(), 'kin': SPINOR_SPEC, 'pot': SPINOR_SPEC,
+            'coupl': COUPL_SPEC}
+#: Partition spec of a single (Ny, Nx) grid, e.g. the coupling.
+GRID_SPEC = P(GRID_AXIS, None)
+
+
+def make_mesh(devices=None):
+    """Create a 1D device mesh for splitting the grid.
+
+    Parameters
+    ----------
+    devices : :obj:`int`, :obj:`list` of devices, or :obj:`Mesh`, optional
+        The number of devices to use (the first ones of ``jax.devices()``),
+        an explicit list of devices, or an existing mesh, which is returned
+        unchanged. Default is all available devices.
+
+    Returns
+    -------
+    mesh : :obj:`jax.sharding.Mesh`
+        A mesh with the single axis ``GRID_AXIS``.
+
+    """
+    if isinstance(devices, Mesh):
+        return devices
+    if devices is None:
+        devices = jax.devices()
+    elif isinstance(devices, int):
+        assert devices <= len(jax.devices()), (
+            f"Requested {devices} devices, but only {len(jax.devices())} "
+            "are available.")
+        devices = jax.devices()[:devices]
+    return Mesh(np.array(devices), (GRID_AXIS,))
+
+
+def shard(arr, mesh, spec=SPINOR_SPEC):
+    """Place `arr` on the devices of `mesh`, split according to `spec`."""
+    return jax.device_put(arr, NamedSharding(mesh, spec))
+
+
+def shard_ops(ops, mesh):
+    """Place the sub-step operators of a full step on the devices of `mesh`.
+
+    Operators that are `None`, e.g. 'coupl' without coupling, are kept.
+    """
+    return {k: None if v is None else shard(v, mesh, OPS_SPEC[k])
+            for k, v in ops.items()}
+
+
+def shard_grids(grids, mesh):
+    """Place a :obj:`dict` of (Ny, Nx) grids on the devices of `mesh`.
+
+    Scalars are replicated, and grids that are `None` are kept.
+    """
+    return {k: None if v is None else
+            shard(v, mesh, GRID_SPEC if jnp.ndim(v) == 2 else P())
+            for k, v in grids.items()}
+
+
+def check_shape(shape, mesh):
+    """Assert that a (..., Ny, Nx) grid can be evenly split over `mesh`."""
+    n_dev = mesh.shape[GRID_AXIS]
+    assert shape[-2] % n_dev == 0 and shape[-1] % n_dev == 0, (
+        f"Grid shape {shape[-2:]} is not divisible by the {n_dev} devices "
+        "of the mesh.")
+
+
+def fft_2d(psi, delta_r=(1, 1), axis_name=GRID_AXIS, shift=True):
+    """Forward 2D FFT of a packed spinor block split along the y-axis.
+
+    Must be called inside ``shard_map``. Matches ``tensor_tools.fft_2d``,
+    including the normalization and the k-space layout selected by `shift`.
+
+    Parameters
+    ----------
+    psi : JAX :obj:`Array`
+        The local (..., Ny / P, Nx) block of the real-space wavefunction.
+    delta_r : NumPy :obj:`array`, default=(1,1)
+        The real-space x- and y-mesh spacings.
+    axis_name : :obj:`str`, default=GRID_AXIS
+        The mesh axis along which the grid is split.
+    shift : :obj:`bool`, default=True
+        Whether the k-space blocks are centered, or in FFT order.
+
+    Returns
+    -------
+    psik : JAX :obj:`Array`
+        The local (..., Ny / P, Nx) block of the k-space wavefunction.
+
+    """
+    normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)
+    y_ax, x_ax = psi.ndim - 2, psi.ndim - 1
+    psik = jnp.fft.fft(psi, axis=x_ax)
+    if shift:
+        psik = jnp.fft.fftshift(psik, axes=x_ax)
+    psik = jax.lax.all_to_all(psik, axis_name, x_ax, y_ax, tiled=True)
+    psik = jnp.fft.fft(psik, axis=y_ax)
+    if shift:
+        psik = jnp.fft.fftshift(psik, axes=y_ax)
+    psik = jax.lax.all_to_all(psik, axis_name, y_ax, x_ax, tiled=True)
+    return psik * normalization
+
+
+def ifft_2d(psik, delta_r=(1, 1), axis_name=GRID_AXIS, shift=True):
+    """Inverse 2D FFT of a packed spinor block split along the y-axis.
+
+    Must be called inside ``shard_map``; the inverse of ``fft_2d``.
+
+    Parameters
+    ----------
+    psik : JAX :obj:`Array`
+        The local (..., Ny / P, Nx) block of the k-space wavefunction.
+    delta_r : NumPy :obj:`array`, default=(1,1)
+        The real-space x- and y-mesh spacings.
+    axis_name : :obj:`str`, default=GRID_AXIS
+        The mesh axis along which the grid is split.
+    shift : :obj:`bool`, default=True
+        Whether the k-space blocks are centered, or in FFT order.
+
+    Returns
+    -------
+    psi : JAX :obj:`Array`
+        The local (..., Ny / P, Nx) block of the real-space wavefunction.
+
+    """
+    normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)
+    y_ax, x_ax = psik.ndim - 2, psik.ndim - 1
+    psi = psik
+    if shift:
+        psi = jnp.fft.ifftshift(psi, axes=x_ax)
+    psi = jnp.fft.ifft(psi, axis=x_ax)
+    psi = jax.lax.all_to_all(psi, axis_name, x_ax, y_ax, tiled=True)
+    if shift:
+        psi = jnp.fft.ifftshift(psi, axes=y_ax)
+    psi = jnp.fft.ifft(psi, axis=y_ax)
+    psi = jax.lax.all_to_all(psi, axis_name, y_ax, x_ax, tiled=True)
+    return psi / normalization
+
+
+def norm(psi, vol_elem, atom_num, axis_name=GRID_AXIS, acc_dtype=None):
+    """Normalize a packed spinor block to the total atom number.
+
+    The local sums of the density, accumulated in `acc_dtype`, are combined
+    across devices with ``psum``; see ``tensor_tools.norm``.
+
+    Returns
+    -------
+    psi_norm : JAX :obj:`Array`
+        The normalized local block.
+    dens_norm : JAX :obj:`Array`
+        The local block of the normalized densities.
+
+    """
+    dens = jnp.abs(psi)**2
+    norm_factor = (jax.lax.psum(jnp.sum(dens, dtype=acc_dtype), axis_name)
+                   * vol_elem / atom_num).astype(dens.dtype)
+    return psi / jnp.sqrt(norm_factor), dens / norm_factor
+
+
+def shard_step(step_fn, mesh):
+    """Wrap a packed ``full_step``-like function to run split over `mesh`.
+
+    Parameters
+    ----------
+    step_fn : :obj:`callable`
+        A function with the signature of ``tensor_propagator.full_step``,
+        accepting the keyword argument `axis_name`.
+    mesh : :obj:`jax.sharding.Mesh`
+        The device mesh.
+
+    Returns
+    -------
+    sharded_fn : :obj:`callable`
+        The function mapped over the local blocks of the grid.
+
+    """
+    in_specs = (SPINOR_SPEC, OPS_SPEC, P(), P(), P(), P(), P(), P(), P())
+    return shard_map(partial(step_fn, axis_name=GRID_AXIS), mesh=mesh,
+                     in_specs=in_specs, out_specs=SPINOR_SPEC)
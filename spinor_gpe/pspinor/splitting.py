@@ -0,0 +1,261 @@
+"""splitting.py module.
+
+Registry of the operator-splitting schemes of a full propagation step.
+
+A scheme alternates kinetic sub-steps, applied in k-space, with real-space
+sub-steps (interaction, coupling, and potential operators):
+
+    K(a_0 dt) R(b_0 dt) K(a_1 dt) R(b_1 dt) ... R(b_{m-1} dt) K(a_m dt),
+
+with palindromic weights `a` and `b` that each sum to one. Every real-space
+sub-step costs one inverse and one forward FFT, so a step of a scheme with
+`m` real-space sub-steps costs 2`m` FFTs.
+
+Schemes are looked up by name with ``get_scheme``, and new ones are added
+with ``register``; ``best_scheme`` picks the scheme that reaches an error
+tolerance with the fewest FFTs.
+"""
+import numpy as np
+from scipy import linalg
+
+#: Fraction of the full time step taken by each outer 'magic_gamma' sub-step.
+MAGIC_GAMMA = 1 / (2 + 2**(1 / 3))
+#: Fraction of the full time step taken by each outer Forest-Ruth sub-step.
+FR_THETA = 1 / (2 - 2**(1 / 3))
+
+
+def _reference_error(kin, real, order, h_step=1/8, size=8, seed=0):
+    """Leading local error coefficient of a splitting on a reference problem.
+
+    The problem is the evolution under a sum of two fixed, random Hermitian
+    matrices of unit norm, which do not commute; the error of a step `h` is
+    compared with the exact evolution and scaled by h**(order + 1).
+    """
+    rng = np.random.default_rng(seed)
+    mats = []
+    for _ in range(2):
+        mat = rng.normal(size=(size, size)) + 1j * rng.normal(size=(size, size))
+        mat = mat + mat.conj().T
+        mats.append(mat / np.linalg.norm(mat, 2))
+    mat_a, mat_b = mats
+
+    prop = linalg.expm(-1j * kin[0] * h_step * mat_a)
+    for a_w, b_w in zip(kin[1:], real):
+        prop = (linalg.expm(-1j * a_w * h_step * mat_a)
+                @ linalg.expm(-1j * b_w * h_step * mat_b) @ prop)
+    exact = linalg.expm(-1j * h_step * (mat_a + mat_b))
+    return np.linalg.norm(prop - exact, 2) / h_step**(order + 1)
+
+
+class SplittingScheme:
+    """A palindromic splitting of a full step into sub-steps.
+
+    Attributes
+    ----------
+    name : :obj:`str`
+        The name under which the scheme is registered.
+    order : :obj:`int`
+        The order of accuracy; the local error of a step `dt` scales as
+        dt**(`order` + 1).
+    kin : :obj:`tuple` of :obj:`float`
+        The `m` + 1 weights of the kinetic sub-steps.
+    real : :obj:`tuple` of :obj:`float`
+        The `m` weights of the real-space sub-steps.
+    error_const : :obj:`float`
+        The leading local error coefficient `C`, such that a step `dt`
+        errs by about C * dt**(`order` + 1). It is measured on a reference
+        problem of two non-commuting random matrices of unit norm, so it
+        compares schemes rather than predicting the error of a given
+        Hamiltonian.
+
+    """
+
+    def __init__(self, name, order, kin, real):
+        """Create a scheme from its sub-step weights.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            The name of the scheme.
+        order : :obj:`int`
+            The order of accuracy.
+        kin : array-like of :obj:`float`
+            The weights of the kinetic sub-steps.
+        real : array-like of :obj:`float`
+            The weights of the real-space sub-steps; one fewer than `kin`.
+
+        """
+        self.name = name
+        self.order = order
+        self.kin = tuple(float(w) for w in kin)
+        self.real = tuple(float(w) for w in real)
+        assert len(self.kin) == len(self.real) + 1, (
+            "A scheme needs one more kinetic than real-space sub-step.")
+        assert (np.allclose(self.kin, self.kin[::-1])
+                and np.allclose(self.real, self.real[::-1])), (
+            f"The weights of scheme '{name}' are not palindromic.")
+        assert np.isclose(sum(self.kin), 1) and np.isclose(sum(self.real), 1), (
+            f"The weights of scheme '{name}' do not sum to one.")
+        self.error_const = _reference_error(self.kin, self.real, order)
+
+    @classmethod
+    def from_composition(cls, name, order, weights):
+        """Create a scheme composed of Strang steps.
+
+        Adjacent kinetic half-steps of consecutive Strang steps are merged.
+
+        Parameters
+        ----------
+        name : :obj:`str`
+            The name of the scheme.
+        order : :obj:`int`
+            The order of accuracy.
+        weights : array-like of :obj:`float`
+            The fractions of the full step taken by each Strang step.
+
+        """
+        weights = np.asarray(weights, dtype=float)
+        kin = np.concatenate([[0], weights]) / 2
+        kin[:-1] += weights / 2
+        return cls(name, order, kin, weights)
+
+    @property
+    def positive(self):
+        """Whether all sub-steps go forward in time.
+
+        Negative sub-steps amplify high momenta in imaginary time, which can
+        destabilize a relaxation with a large time step.
+        """
+        return min(self.kin + self.real) >= 0
+
+    @property
+    def n_stages(self):
+        """The number of real-space sub-steps of a full step."""
+        return len(self.real)
+
+    @property
+    def n_ffts(self):
+        """The number of FFTs of a full step."""
+        return 2 * self.n_stages
+
+    def halves(self):
+        """The distinct leading halves of the palindromic weights.
+
+        Returns
+        -------
+        kin : :obj:`tuple` of :obj:`float`
+            The first ceil((`m` + 1) / 2) kinetic weights.
+        real : :obj:`tuple` of :obj:`float`
+            The first ceil(`m` / 2) real-space weights.
+
+        """
+        return (self.kin[:(len(self.kin) + 1) // 2],
+                self.real[:(len(self.real) + 1) // 2])
+
+    def max_step(self, tol, duration):
+        """The largest time step whose global error stays below `tol`.
+
+        The global error over `duration` is estimated as
+        duration * C * dt**`order`, with the reference `error_const` C.
+
+        Parameters
+        ----------
+        tol : :obj:`float`
+            The error tolerance.
+        duration : :obj:`float`
+            The total propagation time.
+
+        Returns
+        -------
+        t_step : :obj:`float`
+            The maximum time step.
+
+        """
+        return (tol / (duration * self.error_const))**(1 / self.order)
+
+    def cost(self, tol, duration):
+        """The number of FFTs needed to propagate within an error `tol`.
+
+        Parameters
+        ----------
+        tol : :obj:`float`
+            The error tolerance.
+        duration : :obj:`float`
+            The total propagation time.
+
+        Returns
+        -------
+        n_ffts : :obj:`int`
+            The estimated number of FFTs.
+
+        """
+        n_steps = int(np.ceil(duration / self.max_step(tol, duration)))
+        return n_steps * self.n_ffts
+
+    def __repr__(self):
+        return (f"SplittingScheme('{self.name}', order={self.order}, "
+                f"stages={self.n_stages}, error_const={self.error_const:.3g})")
+
+
+#: The registered schemes, by name.
+SCHEMES = {}
+
+
+def register(scheme):
+    """Add a ``SplittingScheme`` to the registry, under its name."""
+    SCHEMES[scheme.name] = scheme
+    return scheme
+
+
+def get_scheme(name):
+    """Look up a registered ``SplittingScheme`` by name."""
+    assert name in SCHEMES, (f"Unknown splitting scheme '{name}'; choose "
+                             f"from {sorted(SCHEMES)}.")
+    return SCHEMES[name]
+
+
+def best_scheme(tol, duration, positive=False):
+    """The registered scheme needing the fewest FFTs to reach `tol`.
+
+    Parameters
+    ----------
+    tol : :obj:`float`
+        The error tolerance.
+    duration : :obj:`float`
+        The total propagation time.
+    positive : :obj:`bool`, default=False
+        Only consider schemes without negative sub-steps, e.g. for
+        imaginary-time propagation.
+
+    Returns
+    -------
+    scheme : :obj:`SplittingScheme`
+        The cheapest scheme; see ``SplittingScheme.cost``.
+
+    """
+    schemes = [s for s in SCHEMES.values() if s.positive or not positive]
+    return min(schemes, key=lambda s: s.cost(tol, duration))
+
+
+# Second-order Strang splitting.
+register(SplittingScheme.from_composition('strang', 2, [1]))
+# Three Strang steps with positive weights; the default. The errors of the
+# steps do not cancel, so it is second order.
+register(SplittingScheme.from_composition(
+    'magic_gamma', 2, [MAGIC_GAMMA, 1 - 2 * MAGIC_GAMMA, MAGIC_GAMMA]))
+# Fourth-order Forest-Ruth composition of three Strang steps.
+register(SplittingScheme.from_composition(
+    'forest_ruth', 4, [FR_THETA, 1 - 2 * FR_THETA, FR_THETA]))
+# Sixth-order Yoshida composition of seven Strang steps (solution A).
+_YOSHIDA = (0.784513610477560, 0.235573213359357, -1.17767998417887)
+register(SplittingScheme.from_composition(
+    'yoshida6', 6,
+    _YOSHIDA + (1 - 2 * sum(_YOSHIDA),) + _YOSHIDA[::-1]))
+# Optimized fourth-order splitting of Blanes and Moan (2002), with six
+# real-space sub-steps.
+_BM_KIN = (0.0792036964311957, 0.353172906049774, -0.0420650803577195)
+_BM_REAL = (0.209515106613362, -0.143851773179818)
+register(SplittingScheme(
+    'blanes_moan', 4,
+    _BM_KIN + (1 - 2 * sum(_BM_KIN),) + _BM_KIN[::-1],
+    _BM_REAL + (0.5 - sum(_BM_REAL),) * 2 + _BM_REAL[::-1]))
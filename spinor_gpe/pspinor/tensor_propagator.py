@@ -1,60 +1,784 @@
 
-"""Placeholder for the tensor_propagator.py module."""
+"""tensor_propagator.py module.
+
+Propagation of the pseudospinor GPE in compiled on-device loops.
+
+A ``TensorPropagator`` takes the grids and wavefunction of a ``PSpinor``,
+packs the wavefunction into a (2, Ny, Nx) k-space array in FFT order, and
+pre-computes the evolution operators of a split-step ``full_step`` in the
+splitting scheme of ``splitting``. Its ``prop_loop`` runs the steps in
+jitted ``jax.lax.scan`` loops (``scan_steps``), or in ``jax.lax.while_loop``
+loops that stop once relaxed (``converge_steps``, ``adaptive_steps``), and
+collects the populations, energies, and sampled wavefunctions into a
+``PropResult``. Propagators are usually created through
+``PSpinor.imaginary`` and ``PSpinor.real``:
+
+>>> ps = PSpinor('ground_state/Trial_000', atom_num=1e4)
+>>> res, prop = ps.imaginary(1/50, 1000, tol=1e-8, check_rate=20)
+>>> res, prop = ps.real(1/50, 10000, is_sampling=True, n_samples=100,
+...                     checkpoint_rate=2000)
+>>> res.plot_pops()
+
+Their options, e.g. single precision, sharding over a device mesh,
+checkpoints, or on-device diagnostics, are described under "Other
+Parameters" of ``TensorPropagator``; ``batch_propagator`` propagates
+ensembles of spinors in one vectorized loop.
+"""
 # import numpy as np
 # import torch
+import contextlib
 from functools import partial
+import warnings
+
 import jax
 import jax.numpy as jnp
+import numpy as np
 from tqdm import tqdm
 jax.config.update("jax_enable_x64", True)
 
 from spinor_gpe.pspinor import tensor_tools as ttools
 from spinor_gpe.pspinor.plotting_tools import next_available_path
 from spinor_gpe.pspinor import prop_result
+from spinor_gpe.pspinor import sampling
+from spinor_gpe.pspinor import op_cache
+from spinor_gpe.pspinor import shard_tools as stools
+from spinor_gpe.pspinor import splitting
+from spinor_gpe.pspinor import checkpoint
 
-@jax.jit
-def full_step(psik,dt_out,eng_out,dt_in,eng_in,g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num):
-    # t_step, eng, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num
-    print("Compiling Full Step")
-    psik = single_step(dt_out, eng_out, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num)
-    psik = single_step(dt_in, eng_in, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num)
-    psik = single_step(dt_out, eng_out, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num)
+# Progress bar updated from inside the compiled propagation loop.
+_PROGRESS = {'bar': None}
+
+
+def _update_progress(n_done):
+    """Advance the active progress bar to `n_done` steps (host callback)."""
+    bar = _PROGRESS['bar']
+    if bar is not None:
+        bar.update(int(n_done) - bar.n)
+
+
+#: ``jax.vmap`` axes of the ``full_step`` arguments of a batched ensemble.
+BATCH_AXES = (0, {'dt': None, 'kin': 0, 'pot': 0, 'coupl': 0}, 0, 0, 0,
+              None, None, None, 0)
+#: ``jax.vmap`` axes of the ``energy_terms`` arguments of a batched ensemble.
+ENERGY_AXES = (0, 0, 0, 0, None, 0, 0, 0, None, None, None)
+
+
+@partial(jax.jit, static_argnames=('scheme',))
+def step_operators(t_step, kin_eng, pot_eng, coupling, expon,
+                   scheme='magic_gamma'):
+    """Compute the sub-steps and evolution operators of a full step.
+
+    The full step `t_step` is divided into kinetic and real-space sub-steps
+    by a splitting scheme. The weights of the schemes are palindromic, so
+    operators are only computed for the leading half of the sub-steps.
+
+    Parameters
+    ----------
+    t_step : :obj:`float` or :obj:`complex`
+        Duration of the full time step.
+    kin_eng, pot_eng, coupling, expon : :obj:`Array`
+        See ``energy_terms``.
+    scheme : :obj:`str`, default='magic_gamma'
+        The name of the splitting scheme; see ``splitting.SCHEMES``. Static.
+
+    Returns
+    -------
+    ops : :obj:`dict` of :obj:`tuple`
+        The operators of the leading half of the sub-steps:
+
+        - 'dt': the durations of the real-space sub-steps,
+        - 'kin': the packed (2, Ny, Nx) kinetic evolution operators,
+        - 'pot': the packed (2, Ny, Nx) potential evolution operators,
+        - 'coupl': the (2, 2, Ny, Nx) half-step coupling operators, or
+          `None` if `coupling` is `None`.
+
+    """
+    kin_w, real_w = splitting.get_scheme(scheme).halves()
+    dts = tuple(t_step * w for w in real_w)
+    ops = {'dt': dts,
+           'kin': tuple(ttools.evolution_op(t_step * w, kin_eng)
+                        for w in kin_w),
+           'pot': tuple(ttools.evolution_op(dt, pot_eng) for dt in dts),
+           'coupl': None}
+    if coupling is not None:
+        ops['coupl'] = tuple(ttools.pack(ttools.coupling_op(
+            dt / 2, coupling, expon)) for dt in dts)
+    return ops
+
+
+def protocol_ops(t, ops, ham, protocol):
+    """Rebuild the real-space operators of `ops` for the Hamiltonian at `t`.
+
+    Parameters
+    ----------
+    t : :obj:`float`
+        The time at which the schedules of `protocol` are evaluated.
+    ops : :obj:`dict` of :obj:`tuple`
+        The operators of a full step; see ``step_operators``. Only the
+        kinetic operators are reused.
+    ham : :obj:`dict` of :obj:`Array`
+        The grids scaled by the schedules; see ``Protocol.hamiltonian``.
+        It also holds the coupling phase 'expon'.
+    protocol : :obj:`Protocol`
+        The schedules of the sequence.
+
+    Returns
+    -------
+    ops : :obj:`dict` of :obj:`tuple`
+        The operators of a full step under the Hamiltonian at `t`.
+
+    """
+    pot_eng, coupling = protocol.hamiltonian(t, ham)
+    dtype = ops['pot'][0].dtype
+    ops = dict(ops, pot=tuple(ttools.evolution_op(dt, pot_eng).astype(dtype)
+                              for dt in ops['dt']))
+    if ops['coupl'] is not None:
+        ops['coupl'] = tuple(ttools.pack(ttools.coupling_op(
+            dt / 2, coupling, ham['expon'])).astype(dtype)
+                             for dt in ops['dt'])
+    return ops
+
+
+def _step_tools(axis_name, acc_dtype):
+    """The FFTs and norm of a step, on a full grid or on a block of rows."""
+    if axis_name is None:
+        fft_2d = partial(ttools.fft_2d, shift=False)
+        ifft_2d = partial(ttools.ifft_2d, shift=False)
+        norm = partial(ttools.norm, acc_dtype=acc_dtype)
+    else:
+        fft_2d = partial(stools.fft_2d, axis_name=axis_name, shift=False)
+        ifft_2d = partial(stools.ifft_2d, axis_name=axis_name, shift=False)
+        norm = partial(stools.norm, axis_name=axis_name, acc_dtype=acc_dtype)
+    return fft_2d, ifft_2d, norm
+
+
+def _real_space_step(t_step, eng, psi, g_mat, dv_r, atom_num, norm):
+    """Apply the real-space operators of a sub-step to `psi`.
+
+    These are the interaction, coupling, and potential operators between
+    the two kinetic half-steps. `psi` is first renormalized with `norm`,
+    unless it is `None`.
+    """
+    with jax.named_scope('norm'):
+        if norm is None:
+            dens = ttools.density(psi)
+        else:
+            psi, dens = norm(psi, dv_r, atom_num)
+    if eng['coupl'] is None:
+        # Both interaction half-steps commute with the potential, so all
+        # three are applied in a single pass.
+        with jax.named_scope('interaction'):
+            int_eng = jnp.einsum('ij,j...->i...', g_mat, dens)
+            return ttools.evolution_op(t_step, int_eng) * eng['pot'] * psi
+    with jax.named_scope('interaction'):
+        int_eng = jnp.einsum('ij,j...->i...', g_mat, dens)
+        int_op = ttools.evolution_op(t_step / 2, int_eng)
+        psi = int_op * psi
+    with jax.named_scope('coupling'):
+        psi = ttools.apply_coupling(eng['coupl'], psi)
+    with jax.named_scope('potential'):
+        psi = eng['pot'] * psi
+    with jax.named_scope('coupling'):
+        psi = ttools.apply_coupling(eng['coupl'], psi)
+    with jax.named_scope('interaction'):
+        return int_op * psi
+
+
+@partial(jax.jit, static_argnames=('axis_name', 'acc_dtype'))
+def full_step(psik, ops, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num,
+              axis_name=None, acc_dtype=None):
+    """Full step forward on the packed (2, Ny, Nx) spinor `psik`.
+
+    The sub-steps of the splitting scheme are unrolled into one kernel.
+    Adjacent kinetic half-steps of consecutive real-space sub-steps are
+    applied as a single merged operator, and there are no intermediate
+    k-space renormalizations, which would only rescale `psik` before the
+    next real-space renormalization. In real time, i.e. for real sub-step
+    durations, the evolution is unitary and no renormalization is done.
+
+    Parameters
+    ----------
+    psik : :obj:`Array`
+        The packed k-space wavefunction, in FFT order.
+    ops : :obj:`dict` of :obj:`tuple`
+        The operators of the leading half of the sub-steps; see
+        ``step_operators``. The full sequence of sub-steps is mirrored from
+        them.
+
+    Other arguments are the same as for ``single_step``.
+
+    Returns
+    -------
+    psik : :obj:`Array`
+        The wavefunction after the full step.
+
+    """
+    fft_2d, ifft_2d, norm = _step_tools(axis_name, acc_dtype)
+    # Whether the time step is real is known when tracing.
+    r_norm = norm if jnp.iscomplexobj(ops['dt'][0]) else None
+    g_mat = jnp.array([[g_sc_uu, g_sc_ud], [g_sc_ud, g_sc_dd]])
+    # With `m` real-space sub-steps, there are `m` + 1 kinetic ones.
+    n_real = 2 * len(ops['dt']) - (len(ops['kin']) == len(ops['dt']))
+
+    with jax.named_scope('kinetic'):
+        psik = ops['kin'][0] * psik
+    for j in range(n_real):
+        i = min(j, n_real - 1 - j)
+        eng = {'pot': ops['pot'][i],
+               'coupl': None if ops['coupl'] is None else ops['coupl'][i]}
+        with jax.named_scope('ifft'):
+            psi = ifft_2d(psik, delta_r=dr)
+        psi = _real_space_step(ops['dt'][i], eng, psi, g_mat, dv_r, atom_num,
+                               r_norm)
+        with jax.named_scope('fft'):
+            psik = fft_2d(psi, delta_r=dr)
+        with jax.named_scope('kinetic'):
+            psik = ops['kin'][min(j + 1, n_real - 1 - j)] * psik
+    if r_norm is not None:
+        with jax.named_scope('norm'):
+            psik, _ = norm(psik, dv_k, atom_num)
     return psik
 
-@jax.jit
-def single_step(t_step, eng, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num):
-        
-    psik = [eng * pk for eng, pk in zip(eng['kin'], psik)]
-    psi = ttools.ifft_2d(psik, delta_r=dr)
-    psi, dens = ttools.norm(psi, dv_r, atom_num)
-    # print(self.g_sc['uu'])
+
+@partial(jax.jit, static_argnames=('axis_name', 'acc_dtype'))
+def single_step(t_step, eng, psik, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num, axis_name=None, acc_dtype=None):
+    """Single step forward on the packed (2, Ny, Nx) spinor `psik`.
+
+    Each operator acts on both components at once; the evolution operators
+    in `eng` are packed as well, with the coupling operator 'coupl' of shape
+    (2, 2, Ny, Nx); without coupling, 'coupl' is `None` and the coupling
+    steps are skipped. `psik` and the kinetic operator are kept in FFT
+    order (see ``tensor_tools.fft_order``), so the transforms need no
+    shifts. If `axis_name` is given, the step runs inside
+    ``shard_map`` on a block of rows, and the FFTs and norms communicate
+    along that mesh axis (see ``shard_tools``). The norms are accumulated
+    in `acc_dtype`, if given, and otherwise in the precision of `psik`.
+    For a real `t_step`, the compiled step does no renormalization.
+    Each phase of the step runs in a named scope, e.g. 'fft' or
+    'interaction', which labels it in profiler traces; see ``profiling``.
+    """
+    fft_2d, ifft_2d, norm = _step_tools(axis_name, acc_dtype)
+    # Real-time steps are unitary and skip the renormalizations.
+    renorm = jnp.iscomplexobj(t_step)
+    with jax.named_scope('kinetic'):
+        psik = eng['kin'] * psik
+    with jax.named_scope('ifft'):
+        psi = ifft_2d(psik, delta_r=dr)
+    with jax.named_scope('norm'):
+        if renorm:
+            psi, dens = norm(psi, dv_r, atom_num)
+        else:
+            dens = ttools.density(psi)
     # First half step of the interaction energy operator
-    int_eng = [g_sc_uu * dens[0] + g_sc_ud * dens[1],
-                g_sc_dd * dens[1] + g_sc_ud * dens[0]]
-    int_op = ttools.evolution_op(t_step / 2, int_eng)
-    psi = [op * p for op, p in zip(int_op, psi)]
+    with jax.named_scope('interaction'):
+        g_mat = jnp.array([[g_sc_uu, g_sc_ud], [g_sc_ud, g_sc_dd]])
+        int_eng = jnp.einsum('ij,j...->i...', g_mat, dens)
+        int_op = ttools.evolution_op(t_step / 2, int_eng)
+        psi = int_op * psi
     # First half step of the coupling energy operator
-    
-    psi = [sum([elem * p for elem, p in zip(row, psi)])
-            for row in eng['coupl']]
+    if eng['coupl'] is not None:
+        with jax.named_scope('coupling'):
+            psi = ttools.apply_coupling(eng['coupl'], psi)
     # Full step of the potential energy operator
-    psi = [eng * p for eng, p in zip(eng['pot'], psi)]
+    with jax.named_scope('potential'):
+        psi = eng['pot'] * psi
     # Second half step of the coupling energy operator
-    
-    psi = [sum([elem * p for elem, p in zip(row, psi)])
-            for row in eng['coupl']]
+    if eng['coupl'] is not None:
+        with jax.named_scope('coupling'):
+            psi = ttools.apply_coupling(eng['coupl'], psi)
     # Second half step of the interaction energy operator
     # ??? Is renormalization needed? It's not in previous code versions.
-    # psi, dens = ttools.norm(psi, self.space['dv_r'], self.atom_num)
-    # int_eng = [self.g_sc['uu'] * dens[0] + self.g_sc['ud'] * dens[1],
-    #            self.g_sc['dd'] * dens[1] + self.g_sc['ud'] * dens[0]]
-    # int_op = ttools.evolution_op(t_step / 2, int_eng)
-    psi = [op * p for op, p in zip(int_op, psi)]
+    with jax.named_scope('interaction'):
+        psi = int_op * psi
     # Second half step of the kintetic energy operator
-    psik = ttools.fft_2d(psi, delta_r=dr)
-    psik = [eng * pk for eng, pk in zip(eng['kin'], psik)]
-    psik, _ = ttools.norm(psik, dv_k, atom_num)
+    with jax.named_scope('fft'):
+        psik = fft_2d(psi, delta_r=dr)
+    with jax.named_scope('kinetic'):
+        psik = eng['kin'] * psik
+    if renorm:
+        with jax.named_scope('norm'):
+            psik, _ = norm(psik, dv_k, atom_num)
     return psik
+
+
+@partial(jax.jit, static_argnums=(1, 2),
+         static_argnames=('sample_rate', 'batched', 'mesh', 'acc_dtype',
+                          'renorm_rate', 'protocol', 'energy_rate',
+                          'monitor'))
+def scan_steps(psik, n_steps, progress_rate, step_offset, ops, g_sc_uu,
+               g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num, samples=None,
+               sample_rate=0, batched=False, mesh=None, acc_dtype=None,
+               renorm_rate=0, protocol=None, ham=None, energy_rate=0,
+               eng_grids=None, monitor=None, monitor_args=None):
+    """Propagate `n_steps` full steps in a single compiled loop.
+
+    The populations of each spin component are computed on-device after
+    every step and stacked by ``jax.lax.scan`` into a pre-allocated
+    (`n_steps`, 2) output array, so no values are transferred to the host
+    during propagation.
+
+    Parameters
+    ----------
+    psik : :obj:`Array`
+        The packed k-space wavefunction at the start of the loop.
+    n_steps : :obj:`int`
+        The number of full time steps to take. Static; a new value triggers
+        recompilation.
+    progress_rate : :obj:`int`
+        Number of steps between host progress callbacks. Static; 0 disables
+        progress reporting.
+    step_offset : :obj:`int`
+        Global index of the first step in this loop, used when a propagation
+        is split into several consecutive loops.
+    samples : :obj:`Array`, optional
+        A (n_chunk, 2, Ny, Nx) ring buffer of sampled wavefunctions. Before
+        every step whose global index is a multiple of `sample_rate`, the
+        wavefunction is written into slot
+        ``(step // sample_rate) % n_chunk``.
+    sample_rate : :obj:`int`, default=0
+        Number of steps between samples. Static; 0 disables sampling.
+    batched : :obj:`bool`, default=False
+        If True, `psik`, the operators of `ops`, the scattering strengths and
+        `atom_num` carry a leading batch axis, and ``full_step`` is
+        vectorized over it with ``jax.vmap``. The populations then have
+        shape (`n_steps`, batch, 2). Static.
+    mesh : :obj:`jax.sharding.Mesh`, optional
+        If given, the grid is split across the devices of `mesh` and
+        ``full_step`` runs through ``shard_tools.shard_step``. Static.
+    acc_dtype : :obj:`str`, optional
+        The dtype in which norms and populations are accumulated, e.g.
+        'float64' for a single-precision `psik`. Static.
+    renorm_rate : :obj:`int`, default=0
+        In real time, rescale `psik` to `atom_num` after every step whose
+        global index is a multiple of `renorm_rate`, correcting the drift of
+        the otherwise unnormalized evolution. The populations of the step
+        are reused, so a correction costs no extra reduction. Static; 0
+        disables the corrections.
+    protocol : :obj:`Protocol`, optional
+        Schedules of a time-dependent Hamiltonian. The real-space operators
+        of every step are rebuilt on-device from the grids of `ham`, with
+        the schedules evaluated at the middle of the step, at time
+        ``(step + 1/2) * ham['t_step']``. Static.
+    ham : :obj:`dict` of :obj:`Array`, optional
+        The grids scaled by `protocol` (see ``protocol_ops``) and the
+        duration 't_step' of a full step.
+    energy_rate : :obj:`int`, default=0
+        Log the energy components of ``energy_terms`` after every step
+        whose global index plus one is a multiple of `energy_rate`. Static;
+        0 disables the logging.
+    eng_grids : :obj:`dict` of :obj:`Array`, optional
+        The 'kin', 'pot', 'coupling', and 'expon' arguments of
+        ``energy_terms``. With a `protocol`, the potential and coupling are
+        instead those at the end of the step.
+    monitor : :obj:`Monitor`, optional
+        Evaluates its observables after every `monitor.rate` steps and sends
+        them to the host through a callback; see ``diagnostics.Monitor``.
+        Static.
+    monitor_args : :obj:`dict` of :obj:`dict`, optional
+        The 'space' arguments of the observables, shared by all ensemble
+        members, and the per-'member' arguments; see
+        ``TensorPropagator.monitor_args``.
+
+    Other arguments are the same as for ``full_step``.
+
+    Returns
+    -------
+    carry : :obj:`tuple`
+        The k-space wavefunction after `n_steps`, and the updated `samples`.
+    pops : :obj:`Array` or :obj:`tuple`
+        The (`n_steps`, 2) populations after each step. With `energy_rate`,
+        a tuple of the populations and the (`n_steps`, 4) energies, which
+        are NaN after the steps that are not logged.
+
+    """
+    def write_sample(samples, psik, step):
+        slot = (step // sample_rate) % samples.shape[0]
+        return samples.at[slot].set(psik)
+
+    def renormalize(psik, pops):
+        factor = atom_num / jnp.sum(pops, axis=-1)
+        scale = jnp.sqrt(factor).astype(psik.real.dtype)
+        return psik * scale[..., None, None, None], pops * factor[..., None]
+
+    step_fn = partial(full_step, acc_dtype=acc_dtype)
+    if mesh is not None:
+        step_fn = stools.shard_step(step_fn, mesh)
+    if batched:
+        step_fn = jax.vmap(step_fn, in_axes=BATCH_AXES)
+
+    def observe(psik, step):
+        member = monitor_args['member']
+        if protocol is not None:
+            pot, coupling = protocol.hamiltonian((step + 1) * ham['t_step'],
+                                                 ham)
+            member = dict(member, pot=pot, coupling=coupling)
+        space = monitor_args['space']
+
+        def evaluate(psik, member):
+            return monitor.evaluate(psik, {**space, **member})
+        if batched:
+            evaluate = jax.vmap(evaluate)
+        jax.debug.callback(monitor.emit, step + 1,
+                           (step + 1) * space['t_step'],
+                           evaluate(psik, member))
+
+    pops_dtype = jnp.dtype(acc_dtype or psik.real.dtype)
+    eng_fn = energy_terms
+    if batched:
+        eng_fn = jax.vmap(eng_fn, in_axes=ENERGY_AXES)
+
+    def measure(psik, step):
+        pot, coupling = eng_grids['pot'], eng_grids['coupling']
+        if protocol is not None:
+            pot, coupling = protocol.hamiltonian((step + 1) * ham['t_step'],
+                                                 ham)
+        return eng_fn(psik, eng_grids['kin'], pot, coupling,
+                      eng_grids['expon'], g_sc_uu, g_sc_ud, g_sc_dd, dr,
+                      dv_r, dv_k).astype(pops_dtype)
+
+    def body(carry, step):
+        psik, samples = carry
+        if sample_rate:
+            samples = jax.lax.cond(step % sample_rate == 0, write_sample,
+                                   lambda samples, *_: samples,
+                                   samples, psik, step)
+        step_ops = ops
+        if protocol is not None:
+            step_ops = protocol_ops((step + 0.5) * ham['t_step'], ops, ham,
+                                    protocol)
+        psik = step_fn(psik, step_ops, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r,
+                       dv_k, atom_num)
+        pops = jnp.sum(ttools.density(psik), axis=(-2, -1),
+                       dtype=acc_dtype) * dv_k
+        if renorm_rate:
+            psik, pops = jax.lax.cond((step + 1) % renorm_rate == 0,
+                                      renormalize, lambda *args: args,
+                                      psik, pops)
+        if progress_rate:
+            n_done = step + 1
+            jax.lax.cond(n_done % progress_rate == 0,
+                         lambda n: jax.debug.callback(_update_progress, n),
+                         lambda n: None, n_done)
+        if monitor is not None:
+            jax.lax.cond((step + 1) % monitor.rate == 0, observe,
+                         lambda *_: None, psik, step)
+        if energy_rate:
+            shape = (*psik.shape[:-3], 4)
+            energies = jax.lax.cond(
+                (step + 1) % energy_rate == 0, measure,
+                lambda *_: jnp.full(shape, jnp.nan, pops_dtype), psik, step)
+            return (psik, samples), (pops, energies)
+        return (psik, samples), pops
+
+    steps = step_offset + jnp.arange(n_steps)
+    return jax.lax.scan(body, (psik, samples), steps)
+
+
+@jax.jit
+def energy_terms(psik, kin_eng, pot_eng, coupling, expon, g_sc_uu, g_sc_ud,
+                 g_sc_dd, dr, dv_r, dv_k):
+    """Compute the energy components of a packed wavefunction on-device.
+
+    The kinetic energy is evaluated in k-space directly from `psik`; the
+    potential, interaction, and coupling energies in real space.
+
+    Parameters
+    ----------
+    psik : :obj:`Array`
+        The packed (2, Ny, Nx) k-space wavefunction, in FFT order.
+    kin_eng : :obj:`Array`
+        The packed kinetic energy grids, in FFT order.
+    pot_eng : :obj:`Array`
+        The packed potential energy grids.
+    coupling : :obj:`Array` or `None`
+        The coupling strength grid, or `None` without coupling.
+    expon : :obj:`Array`
+        The exponential argument on the coupling operator off-diagonals.
+
+    Other arguments are the same as for ``single_step``.
+
+    Returns
+    -------
+    energies : :obj:`Array`
+        The (4,) total [<kin.>, <pot.>, <int.>, <coupl.>] energies.
+
+    """
+    kin = jnp.sum(kin_eng * ttools.density(psik)) * dv_k
+    psi = ttools.ifft_2d(psik, delta_r=dr, shift=False)
+    dens = ttools.density(psi)
+    pot = jnp.sum(pot_eng * dens) * dv_r
+    int_e = jnp.sum(g_sc_uu * dens[0]**2 + g_sc_dd * dens[1]**2
+                    + 2 * g_sc_ud * dens[0] * dens[1]) * dv_r / 2
+    coupl_e = 0.0
+    if coupling is not None:
+        coupl_e = jnp.sum(coupling * jnp.real(jnp.conj(psi[0]) * psi[1]
+                                              * jnp.exp(-1j * expon))) * dv_r
+    return jnp.stack([kin, pot, int_e, coupl_e])
+
+
+#: Weights of the [kin., pot., int., coupl.] energies in the per-particle
+#: convergence measures.
+_CRITERION_WEIGHTS = {'energy': (1, 1, 1, 1), 'chem_pot': (1, 1, 2, 1)}
+
+
+def _conv_value(criterion, psik, energies, atom_num):
+    """The quantity whose change measures convergence."""
+    if criterion == 'residual':
+        return psik
+    return jnp.sum(jnp.array(_CRITERION_WEIGHTS[criterion]) * energies
+                   ) / atom_num
+
+
+def _conv_metric(criterion, val, prev, dv_k, atom_num):
+    """The change of a convergence quantity between two checks."""
+    if criterion == 'residual':
+        return jnp.sqrt(jnp.sum(jnp.abs(val - prev)**2) * dv_k / atom_num)
+    return jnp.abs(val - prev) / jnp.abs(val)
+
+
+@partial(jax.jit, static_argnums=(2, 3, 4, 5),
+         static_argnames=('mesh', 'acc_dtype'))
+def converge_steps(psik, tol, n_steps, check_rate, progress_rate, criterion,
+                   ops, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num,
+                   kin_eng, pot_eng, coupling, expon, mesh=None,
+                   acc_dtype=None):
+    """Propagate until converged, or for at most `n_steps` full steps.
+
+    Blocks of `check_rate` steps are run by ``scan_steps`` inside a
+    ``jax.lax.while_loop``. After every block, the convergence measure is
+    computed on-device and the loop stops as soon as it falls below `tol`,
+    so no values are transferred to the host until the loop has finished.
+
+    Parameters
+    ----------
+    psik : :obj:`Array`
+        The packed k-space wavefunction at the start of the loop.
+    tol : :obj:`float`
+        The convergence tolerance.
+    n_steps : :obj:`int`
+        The maximum number of full time steps; a multiple of `check_rate`.
+        Static.
+    check_rate : :obj:`int`
+        Number of steps between convergence checks. Static.
+    progress_rate : :obj:`int`
+        Number of steps between host progress callbacks. Static.
+    criterion : :obj:`str`
+        The convergence measure. Static. One of:
+
+        - 'energy': relative change of the energy per particle,
+        - 'chem_pot': relative change of the chemical potential,
+        - 'residual': L2 norm of the change of the wavefunction, relative to
+          its norm.
+
+    kin_eng, pot_eng, coupling, expon : :obj:`Array`
+        See ``energy_terms``.
+
+    Other arguments are the same as for ``scan_steps``.
+
+    Returns
+    -------
+    psik : :obj:`Array`
+        The k-space wavefunction at the end of the loop.
+    n_done : :obj:`Array`
+        The number of full steps taken.
+    pops : :obj:`Array`
+        The (`n_steps`, 2) populations after each step; the entries after
+        `n_done` are zero.
+    history : :obj:`Array`
+        The convergence measure after each block of `check_rate` steps; the
+        entries of unused blocks are NaN.
+    converged : :obj:`Array`
+        Whether the tolerance was reached.
+
+    """
+    n_checks = n_steps // check_rate
+    step_args = (ops, g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num)
+
+    def measure(psik):
+        eng = None
+        if criterion != 'residual':
+            eng = energy_terms(psik, kin_eng, pot_eng, coupling, expon,
+                               g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k)
+        return _conv_value(criterion, psik, eng, atom_num)
+
+    def cond(carry):
+        _, _, check, _, _, done = carry
+        return (check < n_checks) & ~done
+
+    def body(carry):
+        psik, prev, check, pops, history, _ = carry
+        (psik, _), block_pops = scan_steps(psik, check_rate, progress_rate,
+                                           check * check_rate, *step_args,
+                                           mesh=mesh, acc_dtype=acc_dtype)
+        val = measure(psik)
+        metric = _conv_metric(criterion, val, prev, dv_k, atom_num)
+        pops = jax.lax.dynamic_update_slice(pops, block_pops,
+                                            (check * check_rate, 0))
+        history = history.at[check].set(metric)
+        return psik, val, check + 1, pops, history, metric < tol
+
+    pops_dtype = acc_dtype or jnp.finfo(psik.dtype).dtype
+    init = (psik, measure(psik), 0, jnp.zeros((n_steps, 2), pops_dtype),
+            jnp.full(n_checks, jnp.nan), False)
+    psik, _, n_checks_done, pops, history, converged = jax.lax.while_loop(
+        cond, body, init)
+    return psik, n_checks_done * check_rate, pops, history, converged
+
+
+@partial(jax.jit, static_argnums=(3, 4, 5, 6),
+         static_argnames=('mesh', 'acc_dtype', 'scheme'))
+def adaptive_steps(psik, t_step, tol, n_steps, check_rate, progress_rate,
+                   criterion, dt_min, dt_max, dt_factor, g_sc_uu, g_sc_ud,
+                   g_sc_dd, dr, dv_r, dv_k, atom_num, kin_eng, pot_eng,
+                   coupling, expon, mesh=None, acc_dtype=None,
+                   scheme='magic_gamma'):
+    """Relax in imaginary time with an adaptive time step.
+
+    As in ``converge_steps``, blocks of `check_rate` steps are run inside a
+    ``jax.lax.while_loop``, but the time step is adapted by monitoring the
+    energy after every block:
+
+    - if the energy increased, the block is rejected, i.e. the wavefunction
+      is restored, and the time step is divided by `dt_factor`;
+    - if the convergence measure fell below `tol`, the time step is divided
+      by `dt_factor`, to reduce the splitting error of the relaxed state;
+      the loop stops once this happens with a time step of `dt_min`;
+    - otherwise, the time step is multiplied by `dt_factor`, though never
+      back up to a time step that was rejected.
+
+    The time step stays within [`dt_min`, `dt_max`]. The evolution operators
+    are carried through the loop and only recomputed, in the precision of
+    `psik`, when the time step changes.
+
+    Parameters
+    ----------
+    psik : :obj:`Array`
+        The packed k-space wavefunction at the start of the loop.
+    t_step : :obj:`float`
+        The initial (real) duration of a full imaginary time step.
+    tol : :obj:`float`
+        The convergence tolerance.
+    n_steps : :obj:`int`
+        The maximum number of full time steps, including rejected ones; a
+        multiple of `check_rate`. Static.
+    check_rate : :obj:`int`
+        Number of steps between adjustments of the time step. Static.
+    progress_rate : :obj:`int`
+        Number of steps between host progress callbacks. Static.
+    criterion : :obj:`str`
+        The convergence measure; see ``converge_steps``. Static.
+    dt_min, dt_max : :obj:`float`
+        The bounds of the time step.
+    dt_factor : :obj:`float`
+        The factor by which the time step grows or shrinks.
+    scheme : :obj:`str`, default='magic_gamma'
+        The splitting scheme of the recomputed operators; see
+        ``step_operators``. Static.
+
+    Other arguments are the same as for ``converge_steps``.
+
+    Returns
+    -------
+    psik : :obj:`Array`
+        The k-space wavefunction at the end of the loop.
+    t_step : :obj:`Array`
+        The final time step.
+    ops : :obj:`dict` of :obj:`tuple`
+        The final evolution operators; see ``step_operators``.
+    n_done : :obj:`Array`
+        The number of full steps taken, including rejected ones.
+    n_kept : :obj:`Array`
+        The number of accepted blocks.
+    pops : :obj:`Array`
+        The (`n_steps`, 2) populations after each accepted step.
+    times : :obj:`Array`
+        The (`n_steps`,) propagation times of each accepted step.
+    history : :obj:`Array`
+        The convergence measure after each accepted block.
+    t_steps : :obj:`Array`
+        The time step of each accepted block.
+    converged : :obj:`Array`
+        Whether the tolerance was reached at the smallest time step.
+
+    """
+    n_checks = n_steps // check_rate
+    static_args = (g_sc_uu, g_sc_ud, g_sc_dd, dr, dv_r, dv_k, atom_num)
+    eng_args = (kin_eng, pot_eng, coupling, expon)
+
+    precision = 'single' if psik.dtype == jnp.complex64 else 'double'
+
+    def make_ops(t_step):
+        return ttools.to_precision(
+            step_operators(-1.0j * t_step, *eng_args, scheme=scheme),
+            precision)
+
+    def energy(psik):
+        return energy_terms(psik, *eng_args, g_sc_uu, g_sc_ud, g_sc_dd, dr,
+                            dv_r, dv_k)
+
+    def record(arr, vals, index):
+        start = (index,) + (0,) * (arr.ndim - 1)
+        return jax.lax.dynamic_update_slice(arr, vals, start)
+
+    def cond(carry):
+        return (carry['n_done'] < n_steps) & ~carry['done']
+
+    def body(carry):
+        t_step = carry['t_step']
+        (psik, _), block_pops = scan_steps(
+            carry['psik'], check_rate, progress_rate, carry['n_done'],
+            carry['ops'], *static_args, mesh=mesh, acc_dtype=acc_dtype)
+        eng = energy(psik)
+        total = jnp.sum(eng)
+        val = _conv_value(criterion, psik, eng, atom_num)
+        metric = _conv_metric(criterion, val, carry['val'], dv_k, atom_num)
+
+        at_min = t_step <= dt_min
+        rise = total - carry['eng']
+        accept = (rise <= 1e-12 * jnp.abs(carry['eng'])) | at_min
+        converged = accept & (metric < tol)
+        shrink = ~accept | converged
+        # A rejected time step is not tried again.
+        ceiling = jnp.where(accept, carry['ceiling'], t_step / dt_factor)
+        new_step = jnp.where(shrink, jnp.maximum(t_step / dt_factor, dt_min),
+                             jnp.minimum(t_step * dt_factor, ceiling))
+        ops = jax.lax.cond(new_step != t_step, make_ops,
+                           lambda _: carry['ops'], new_step)
+
+        kept = carry['n_kept']
+        block_times = carry['time'] + t_step * jnp.arange(1, check_rate + 1)
+
+        def keep(carry):
+            return {**carry, 'psik': psik, 'val': val, 'eng': total,
+                    'n_kept': kept + 1, 'time': block_times[-1],
+                    'pops': record(carry['pops'], block_pops,
+                                   kept * check_rate),
+                    'times': record(carry['times'], block_times,
+                                    kept * check_rate),
+                    'history': carry['history'].at[kept].set(metric),
+                    't_steps': carry['t_steps'].at[kept].set(t_step)}
+
+        carry = jax.lax.cond(accept, keep, lambda carry: carry, carry)
+        return {**carry, 't_step': new_step, 'ops': ops, 'ceiling': ceiling,
+                'n_done': carry['n_done'] + check_rate,
+                'done': converged & at_min}
+
+    eng = energy(psik)
+    init = {'psik': psik, 't_step': jnp.asarray(t_step, dtype=float),
+            'ops': make_ops(t_step), 'val': _conv_value(criterion, psik, eng,
+                                                        atom_num),
+            'eng': jnp.sum(eng), 'ceiling': jnp.asarray(dt_max, dtype=float),
+            'n_done': 0, 'n_kept': 0, 'time': 0.0,
+            'pops': jnp.zeros((n_steps, 2), acc_dtype or jnp.finfo(
+                psik.dtype).dtype), 'times': jnp.zeros(n_steps),
+            'history': jnp.full(n_checks, jnp.nan),
+            't_steps': jnp.full(n_checks, jnp.nan), 'done': False}
+    out = jax.lax.while_loop(cond, body, init)
+    return (out['psik'], out['t_step'], out['ops'], out['n_done'],
+            out['n_kept'], out['pops'], out['times'], out['history'],
+            out['t_steps'], out['done'])
+
+
 class TensorPropagator:
     """CPU- or GPU-compatible propagator of the GPE, with tensors.
 
@@ -68,10 +792,8 @@ class TensorPropagator:
         See ``pspinor.Pspinor``.
     t_step : :obj:`float` or :obj:`complex`
         Duration of the full time step.
-    dt_out : :obj:`float` or :obj:`complex`
-        Duration of the outer time sub-step.
-    dt_in : :obj:`float` or :obj:`complex`
-        Duration of the inner time sub-step.
+    scheme : :obj:`str`
+        The name of the splitting scheme of a full step; see ``splitting``.
     rand_seed : :obj:`int`
         See ``pspinor.Pspinor``.
     is_sampling : :obj:`bool`
@@ -82,12 +804,14 @@ class TensorPropagator:
         See ``pspinor.Pspinor``.
     g_sc : :obj:`dict` of :obj:`Tensor`
         See `pspinor.Pspinor`.
-    kin_eng_spin : :obj:`list` of :obj:`Tensor`
-        See ``pspinor.Pspinor``.
-    pot_eng_spin : :obj:`list` of :obj:`Tensor`
-        See ``pspinor.Pspinor``.
-    psik : :obj:`list` of :obj:`Tensor`
-        See `pspinor.Pspinor`.
+    kin_eng_spin : :obj:`Array`
+        See ``pspinor.Pspinor``; packed into a (2, Ny, Nx) array, in FFT
+        order (see ``tensor_tools.fft_order``).
+    pot_eng_spin : :obj:`Array`
+        See ``pspinor.Pspinor``; packed into a (2, Ny, Nx) array.
+    psik : :obj:`Array`
+        See `pspinor.Pspinor`; packed into a (2, Ny, Nx) array, in FFT
+        order. Results and samples are centered again on output.
     space : :obj:`dict` of :obj:`Tensor`
         See `pspinor.Pspinor`. Contains only keys:
             {'dr', 'dk', 'x_mesh', 'y_mesh', 'dv_r', 'dv_k'}
@@ -100,21 +824,84 @@ class TensorPropagator:
         the coupling is in a rotated reference frame, then `expon`=0.0.
     sample_rate : :obj:`int`
         How often wavefunctions are sampled.
-    eng_out : :obj:`dict` of :obj:`Tensor`
-        Pre-computed energy evolution operators for the outer time sub-step.
-    eng_in : :obj:`dict` of :obj:`Tensor`
-        Pre-computed energy evolution operators for the inner time sub-step.
+    sample_chunk : :obj:`int`
+        The number of samples in the on-device ring buffer.
+    compression : :obj:`str` or `None`
+        The codec of the sampled wavefunctions on disk, if any.
+    mesh : :obj:`jax.sharding.Mesh` or `None`
+        The device mesh across which the grid is split, if any.
+    tol : :obj:`float` or `None`
+        Tolerance for stopping imaginary-time propagation early, if any.
+    criterion : :obj:`str`
+        The convergence measure compared against `tol`.
+    check_rate : :obj:`int`
+        Number of steps between convergence checks.
+    adaptive : :obj:`bool`
+        Whether the imaginary time step is adapted during relaxation.
+    dt_bounds : :obj:`tuple` of :obj:`float`
+        The (minimum, maximum) adaptive time step.
+    dt_factor : :obj:`float`
+        The factor by which the adaptive time step grows or shrinks.
+    time : :obj:`str`
+        Whether propagation occurs in real or imaginary time.
+    precision : :obj:`str`
+        The precision of the wavefunction and evolution operators:
+        {'single', 'double'}.
+    acc_dtype : :obj:`str` or `None`
+        The dtype in which norms and populations are accumulated, if it
+        differs from the precision of the wavefunction.
+    drift_rate : :obj:`int`
+        Number of steps between checks of the atom number and energy drift.
+    drift_tol : :obj:`float`
+        The relative drift above which a check warns or falls back.
+    fallback : :obj:`bool`
+        Whether single-precision propagation switches to double precision
+        when the drift exceeds `drift_tol`.
+    ops : :obj:`dict` of :obj:`tuple`
+        Pre-computed sub-step durations and evolution operators; see
+        ``step_operators``.
+    checkpoint_rate : :obj:`int`
+        Number of steps between checkpoints of the propagation loop.
+    resume : :obj:`bool` or :obj:`str`
+        Whether, or from which checkpoint file, the propagation resumes.
+    protocol : :obj:`Protocol` or `None`
+        The schedules of a time-dependent Hamiltonian, if any; see
+        ``protocol``.
+    ham : :obj:`dict` of :obj:`Array` or `None`
+        The grids scaled by `protocol`, and the real time step 't_step'.
+    energy_rate : :obj:`int`
+        Number of steps between on-device logs of the energy components.
+    monitor : :obj:`Monitor` or `None`
+        Streams observables out of the propagation loop, if any.
+    profile : :obj:`bool` or :obj:`str`
+        Whether, or in which directory, ``prop_loop`` records a profiler
+        trace.
 
     """
 
     # Ideally it would be great to keep this class agnostic as to the
     # wavefunction structure, i.e. pseudospinors vs. scalars vs. spin-1.
 
+    #: Whether the propagated arrays carry a leading batch axis.
+    batched = False
+    #: The keyword options of the constructor, under "Other Parameters".
+    OPTIONS = frozenset({
+        'progress_rate', 'sample_chunk', 'compression', 'mesh', 'op_cache',
+        'compile_cache', 'aot', 'tol', 'criterion', 'check_rate', 'adaptive',
+        'dt_bounds', 'dt_factor', 'precision', 'accumulate', 'drift_rate',
+        'drift_tol', 'fallback', 'renorm_rate', 'scheme', 'checkpoint_rate',
+        'resume', 'protocol', 'energy_rate', 'monitor', 'profile'})
+
     # pylint: disable=too-many-instance-attributes
+    # pylint: disable=import-outside-toplevel
     def __init__(self, spin, t_step, n_steps, device='cpu', time='imag',
-                 is_sampling=False, n_samples=1):
+                 is_sampling=False, n_samples=1, **kwargs):
         """Begin a propagation loop.
 
+        Keyword options other than those below, i.e. those of ``OPTIONS``,
+        are rejected, so that a misspelled option does not silently run a
+        different propagation.
+
         Parameters
         ----------
         spin :  :obj:`PSpinor`
@@ -134,73 +921,316 @@ class TensorPropagator:
         n_samples : :obj:`int`, default=1
             The number of samples to save.
 
+        Other Parameters
+        ----------------
+        progress_rate : :obj:`int`, optional
+            Number of steps between updates of the progress bar, which are
+            sent from the compiled loop through a host callback. Defaults to
+            1% of `n_steps`, or to 0 with `compile_cache`, since loops with
+            host callbacks are not stored in the persistent cache; 0
+            disables the progress bar.
+        sample_chunk : :obj:`int`, optional
+            The number of sampled wavefunctions held in the on-device ring
+            buffer before they are written to disk. Default is 16.
+        compression : :obj:`str`, optional
+            Compress each sampled wavefunction on disk with a codec of
+            ``sampling.CODECS``, {'zlib', 'bz2', 'lzma'}. Default is no
+            compression, which lets the samples be memory-mapped.
+        mesh : :obj:`int`, :obj:`list` of devices, or :obj:`Mesh`, optional
+            Splits the grid along the y-axis across a mesh of devices; see
+            ``shard_tools.make_mesh``. Both grid dimensions must be
+            divisible by the number of devices. Default is no splitting.
+        op_cache : :obj:`bool`, default=True
+            Reuse the device energy grids and evolution operators of earlier
+            propagators with the same time step, grid, and Hamiltonian, from
+            ``op_cache.OPERATORS``.
+        compile_cache : :obj:`bool` or :obj:`str`, default=False
+            Enable JAX's persistent compilation cache, in the given root
+            directory or in ``compile_cache.CACHE_DIR``; see
+            ``compile_cache.enable_persistent_cache``. JAX does not cache
+            programs with host callbacks, so the propagation loop is only
+            cached without a progress bar, the default with
+            `compile_cache`, and without a `monitor`.
+        aot : :obj:`bool`, default=False
+            Load the ``full_step`` kernel of single steps, i.e. of
+            ``full_step()``, ahead-of-time compiled from the cache
+            directory; see ``compile_cache.load_step``. It does not apply
+            to the compiled loops of ``prop_loop``, which are covered by
+            `compile_cache`.
+        tol : :obj:`float`, optional
+            In imaginary time, stop propagating once the convergence measure
+            falls below `tol`; `n_steps` is then the maximum number of steps.
+            Default is to always take `n_steps` steps.
+        criterion : :obj:`str`, default='energy'
+            The convergence measure: {'energy', 'chem_pot', 'residual'}; see
+            ``converge_steps``.
+        check_rate : :obj:`int`, optional
+            Number of steps between convergence checks. It must evenly divide
+            `n_steps`. Defaults to `progress_rate`, or to 1% of `n_steps`
+            without a progress bar.
+        adaptive : :obj:`bool`, default=False
+            In imaginary time with a tolerance `tol`, adapt the time step
+            after every convergence check; see ``adaptive_steps``.
+        dt_bounds : :obj:`tuple` of :obj:`float`, optional
+            The (minimum, maximum) adaptive time step. Default is
+            (`t_step` / 16, 16 * `t_step`).
+        dt_factor : :obj:`float`, default=2.0
+            The factor by which the adaptive time step grows or shrinks.
+        precision : :obj:`str`, default='double'
+            {'single', 'double'}: propagate a complex64 or complex128
+            wavefunction, with evolution operators of the same precision.
+            Single precision halves the memory of the propagation arrays.
+        accumulate : :obj:`bool`, default=True
+            In single precision, accumulate norms and populations in float64.
+        drift_rate : :obj:`int`, optional
+            Number of steps between checks of the drift of the atom number
+            and, in real time, of the energy; with sampling, the checks
+            follow each chunk of samples instead. Defaults to 10% of
+            `n_steps` in single precision; 0 disables the checks.
+        drift_tol : :obj:`float`, default=1e-4
+            The relative drift above which a check warns, or falls back.
+        fallback : :obj:`bool`, default=True
+            Switch single-precision propagation to double precision, rather
+            than only warning, when the drift exceeds `drift_tol`.
+        renorm_rate : :obj:`int`, default=0
+            Real-time steps are unitary and compile without any
+            renormalization. With `renorm_rate`, the atom number is instead
+            restored every `renorm_rate` steps, as a drift correction; see
+            ``scan_steps``.
+        scheme : :obj:`str`, default='magic_gamma'
+            The splitting scheme of a full step, e.g. 'strang',
+            'forest_ruth', 'yoshida6', or 'blanes_moan'; see
+            ``splitting.SCHEMES`` and ``splitting.best_scheme``.
+        checkpoint_rate : :obj:`int`, default=0
+            Number of steps between checkpoints of the propagation loop,
+            written asynchronously to
+            `trial_data/checkpoint-`folder_name`.npz; see ``prop_loop``.
+            Not supported with a convergence tolerance `tol`. 0 disables
+            checkpoints.
+        resume : :obj:`bool` or :obj:`str`, default=False
+            Continue the propagation from the latest checkpoint of the trial,
+            or from the given checkpoint file.
+        protocol : :obj:`Protocol`, optional
+            In real time, schedules of the coupling amplitude, detuning, and
+            trap scale, evaluated on-device at every step; see
+            ``protocol.Protocol``. Default is a constant Hamiltonian.
+        energy_rate : :obj:`int`, default=0
+            Number of steps between logs of the energy components, which are
+            computed spectrally inside the compiled loop and stored in the
+            result's `energies`; see ``energy_terms``. Not supported with a
+            convergence tolerance `tol`. 0 disables the log.
+        monitor : :obj:`Monitor`, optional
+            Evaluates observables, e.g. the populations, energy, norm drift,
+            peak density, or center of mass, on-device every `monitor.rate`
+            steps, and streams them asynchronously to the monitor's sinks;
+            see ``diagnostics.Monitor``. Not supported with a convergence
+            tolerance `tol`.
+        profile : :obj:`bool` or :obj:`str`, default=False
+            Record a JAX profiler trace of ``prop_loop`` in
+            `trial_data/profile/`, or in the given directory, for e.g.
+            TensorBoard or Perfetto. The phases of the steps are labeled by
+            named scopes; see ``profiling`` and ``profile_step``.
+
         """
+        unknown = sorted(set(kwargs) - self.OPTIONS)
+        assert not unknown, (f"Unknown propagator options {unknown}; choose "
+                             f"from {sorted(self.OPTIONS)}.")
+        from spinor_gpe.pspinor import compile_cache
+        cache_dir = kwargs.get('compile_cache', False)
+        if cache_dir:
+            compile_cache.enable_persistent_cache(
+                cache_dir if isinstance(cache_dir, str) else None)
+
         self.n_steps = n_steps
+        percent = max(n_steps // 100, 1)
+        self.progress_rate = kwargs.get('progress_rate',
+                                        0 if cache_dir else percent)
         self.device = device
         self.paths = spin.paths
 
         # Calculate the time step intervals
+        self.time = time
         if time == 'imag':
             self.t_step = -1.0j * t_step
         elif time == 'real':
             self.t_step = t_step
 
-        magic_gamma = 1 / (2 + 2**(1 / 3))
-        self.dt_out = self.t_step * magic_gamma
-        self.dt_in = self.t_step * (1 - 2 * magic_gamma)
-
         self.rand_seed = spin.rand_seed
         if self.rand_seed is not None:
-            torch.manual_seed(self.rand_seed)
+            np.random.seed(self.rand_seed)
         self.is_sampling = is_sampling
 
         # Load in data from PSpinor object as tensors
         self.atom_num = spin.atom_num
         self.is_coupling = spin.is_coupling
         self.g_sc = spin.g_sc
-        self.kin_eng_spin = ttools.to_tensor(spin.kin_eng_spin,
-                                             dev=self.device)
-        self.pot_eng_spin = ttools.to_tensor(spin.pot_eng_spin,
-                                             dev=self.device)
-        self.psik = ttools.to_tensor(spin.psik, dev=self.device, dtype=128)
+        self.psik = ttools.fft_order(ttools.pack(
+            ttools.to_tensor(spin.psik, dev=self.device, dtype=128)))
         keys_space = ['dr', 'dk', 'x_mesh', 'y_mesh', 'dv_r', 'dv_k']
         self.space = {k: jnp.array(spin.space[k])
                       for k in keys_space}
-        self.coupling = ttools.to_tensor(spin.coupling, dev=self.device)
 
         # pylint: disable=invalid-name
         self.kL_recoil = spin.kL_recoil
-        if spin.rot_coupling:
-            self.expon = jnp.array([0.0])[0]
-        else:
-            self.expon = 2 * self.kL_recoil * self.space['x_mesh']
         # Calculate the sampling and annealing rates, as needed.
         if self.is_sampling:
             assert self.n_steps % n_samples == 0, (
                 f"The number of samples requested {n_samples} does not evenly "
                 f"divide the total number of steps {self.n_steps}.")
 
-        self.sample_rate = self.n_steps / n_samples
-        # Pre-compute several evolution operators
-        self.eng_out = {'kin': ttools.evolution_op(self.dt_out / 2,
-                                                   self.kin_eng_spin),
-                        'pot': ttools.evolution_op(self.dt_out,
-                                                   self.pot_eng_spin),
-                        'coupl': ttools.coupling_op(self.dt_out,
-                                                    self.coupling / 2, self.expon)}
-        self.eng_in = {'kin': ttools.evolution_op(self.dt_in / 2,
-                                                  self.kin_eng_spin),
-                       'pot': ttools.evolution_op(self.dt_in,
-                                                  self.pot_eng_spin),
-                       'coupl': ttools.coupling_op(self.dt_in / 2,
-                                                   self.coupling, self.expon)}
+        self.sample_rate = self.n_steps // n_samples
+        self.sample_chunk = min(kwargs.get('sample_chunk', 16), n_samples)
+        self.compression = kwargs.get('compression', None)
+        self.checkpoint_rate = kwargs.get('checkpoint_rate', 0)
+        self.resume = kwargs.get('resume', False)
+
+        self.precision = kwargs.get('precision', 'double')
+        assert self.precision in ('single', 'double'), (
+            f"Unknown precision '{self.precision}'.")
+        self.acc_dtype = None
+        if self.precision == 'single' and kwargs.get('accumulate', True):
+            self.acc_dtype = 'float64'
+        default_rate = n_steps // 10 if self.precision == 'single' else 0
+        self.drift_rate = kwargs.get('drift_rate', default_rate)
+        self.drift_tol = kwargs.get('drift_tol', 1e-4)
+        self.fallback = kwargs.get('fallback', True)
+        self.renorm_rate = kwargs.get('renorm_rate', 0)
+        if self.renorm_rate:
+            assert time == 'real', (
+                "Drift corrections only apply to real-time propagation.")
+        self.protocol = kwargs.get('protocol', None)
+        if self.protocol is not None:
+            assert time == 'real', (
+                "Time-dependent protocols only apply to real-time "
+                "propagation.")
+        self.energy_rate = kwargs.get('energy_rate', 0)
+        self.monitor = kwargs.get('monitor', None)
+        if cache_dir:
+            self._check_loop_cache()
+        self.profile = kwargs.get('profile', False)
+        self.scheme = kwargs.get('scheme', 'magic_gamma')
+        if time == 'imag' and not splitting.get_scheme(self.scheme).positive:
+            warnings.warn(f"The splitting scheme '{self.scheme}' has negative "
+                          "sub-steps, which amplify high momenta in "
+                          "imaginary time.")
+
+        # Pre-compute several evolution operators, or reuse cached ones.
+        def build_operators():
+            kin_eng = ttools.fft_order(ttools.pack(
+                ttools.to_tensor(spin.kin_eng_spin, dev=self.device)))
+            pot_eng = ttools.pack(ttools.to_tensor(spin.pot_eng_spin,
+                                                   dev=self.device))
+            coupling = ttools.to_tensor(spin.coupling, dev=self.device)
+            if spin.rot_coupling:
+                expon = jnp.array([0.0])[0]
+            else:
+                expon = 2 * self.kL_recoil * self.space['x_mesh']
+            ops = step_operators(self.t_step, kin_eng, pot_eng,
+                                 coupling if spin.is_coupling else None,
+                                 expon, scheme=self.scheme)
+            if self.precision == 'single':
+                ops = ttools.to_precision(ops, self.precision)
+            return (kin_eng, pot_eng, coupling, expon), ops
+
+        if kwargs.get('op_cache', True):
+            key = (complex(self.t_step), self.device,
+                   np.shape(spin.space['x_mesh']),
+                   op_cache.content_hash(spin.kin_eng_spin, spin.pot_eng_spin,
+                                         spin.coupling, spin.space['x_mesh']),
+                   self.kL_recoil, spin.rot_coupling, spin.is_coupling,
+                   self.precision, self.scheme)
+            grids, ops = op_cache.OPERATORS.get(key, build_operators)
+        else:
+            grids, ops = build_operators()
+        self.kin_eng_spin, self.pot_eng_spin, self.coupling, self.expon = grids
+        self.ops = ops
+        if self.precision == 'single':
+            self.psik = ttools.to_precision(self.psik, self.precision)
+        self.ham = None
+        if self.protocol is not None:
+            self.ham = {'trap': jnp.array(spin.pot_eng),
+                        'detuning': jnp.array(spin.detuning),
+                        'coupling': self.coupling if spin.is_coupling else None,
+                        'expon': self.expon, 't_step': self.t_step}
+
+        # Optionally split the grid across several devices.
+        self.mesh = kwargs.get('mesh', None)
+        if self.mesh is not None:
+            self.mesh = stools.make_mesh(self.mesh)
+            stools.check_shape(self.psik.shape, self.mesh)
+            self.psik = stools.shard(self.psik, self.mesh)
+            self.ops = stools.shard_ops(self.ops, self.mesh)
+            if self.ham is not None:
+                self.ham = stools.shard_grids(self.ham, self.mesh)
+        if kwargs.get('aot', False):
+            self._step_fn = compile_cache.load_step(
+                self, cache_dir if isinstance(cache_dir, str) else None)
+        else:
+            self._set_step_fn()
+
+        # Optionally stop imaginary-time propagation once converged.
+        self.tol = kwargs.get('tol', None)
+        self.criterion = kwargs.get('criterion', 'energy')
+        self.check_rate = kwargs.get('check_rate',
+                                     self.progress_rate or percent)
+        if self.tol is not None:
+            assert time == 'imag', (
+                "Convergence can only be checked in imaginary time.")
+            assert self.criterion in ('energy', 'chem_pot', 'residual'), (
+                f"Unknown convergence criterion '{self.criterion}'.")
+            assert self.n_steps % self.check_rate == 0, (
+                f"The convergence check rate {self.check_rate} does not "
+                f"evenly divide the total number of steps {self.n_steps}.")
+            assert not self.is_sampling, (
+                "Sampling is not supported when checking for convergence.")
+            assert not (self.checkpoint_rate or self.resume), (
+                "Checkpoints are not supported when checking for "
+                "convergence.")
+            assert not (self.energy_rate or self.monitor), (
+                "Energy logging and monitors are not supported when checking "
+                "for convergence.")
+
+        # Optionally adapt the imaginary time step during relaxation.
+        self.adaptive = kwargs.get('adaptive', False)
+        self.dt_bounds = kwargs.get('dt_bounds', (t_step / 16, t_step * 16))
+        self.dt_factor = kwargs.get('dt_factor', 2.0)
+        if self.adaptive:
+            assert self.tol is not None, (
+                "An adaptive time step requires a convergence tolerance.")
+            assert self.dt_bounds[0] <= t_step <= self.dt_bounds[1], (
+                f"The time step {t_step} is outside of the bounds "
+                f"{self.dt_bounds}.")
 
     def prop_loop(self, n_steps):
-        """Evaluate the propagation steps in a for-loop.
+        """Evaluate the propagation steps in a compiled on-device loop.
 
         Saves the spin populations at every time step. If wavefunctions are
-        sampled throughout the propagation, they are saved with the associated
-        sampled times in `trial_data/psik_sampled%s_`folder_name`.npz.
+        sampled throughout the propagation, they are collected on-device in
+        chunks of `sample_chunk` and appended by a background thread, with
+        their times, to the snapshot store
+        `trial_data/psik_sampled%s_`folder_name`.snap; see
+        ``sampling.SnapshotStore``.
+
+        With drift checks, the atom number, and in real time the energy, are
+        compared with their initial values every `drift_rate` steps; see
+        ``check_drift``.
+
+        If a convergence tolerance `tol` is set, the loop stops early once
+        it is reached; the populations then cover only the steps taken, and
+        the number of steps and the convergence history are stored in the
+        result's `n_iter` and `convergence` attributes.
+
+        With `checkpoint_rate`, the state of the loop is saved after the
+        first loop segment ending past each multiple of `checkpoint_rate`
+        steps, and the checkpoint is removed once the loop finishes. With
+        `resume`, the loop continues from a checkpoint with the same loop
+        segments, so the result is identical to that of an uninterrupted
+        propagation; see ``checkpoint``.
+
+        With `energy_rate`, the energy components are evaluated on-device
+        after every `energy_rate` steps, and stored with their times in the
+        result's `energies` attribute. A `monitor` streams its observables
+        to its sinks while the loop runs, and is flushed at the end.
 
         Parameters
         ----------
@@ -218,112 +1248,621 @@ class TensorPropagator:
 
         """
         pop_times = jnp.linspace(0, self.n_steps * jnp.abs(self.t_step), n_steps)
-        pops = {'times': pop_times, 'vals': jnp.empty((n_steps, 2))}
+        pops = {'times': pop_times}
+        state = self._resume(n_steps) if self.resume else None
+        # Steps per unit of the loop bounds.
+        unit = self.sample_rate if self.is_sampling else 1
 
-        # Pre-allocate arrays for efficient sampling.
         if self.is_sampling:
-            n_samples = int(n_steps / self.sample_rate)
-            sampled_psik = jnp.empty((n_samples, 2, *self.psik[0].shape),
-                                    dtype=jnp.complex128)
-            sampled_times = jnp.linspace(0, self.n_steps * jnp.abs(self.t_step),
-                                        n_samples)
+            # Each loop fills the ring buffer once; without sampling, the
+            # whole propagation is a single compiled loop, unless it is split
+            # for drift checks.
+            n_samples = n_steps // self.sample_rate
+            n_chunk = self.sample_chunk
+            samples = jnp.zeros((n_chunk, *self.psik.shape),
+                                dtype=self.psik.dtype)
+            if self.mesh is not None:
+                samples = stools.shard(samples, self.mesh,
+                                       stools.COUPL_SPEC)
+            sampled_times = (np.arange(n_samples) * self.sample_rate
+                             * np.abs(self.t_step))
+
+            if state is None:
+                test_name = self.paths['trial'] + 'psik_sampled'
+                file_name = next_available_path(test_name,
+                                                self.paths['folder'], '.snap')
+            else:
+                file_name = str(state['sampled_path'])
+            writer = sampling.SampleWriter(file_name, samples.shape[1:],
+                                           dtype=samples.dtype,
+                                           fft_order=True,
+                                           compression=self.compression,
+                                           append=state is not None)
+            if state is not None:
+                # Samples written after the checkpoint are taken again.
+                writer.store.truncate(int(state['n_samples']))
+            bounds = [(i, min(n_chunk, n_samples - i))
+                      for i in range(0, n_samples, n_chunk)]
+        elif self.tol is not None or not (self.drift_rate
+                                          or self.checkpoint_rate):
+            file_name = None
+            bounds = [(0, n_steps)]
+        else:
+            file_name = None
+            bounds = self.loop_segments(n_steps)
+
+        check_drift = self.drift_rate and self.tol is None
+        eng_start = None
+        # The energy of a time-dependent Hamiltonian is not conserved.
+        if (check_drift and self.time == 'real' and not self.batched
+                and self.protocol is None):
+            eng_start = float(jnp.sum(self.energy_terms()))
 
-        # Main propagation loop
         vals = []
-        for _i in tqdm(range(n_steps)):
-            if self.is_sampling:
-                if _i % self.sample_rate == 0:
-                    idx = int(_i / self.sample_rate)
-                    sampled_psik[idx] = jnp.array(ttools.to_numpy(self.psik))
+        engs = []
+        step = 0
+        if state is not None:
+            step = int(state['step'])
+            vals.append(state['pops'])
+            if self.energy_rate:
+                engs.append(state['energies'])
+            bounds = [(start, count) for start, count in bounds
+                      if start * unit >= step]
+            if eng_start is not None:
+                eng_start = float(state['eng_start'])
+        ckpt = None
+        if self.checkpoint_rate or self.resume:
+            ckpt = checkpoint.CheckpointWriter(
+                checkpoint.checkpoint_path(self.paths))
 
-            self.full_step(self.psik)
+        tracing = contextlib.nullcontext()
+        if self.profile:
+            from spinor_gpe.pspinor import profiling
+            tracing = jax.profiler.trace(profiling.trace_dir(self.paths,
+                                                             self.profile))
 
-            # Calculate and store populations
-            vals.append(ttools.calc_pops(self.psik, self.space['dv_k']))
-        pops['vals'] = jnp.stack(*vals)
-        energy = self.eng_expect(self.psik)
+        # Main propagation loop
+        with tracing, tqdm(total=n_steps, initial=step) as pbar:
+            _PROGRESS['bar'] = pbar
+            for start, count in bounds:
+                if self.adaptive:
+                    (n_done, n_kept, seg_vals, pops['times'], history,
+                     t_steps, converged) = self.adaptive_steps(n_steps)
+                    n_done = int(n_done)
+                    seg_vals = seg_vals[:n_kept * self.check_rate]
+                    pops['times'] = pops['times'][:n_kept * self.check_rate]
+                elif self.tol is not None:
+                    self.psik, n_done, seg_vals, history, converged = (
+                        self.converge_steps(self.psik, n_steps))
+                    n_done = int(n_done)
+                    seg_vals = seg_vals[:n_done]
+                    pops['times'] = pop_times[:n_done]
+                    n_kept = n_done // self.check_rate
+                elif self.is_sampling:
+                    self.psik, samples, seg_vals = self.sample_steps(
+                        self.psik, samples, count * self.sample_rate,
+                        start * self.sample_rate)
+                    # Drained asynchronously while the next chunk runs.
+                    writer.put(samples, sampled_times[start:start + count])
+                else:
+                    self.psik, seg_vals = self.scan_steps(self.psik, count,
+                                                          start)
+                if self.energy_rate:
+                    seg_vals, seg_engs = seg_vals
+                    engs.append(seg_engs)
+                vals.append(seg_vals)
+                end = (start + count) * unit
+                # With sampling, the checks follow each chunk of samples.
+                if (check_drift
+                        and (self.is_sampling or end % self.drift_rate == 0)
+                        and self.check_drift(seg_vals[-1], eng_start)):
+                    if self.is_sampling:
+                        samples = samples.astype(self.psik.dtype)
+                        # Later samples are stored in double precision too.
+                        writer.call(writer.store.astype, samples.dtype)
+                if (self.checkpoint_rate and end < n_steps
+                        and (end // self.checkpoint_rate
+                             > start * unit // self.checkpoint_rate)):
+                    # Saved in the background while the next segment runs.
+                    saved = {
+                        'psik': self.psik, 'step': end, 'n_steps': n_steps,
+                        't_step': self.t_step,
+                        'time': end * np.abs(self.t_step),
+                        'pops': list(vals), 'precision': self.precision,
+                        'rand_seed': (-1 if self.rand_seed is None
+                                      else self.rand_seed),
+                        'eng_start': (np.nan if eng_start is None
+                                      else eng_start),
+                        'sampled_path': file_name or '',
+                        'n_samples': start + count if self.is_sampling else 0}
+                    if self.energy_rate:
+                        saved['energies'] = list(engs)
+                    if self.is_sampling:
+                        # Queued after the samples, so that they are on disk
+                        # before the checkpoint claims them.
+                        writer.call(ckpt.put, saved)
+                    else:
+                        ckpt.put(saved)
+            jax.effects_barrier()
+            _PROGRESS['bar'] = None
+            if self.monitor is not None:
+                self.monitor.flush()
+            if self.tol is None:
+                pbar.update(n_steps - pbar.n)
+        pops['vals'] = jnp.concatenate(vals)
+        energies = None
+        if self.energy_rate:
+            logged = np.arange(self.energy_rate, n_steps + 1,
+                               self.energy_rate)
+            energies = {'times': logged * np.abs(self.t_step),
+                        'vals': np.asarray(jnp.concatenate(engs))[logged - 1]}
+        if self.protocol is not None:
+            # The final energy is that of the Hamiltonian at the end.
+            pot_eng, coupling = self.protocol.hamiltonian(
+                n_steps * self.t_step, self.ham)
+            self.pot_eng_spin = pot_eng
+            if coupling is not None:
+                self.coupling = coupling
 
         if self.is_sampling:
-            # Saves sampled wavefunctions to file; times are in dimensionless
-            # time units
-            test_name = self.paths['trial'] + 'psik_sampled'
-            file_name = next_available_path(test_name,
-                                            self.paths['folder'], '.npz')
-            np.savez(file_name, psiks=sampled_psik, times=sampled_times)
+            writer.close()
+        if ckpt is not None:
+            ckpt.close(remove=True)
+
+        result = self._make_result(pops, file_name)
+        result.energies = energies
+        if self.tol is not None:
+            n_kept = int(n_kept)
+            result.n_iter = n_done
+            result.convergence = {
+                'criterion': self.criterion, 'tol': self.tol,
+                'converged': bool(converged),
+                'steps': np.arange(1, n_kept + 1) * self.check_rate,
+                'vals': np.asarray(history[:n_kept])}
+            if self.adaptive:
+                result.convergence['t_steps'] = np.asarray(t_steps[:n_kept])
         else:
-            file_name = None
+            result.n_iter = n_steps
+        return result
+
+    def loop_segments(self, n_steps):
+        """The compiled loops of a ``prop_loop`` without sampling.
+
+        The loops end at every drift check and checkpoint, i.e. at the
+        multiples of `drift_rate` and of `checkpoint_rate`, and each loop
+        length is compiled once.
+
+        Parameters
+        ----------
+        n_steps : :obj:`int`
+            The number of propagation steps.
+
+        Returns
+        -------
+        bounds : :obj:`list` of :obj:`tuple`
+            The (first step, number of steps) of each loop.
+
+        """
+        ends = {n_steps}
+        for rate in (self.drift_rate, self.checkpoint_rate):
+            if rate:
+                ends.update(range(rate, n_steps, rate))
+        ends = sorted(ends)
+        return [(start, end - start)
+                for start, end in zip([0] + ends[:-1], ends)]
+
+    def _check_loop_cache(self):
+        """Warn if host callbacks keep the loop out of the persistent cache."""
+        if self.progress_rate or self.monitor is not None:
+            warnings.warn("The propagation loop sends progress or monitor "
+                          "updates through host callbacks, so it is not "
+                          "stored in the persistent compilation cache; set "
+                          "`progress_rate=0` to cache it.")
+
+    def _resume(self, n_steps):
+        """Restore the state of an interrupted ``prop_loop``.
+
+        Parameters
+        ----------
+        n_steps : :obj:`int`
+            The number of propagation steps of the loop.
+
+        Returns
+        -------
+        state : :obj:`dict`
+            The checkpoint; see ``checkpoint.load_checkpoint``.
 
-        psik = ttools.to_numpy(self.psik)
+        """
+        path = self.resume
+        if not isinstance(path, str):
+            path = checkpoint.checkpoint_path(self.paths)
+        state = checkpoint.load_checkpoint(path)
+        assert (int(state['n_steps']) == n_steps
+                and complex(state['t_step']) == complex(self.t_step)
+                and state['psik'].shape == self.psik.shape), (
+            f"The checkpoint {path} belongs to a different propagation.")
+        if state['precision'] != self.precision:
+            self.set_precision(str(state['precision']))
+        if state['rand_seed'] >= 0:
+            np.random.seed(int(state['rand_seed']))
+        if state['n_samples'] > 0:
+            n_stored = len(sampling.SnapshotStore(str(state['sampled_path'])))
+            assert n_stored >= state['n_samples'], (
+                f"The checkpoint {path} records {state['n_samples']} samples, "
+                f"but only {n_stored} were written.")
+        self.psik = jnp.asarray(state['psik'])
+        if self.mesh is not None:
+            self.psik = stools.shard(self.psik, self.mesh)
+        return state
+
+    def _make_result(self, pops, file_name):
+        """Collect the final wavefunction and energy into a `PropResult`."""
+        # Gathered to the host, so that a grid split across devices does not
+        # carry its sharding into later propagations of the spinor.
+        psik = ttools.unpack(np.asarray(ttools.centered(self.psik)))
+        energy = self.eng_expect(psik)
         psi = ttools.ifft_2d(psik, ttools.to_numpy(self.space['dr']))
 
         result = prop_result.PropResult(psi, psik, energy, pops, file_name)
         return result
-    
+
+    def step_args(self):
+        """The arguments of ``full_step`` following the wavefunction.
+
+        Returns
+        -------
+        args : :obj:`tuple`
+            (`ops`, the three scattering strengths, `dr`, `dv_r`, `dv_k`,
+            `atom_num`).
+
+        """
+        args = (self.ops, self.g_sc['uu'], self.g_sc['ud'], self.g_sc['dd'],
+                self.space['dr'], self.space['dv_r'], self.space['dv_k'],
+                self.atom_num)
+        if self.precision == 'single':
+            args = ttools.to_precision(args, self.precision)
+        return args
+
+    def _set_step_fn(self):
+        """Select the ``full_step`` kernel of single steps."""
+        step_fn = partial(full_step, acc_dtype=self.acc_dtype)
+        if self.mesh is not None:
+            step_fn = jax.jit(stools.shard_step(step_fn, self.mesh))
+        self._step_fn = step_fn
+
+    def set_precision(self, precision):
+        """Switch the propagation to single or double precision.
+
+        The evolution operators are recomputed from the energy grids in the
+        new precision, and the wavefunction is cast to it.
+
+        Parameters
+        ----------
+        precision : :obj:`str`
+            {'single', 'double'}.
+
+        """
+        self.precision = precision
+        if precision == 'double':
+            self.acc_dtype = None
+        ops = step_operators(self.t_step, self.kin_eng_spin, self.pot_eng_spin,
+                             self.coupling if self.is_coupling else None,
+                             self.expon, scheme=self.scheme)
+        self.psik, self.ops = ttools.to_precision((self.psik, ops), precision)
+        if self.mesh is not None:
+            self.psik = stools.shard(self.psik, self.mesh)
+            self.ops = stools.shard_ops(self.ops, self.mesh)
+        self._set_step_fn()
+
+    def check_drift(self, pops, eng_start=None):
+        """Check the atom number and energy for a loss of precision.
+
+        Parameters
+        ----------
+        pops : :obj:`Array`
+            The current populations of the spin components.
+        eng_start : :obj:`float`, optional
+            The initial total energy, for real-time propagation.
+
+        Returns
+        -------
+        fell_back : :obj:`bool`
+            True if the propagation switched to double precision.
+
+        """
+        atom_num = np.asarray(self.atom_num)
+        drift = np.max(np.abs(np.sum(pops, axis=-1) - atom_num) / atom_num)
+        if eng_start is not None:
+            eng = float(jnp.sum(self.energy_terms()))
+            drift = max(drift, abs(eng - eng_start) / abs(eng_start))
+        if drift <= self.drift_tol:
+            return False
+
+        if self.precision == 'single' and self.fallback:
+            warnings.warn(f"The relative drift {drift:.2e} exceeds "
+                          f"`drift_tol`={self.drift_tol:.0e}; falling back to "
+                          "double precision.")
+            self.set_precision('double')
+            return True
+        warnings.warn(f"The relative drift {drift:.2e} of the atom number or "
+                      f"energy exceeds `drift_tol`={self.drift_tol:.0e}.")
+        return False
+
+    def energy_terms(self, psik=None):
+        """Compute the energy components on-device; see ``energy_terms``.
+
+        Parameters
+        ----------
+        psik : :obj:`Array`, optional
+            The packed k-space wavefunction. Defaults to `psik`.
+
+        Returns
+        -------
+        energies : :obj:`Array`
+            The (4,) total [<kin.>, <pot.>, <int.>, <coupl.>] energies.
+
+        """
+        if psik is None:
+            psik = self.psik
+        eng_fn = energy_terms
+        if self.batched:
+            eng_fn = jax.vmap(eng_fn, in_axes=ENERGY_AXES)
+        grids = self.eng_grids()
+        return eng_fn(psik, grids['kin'], grids['pot'], grids['coupling'],
+                      grids['expon'], self.g_sc['uu'], self.g_sc['ud'],
+                      self.g_sc['dd'], self.space['dr'], self.space['dv_r'],
+                      self.space['dv_k'])
+
+    def profile_step(self, n_repeats=20, trace=False):
+        """Time the phases of a step; see ``profiling.profile_step``.
+
+        Parameters
+        ----------
+        n_repeats : :obj:`int`, default=20
+            The number of timed calls of each phase.
+        trace : :obj:`bool` or :obj:`str`, default=False
+            Also record a profiler trace of the full steps.
+
+        Returns
+        -------
+        report : :obj:`dict`
+            The time, bytes moved, and bandwidth of each phase and of the
+            fused step; print it with ``profiling.format_report``.
+
+        """
+        from spinor_gpe.pspinor import profiling
+        return profiling.profile_step(self, n_repeats, trace)
+
+    def loop_kwargs(self):
+        """The keyword arguments of ``scan_steps`` set by the propagator.
+
+        Returns
+        -------
+        kwargs : :obj:`dict`
+            All keyword arguments of ``scan_steps`` except the sampling
+            buffer `samples` and the `sample_rate`.
+
+        """
+        return {'batched': self.batched, 'mesh': self.mesh,
+                'acc_dtype': self.acc_dtype, 'renorm_rate': self.renorm_rate,
+                'protocol': self.protocol, 'ham': self.ham,
+                'energy_rate': self.energy_rate,
+                'eng_grids': self.eng_grids() if self.energy_rate else None,
+                'monitor': self.monitor,
+                'monitor_args': self.monitor_args() if self.monitor else None}
+
+    def monitor_args(self):
+        """The arguments of the observables of a ``diagnostics.Monitor``.
+
+        Returns
+        -------
+        args : :obj:`dict` of :obj:`dict`
+            The 'space' arguments shared by all ensemble members: the mesh
+            spacings 'dr', the volume elements 'dv_r' and 'dv_k', the
+            coordinate grids 'x_mesh' and 'y_mesh', the coupling phase
+            'expon', and the duration 't_step' of a step. The 'member'
+            arguments, batched for an ensemble: the 'atom_num', the
+            scattering strengths 'g_uu', 'g_ud', and 'g_dd', and the energy
+            grids 'kin', 'pot', and 'coupling' of ``eng_grids``.
+
+        """
+        grids = self.eng_grids()
+        space = {k: self.space[k] for k in ('dr', 'dv_r', 'dv_k', 'x_mesh',
+                                            'y_mesh')}
+        space.update(expon=grids.pop('expon'), t_step=jnp.abs(self.t_step))
+        member = {'atom_num': self.atom_num, 'g_uu': self.g_sc['uu'],
+                  'g_ud': self.g_sc['ud'], 'g_dd': self.g_sc['dd'], **grids}
+        return {'space': space, 'member': member}
+
+    def eng_grids(self):
+        """The energy grids of ``energy_terms``.
+
+        Returns
+        -------
+        grids : :obj:`dict` of :obj:`Array`
+            The 'kin', 'pot', 'coupling' (`None` without coupling), and
+            'expon' arguments of ``energy_terms``.
+
+        """
+        return {'kin': self.kin_eng_spin, 'pot': self.pot_eng_spin,
+                'coupling': (self.coupling if self.ops['coupl'] is not None
+                             else None),
+                'expon': self.expon}
+
+    def scan_steps(self, psik, n_steps, step_offset=0):
+        """Take `n_steps` full steps in a single compiled loop.
+
+        Parameters
+        ----------
+        psik : :obj:`Array`
+            The packed k-space wavefunction at the start of the loop.
+        n_steps : :obj:`int`
+            The number of full time steps to take.
+        step_offset : :obj:`int`, default=0
+            Global index of the first step, for progress reporting.
+
+        Returns
+        -------
+        psik : :obj:`Array`
+            The packed k-space wavefunction after `n_steps`.
+        pops : :obj:`Array` or :obj:`tuple`
+            The (`n_steps`, 2) populations after each step, and with
+            `energy_rate` the (`n_steps`, 4) energies; see ``scan_steps``.
+
+        """
+        (psik, _), pops = scan_steps(
+            psik, n_steps, self.progress_rate, step_offset,
+            *self.step_args(), **self.loop_kwargs())
+        return psik, pops
+
+    def converge_steps(self, psik, n_steps):
+        """Take at most `n_steps` full steps, stopping once converged.
+
+        Parameters
+        ----------
+        psik : :obj:`Array`
+            The packed k-space wavefunction at the start of the loop.
+        n_steps : :obj:`int`
+            The maximum number of full time steps to take.
+
+        Returns
+        -------
+        psik : :obj:`Array`
+            The packed k-space wavefunction at the end of the loop.
+        n_done : :obj:`Array`
+            The number of full steps taken.
+        pops : :obj:`Array`
+            The (`n_steps`, 2) populations after each step taken.
+        history : :obj:`Array`
+            The convergence measure after each check.
+        converged : :obj:`Array`
+            Whether the tolerance `tol` was reached.
+
+        """
+        return converge_steps(
+            psik, self.tol, n_steps, self.check_rate, self.progress_rate,
+            self.criterion, *self.step_args(), self.kin_eng_spin,
+            self.pot_eng_spin, self.coupling if self.is_coupling else None,
+            self.expon, mesh=self.mesh, acc_dtype=self.acc_dtype)
+
+    def adaptive_steps(self, n_steps):
+        """Relax `psik` with an adaptive imaginary time step.
+
+        The propagator's wavefunction, time steps, and evolution operators
+        are updated to their final values.
+
+        Parameters
+        ----------
+        n_steps : :obj:`int`
+            The maximum number of full time steps to take.
+
+        Returns
+        -------
+        n_done : :obj:`Array`
+            The number of full steps taken, including rejected ones.
+        n_kept : :obj:`Array`
+            The number of accepted blocks of `check_rate` steps.
+        pops : :obj:`Array`
+            The (`n_steps`, 2) populations after each accepted step.
+        times : :obj:`Array`
+            The propagation time of each accepted step.
+        history : :obj:`Array`
+            The convergence measure after each accepted block.
+        t_steps : :obj:`Array`
+            The time step of each accepted block.
+        converged : :obj:`Array`
+            Whether the tolerance `tol` was reached.
+
+        """
+        (self.psik, t_step, ops, n_done, n_kept, pops, times, history,
+         t_steps, converged) = adaptive_steps(
+            self.psik, jnp.abs(self.t_step), self.tol, n_steps,
+            self.check_rate, self.progress_rate, self.criterion,
+            self.dt_bounds[0], self.dt_bounds[1], self.dt_factor,
+            *self.step_args()[1:], self.kin_eng_spin, self.pot_eng_spin,
+            self.coupling if self.is_coupling else None, self.expon,
+            mesh=self.mesh, acc_dtype=self.acc_dtype, scheme=self.scheme)
+        self.t_step = -1.0j * t_step
+        self.ops = ops
+        if self.mesh is not None:
+            self.ops = stools.shard_ops(self.ops, self.mesh)
+        return n_done, n_kept, pops, times, history, t_steps, converged
+
+    def sample_steps(self, psik, samples, n_steps, step_offset=0):
+        """Take `n_steps` full steps, sampling into the `samples` buffer.
+
+        Parameters
+        ----------
+        psik : :obj:`Array`
+            The packed k-space wavefunction at the start of the loop.
+        samples : :obj:`Array`
+            The (`sample_chunk`, 2, Ny, Nx) on-device ring buffer.
+        n_steps : :obj:`int`
+            The number of full time steps to take.
+        step_offset : :obj:`int`, default=0
+            Global index of the first step.
+
+        Returns
+        -------
+        psik : :obj:`Array`
+            The packed k-space wavefunction after `n_steps`.
+        samples : :obj:`Array`
+            The ring buffer, holding the samples taken in this loop.
+        pops : :obj:`Array` or :obj:`tuple`
+            The (`n_steps`, 2) populations after each step, and with
+            `energy_rate` the (`n_steps`, 4) energies; see ``scan_steps``.
+
+        """
+        (psik, samples), pops = scan_steps(
+            psik, n_steps, self.progress_rate, step_offset,
+            *self.step_args(), samples=samples, sample_rate=self.sample_rate,
+            **self.loop_kwargs())
+        return psik, samples, pops
+
     # @partial(jax.jit, static_argnums=(0,))
     def full_step(self,psik):
         """Full step forward in real or imaginary time.
 
         For accuracy, divide the full propagation step into three single steps
-        using the magic gamma time steps.
+        using the magic gamma time steps. A :obj:`list` of components is
+        packed for the step and returned as a :obj:`list`.
         """
-        psik = full_step(psik, self.dt_out, self.eng_out, self. dt_in, self.eng_in, self.g_sc['uu'], self.g_sc['ud'], self.g_sc['dd'], self.space['dr'], self.space['dv_r'], self.space['dv_k'], self.atom_num)
-        # psik = self.single_step(self.dt_out, self.eng_out,psik)  # Outer sub-time step
-        # psik = self.single_step(self.dt_in, self.eng_in,psik)  # Inner sub-time step
-        # psik = self.single_step(self.dt_out, self.eng_out,psik)  # Outer sub-time step
+        is_list = isinstance(psik, list)
+        psik = self._step_fn(ttools.pack(psik), *self.step_args())
+        if is_list:
+            psik = ttools.unpack(psik)
         return psik
     
     def single_step(self, t_step, eng, psik):
-        return single_step(t_step, eng, psik, self.g_sc['uu'], self.g_sc['ud'], self.g_sc['dd'], self.space['dr'], self.space['dv_r'], self.space['dv_k'], self.atom_num)
+        is_list = isinstance(psik, list)
+        psik = single_step(t_step, eng, ttools.pack(psik), self.g_sc['uu'], self.g_sc['ud'], self.g_sc['dd'], self.space['dr'], self.space['dv_r'], self.space['dv_k'], self.atom_num)
+        if is_list:
+            psik = ttools.unpack(psik)
+        return psik
     
     def eng_expect(self, psik):
         """Compute the energy expectation value of the wavefunction.
 
-        To calculate the kinetic energy potion of the energy expectation value,
-        spatial gradients of the phase and square root density must be
-        obtained.
+        The energies are evaluated spectrally on-device by ``energy_terms``:
+        the kinetic energy directly in k-space, so that no phase gradients,
+        and hence no phase unwrapping, are needed.
 
         Parameters
         ----------
-        psik : :obj:`list` of NumPy :obj:`array`
-            The k-space representation of wavefunction to evaluate.
+        psik : :obj:`list` of :obj:`array`, or :obj:`Array`
+            The centered k-space wavefunction to evaluate, as a list of
+            components or packed; batched with a leading batch axis.
 
-        Notes
-        -----
-        While spatial gradients of the wavefunction's phase can be computed
-        with PyTorch tensors, there is currently not an implementation of the
-        2D phase-unwrapping algorithm. For this this reason, the energy
-        expectation value needs to be computed with NumPy :obj:`arrays`.
+        Returns
+        -------
+        energies : NumPy :obj:`array`
+            The [<total>, <kin.>, <pot.>, <int.>] energies, where the total
+            includes the coupling energy; (batch, 4) for a batch.
 
         """
-        assert len(psik) == 2, ("Requires two spinor components to calculate "
-                                "the energy expectation value.")
-        # FIXME: I don't have a lot of confidence in the values generated.
-        # if not isinstance(psik[0], np.ndarray):
-        psik = ttools.to_numpy(psik)
-        delta_r = ttools.to_numpy(self.space['dr'])
-
-        psi = ttools.ifft_2d(psik, delta_r)
-        dens = ttools.density(psi)
-        dens_sqrt = [jnp.sqrt(d) for d in dens]
-
-        phase = ttools.phase(psi, uwrap=True, dens=dens)
-        phase_gradx = [ph_x for ph_x, _ in ttools.grad(phase, delta_r)]
-        phase_gradsq = ttools.grad_sq(phase, delta_r)
-
-        kin = (sum(ttools.grad_sq(dens_sqrt, delta_r))
-               + sum([d * p for d, p in zip(dens, phase_gradsq)])
-               + sum([d * p for d, p in zip(dens, phase_gradx)])
-               * 2 * self.kL_recoil * self.is_coupling) / 2
-
-        pot = sum([d * pot for d, pot in
-                   zip(dens, ttools.to_numpy(self.pot_eng_spin))])
-
-        int_e = (self.g_sc['uu'] * dens[0]**2 + self.g_sc['dd'] * dens[1]**2
-                 + self.g_sc['ud'] * dens[0] * dens[1])
-
-        coupl_e = ((jnp.conj(psi[0]) * psi[1] + jnp.conj(psi[1]) * psi[0])
-                   * ttools.to_numpy(self.coupling) / 2)
-
-        total_eng = jnp.real((kin + pot + int_e + coupl_e).sum())
-        return [total_eng, jnp.real(kin).sum(), jnp.real(pot).sum(),
-                jnp.real(int_e).sum()]
+        psik = ttools.pack(psik)
+        assert psik.shape[-3] == 2, ("Requires two spinor components to "
+                                     "calculate the energy expectation value.")
+        energies = np.asarray(self.energy_terms(ttools.fft_order(psik)))
+        return np.concatenate([energies.sum(axis=-1, keepdims=True),
+                               energies[..., :3]], axis=-1)
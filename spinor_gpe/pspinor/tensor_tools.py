@@ -1,12 +1,14 @@
 """tensor_tools.py module."""
 import operator
-from functools import reduce
+from functools import partial, reduce
 import jax.numpy as jnp
 import numpy as np
 import torch
 from skimage import restoration as rest
 import jax
 
+from spinor_gpe.pspinor import fft_backends
+
 jax.config.update("jax_enable_x64", True)
 # ??? How should the individual FFT operations be normalized? Should they
 # remain as norm="backward", or, because of the nature of our operations,
@@ -77,6 +79,127 @@ def to_tensor(input_arr, dev='cpu', dtype=64):
     return output_tens
 
 
+def to_precision(tree, precision):
+    """Cast the real and complex arrays of a pytree to a given precision.
+
+    Parameters
+    ----------
+    tree : pytree of :obj:`Array` or scalars
+        The arrays to cast, e.g. a dict of evolution operators. Integer
+        arrays and `None` leaves are kept.
+    precision : :obj:`str`
+        {'single', 'double'}: cast to float32 and complex64, or to float64
+        and complex128.
+
+    Returns
+    -------
+    tree : pytree of JAX :obj:`Array`
+        The cast arrays.
+
+    """
+    real, cplx = {'single': (jnp.float32, jnp.complex64),
+                  'double': (jnp.float64, jnp.complex128)}[precision]
+
+    def cast(arr):
+        arr = jnp.asarray(arr)
+        if jnp.iscomplexobj(arr):
+            return arr.astype(cplx)
+        if jnp.issubdtype(arr.dtype, jnp.floating):
+            return arr.astype(real)
+        return arr
+
+    return jax.tree.map(cast, tree)
+
+
+def pack(psi):
+    """Pack a :obj:`list` of spinor components into a single stacked array.
+
+    The packed spinor has the component index along its leading axis, e.g.
+    a (2, Ny, Nx) array for a pseudospinor wavefunction. Nested lists, such
+    as the 2x2 coupling operator, are packed into a (2, 2, Ny, Nx) array.
+    Arrays that are already packed are returned unchanged.
+
+    Parameters
+    ----------
+    psi : :obj:`list` of :obj:`Array`, or :obj:`Array`
+        The spinor components to pack.
+
+    Returns
+    -------
+    packed : JAX :obj:`Array`
+        The stacked spinor.
+
+    """
+    if isinstance(psi, (list, tuple)):
+        return jnp.stack([pack(p) for p in psi])
+    return jnp.asarray(psi)
+
+
+def unpack(psi):
+    """Split a packed spinor array into a :obj:`list` of its components.
+
+    This is the adapter for call sites written for the :obj:`list`-of-arrays
+    wavefunction representation.
+
+    Parameters
+    ----------
+    psi : JAX :obj:`Array` or :obj:`list` of :obj:`Array`
+        The packed spinor. A :obj:`list` is returned unchanged.
+
+    Returns
+    -------
+    components : :obj:`list` of JAX :obj:`Array`
+        The individual spinor components.
+
+    """
+    if isinstance(psi, list):
+        return psi
+    return [psi[i] for i in range(psi.shape[0])]
+
+
+def fft_order(psik):
+    """Move the zero-momentum component of `psik` to the grid origin.
+
+    Wavefunctions and kinetic energy grids are stored with the zero-momentum
+    component centered, as returned by ``fft_2d``. The propagators instead
+    keep k-space arrays in the native order of the FFT, which saves two
+    full-grid permutations per transform inside the propagation loop.
+
+    Parameters
+    ----------
+    psik : :obj:`list` of :obj:`Array`, or :obj:`Array`
+        The centered k-space arrays; the shift acts on the last two axes.
+
+    Returns
+    -------
+    psik : :obj:`list` of JAX :obj:`Array`, or JAX :obj:`Array`
+        The arrays in FFT order.
+
+    """
+    if isinstance(psik, list):
+        return [fft_order(pk) for pk in psik]
+    return jnp.fft.ifftshift(jnp.asarray(psik), axes=(-2, -1))
+
+
+def centered(psik):
+    """Center the zero-momentum component of `psik`; inverts ``fft_order``.
+
+    Parameters
+    ----------
+    psik : :obj:`list` of :obj:`Array`, or :obj:`Array`
+        The k-space arrays in FFT order.
+
+    Returns
+    -------
+    psik : :obj:`list` of JAX :obj:`Array`, or JAX :obj:`Array`
+        The centered arrays.
+
+    """
+    if isinstance(psik, list):
+        return [centered(pk) for pk in psik]
+    return jnp.fft.fftshift(jnp.asarray(psik), axes=(-2, -1))
+
+
 def to_cpu(input_tens):
     """Transfers `input_tens` from GPU to CPU memory.
 
@@ -127,88 +250,101 @@ def to_gpu(input_tens, dev='cuda'):
     return output_tens
 
 
-def fft_1d(psi, delta_r=(1, 1), axis=0) -> list:
+def _backend(psi, name=None):
+    """The FFT backend of `psi`, an array or a :obj:`list` of components."""
+    if isinstance(psi, (list, tuple)):
+        psi = psi[0]
+    return fft_backends.for_array(psi, name)
+
+
+def _transform(psi, func):
+    """Apply `func` to each component of a :obj:`list`, or to an array."""
+    if isinstance(psi, (list, tuple)):
+        return [func(p) for p in psi]
+    return func(psi)
+
+
+def fft_1d(psi, delta_r=(1, 1), axis=0, backend=None) -> list:
     """Compute the forward 1D FFT of `psi` along a single axis.
 
     Parameters
     ----------
-    psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
-        The input wavefunction.
+    psi : :obj:`list` of NumPy :obj:`array`, PyTorch :obj:`Tensor`, or JAX
+        :obj:`Array`
+        The input wavefunction; may also be a packed (2, Ny, Nx) array.
     delta_r : NumPy :obj:`array`, default=(1,1)
         A two-element list of the real-sapce x- and y-mesh spacings,
         respectively.
     axis : :obj:`int`, default=0
-        The axis along which to transform; note that 0 -> y-axis, and
-        1 -> x-axis.
+        The axis along which to transform; note that 0 -> x-axis, and
+        1 -> y-axis.
+    backend : :obj:`str`, optional
+        The FFT backend of NumPy arrays; see ``fft_backends.for_array``.
 
     Returns
     -------
-    psik_axis : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+    psik_axis : :obj:`list` of NumPy :obj:`array`, PyTorch :obj:`Tensor`, or
+        JAX :obj:`Array`
         The FFT of psi along `axis`.
 
     """
-    true_ax = [1, 0]
+    true_ax = [-1, -2]  # Makes the x/y axes correspond to 0/1
     normalization = delta_r[axis] / np.sqrt(2 * np.pi)
-
-    if isinstance(psi[0], np.ndarray):
-        psik_axis = [np.fft.fftn(p, axes=[true_ax[axis]]) * normalization
-                     for p in psi]
-        psik_axis = [np.fft.fftshift(pk, axes=true_ax[axis])
-                     for pk in psik_axis]
-    elif isinstance(psi[0], torch.Tensor):
-        psik_axis = [torch.fft.fftn(p, dim=[true_ax[axis]]) * normalization
-                     for p in psi]
-        psik_axis = [torch.fft.fftshift(pk, dim=true_ax[axis])
-                     for pk in psik_axis]
-
-    return psik_axis
+    fft = _backend(psi, backend)
+    axes = [true_ax[axis]]
+    return _transform(psi, lambda p: fft.fftshift(
+        fft.fftn(p, axes=axes) * normalization, axes=axes))
 
 
-def ifft_1d(psik, delta_r=(1, 1), axis=0) -> list:
+def ifft_1d(psik, delta_r=(1, 1), axis=0, backend=None) -> list:
     """Compute the inverse 1D FFT of `psi` along a single axis.
 
     Parameters
     ----------
-    psik : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
-        The input wavefunction.
+    psik : :obj:`list` of NumPy :obj:`array`, PyTorch :obj:`Tensor`, or JAX
+        :obj:`Array`
+        The input wavefunction; may also be a packed (2, Ny, Nx) array.
     delta_r : NumPy :obj:`array`, default=(1,1)
         A two-element list of the real-sapce x- and y-mesh spacings,
         respectively.
     axis : :obj:`int`, default=0
         The axis along which to transform; note that 0 -> x-axis, and
         1 -> y-axis.
+    backend : :obj:`str`, optional
+        The FFT backend of NumPy arrays; see ``fft_backends.for_array``.
 
     Returns
     -------
-    psi_axis : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
+    psi_axis : :obj:`list` of NumPy :obj:`array`, PyTorch :obj:`Tensor`, or
+        JAX :obj:`Array`
         The FFT of psi along `axis`.
 
     """
-    true_ax = [1, 0]  # Makes the x/y axes correspond to 0/1
+    true_ax = [-1, -2]  # Makes the x/y axes correspond to 0/1
     normalization = delta_r[axis] / np.sqrt(2 * np.pi)
-    if isinstance(psik[0], np.ndarray):
-        psi_axis = [np.fft.ifftshift(pk, axes=true_ax[axis]) for pk in psik]
-        psi_axis = [np.fft.ifftn(p, axes=[true_ax[axis]]) / normalization
-                    for p in psi_axis]
-    elif isinstance(psik[0], torch.Tensor):
-        psi_axis = [torch.fft.ifftshift(pk, dim=true_ax[axis]) for pk in psik]
-        psi_axis = [torch.fft.ifftn(p, dim=true_ax[axis]) / normalization
-                    for p in psi_axis]
-
-    return psi_axis
-
-@jax.jit
-def fft_2d(psi, delta_r=(1, 1)) -> list:
-    print("Recompiling fft2d")
+    fft = _backend(psik, backend)
+    axes = [true_ax[axis]]
+    return _transform(psik, lambda pk: fft.ifftn(
+        fft.ifftshift(pk, axes=axes), axes=axes) / normalization)
+
+
+def fft_2d(psi, delta_r=(1, 1), shift=True, backend=None) -> list:
     """Compute the forward 2D FFT of `psi`.
 
     Parameters
     ----------
     psi : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
-        The input wavefunction.
+        The input wavefunction; may also be a packed (2, Ny, Nx) array, in
+        which case a packed array is returned.
     delta_r : NumPy :obj:`array`, default=(1,1)
         A two-element list of the real-space x- and y-mesh spacings,
         respectively. Typically, use `ps.space['dr']`.
+    shift : :obj:`bool`, default=True
+        Center the zero-momentum component of the output. If False, the
+        output is left in FFT order (see ``fft_order``).
+    backend : :obj:`str`, optional
+        The FFT backend of NumPy arrays; see ``fft_backends.for_array``.
+        JAX arrays are transformed in a compiled, batched 'jax' FFT.
 
     Returns
     -------
@@ -216,37 +352,33 @@ def fft_2d(psi, delta_r=(1, 1)) -> list:
         The k-space FFT of the input wavefunction.
 
     """
-
-    if isinstance(psi[0], np.ndarray):
-        normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
-        psik = [np.fft.fftn(p) * normalization for p in psi]
-        psik = [np.fft.fftshift(pk) for pk in psik]
-
-    elif isinstance(psi[0], torch.Tensor):
-        normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
-        psik = [torch.fft.fftn(p) * normalization for p in psi]
-        psik = [torch.fft.fftshift(pk) for pk in psik]
-    else:
-        normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)  #: FFT normalization factor
-        psik = [jnp.fft.fftn(p) * normalization for p in psi]
-        psik = [jnp.fft.fftshift(pk) for pk in psik]
-
-        return list(psi)
+    fft = _backend(psi, backend)
+    if fft.name == 'jax':
+        return _fft_2d_jax(psi, delta_r, shift=shift)
+    normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
+    psik = _transform(psi, lambda p: fft.fftn(p) * normalization)
+    if shift:
+        psik = _transform(psik, fft.fftshift)
     return psik
 
-@jax.jit
-def ifft_2d(psik, delta_r=(1, 1)) -> list:
-    print("Recompiling ifft2d")
 
+def ifft_2d(psik, delta_r=(1, 1), shift=True, backend=None) -> list:
     """Compute the inverse 2D FFT of `psik`.
 
     Parameters
     ----------
     psik : :obj:`list` of NumPy :obj:`array` or PyTorch :obj:`Tensor`
-        The input wavefunction.
+        The input wavefunction; may also be a packed (2, Ny, Nx) array, in
+        which case a packed array is returned.
     delta_r : NumPy :obj:`array`, default=(1,1)
         A two-element list of the real-sapce x- and y-mesh spacings,
         respectively. Typically, use `ps.space['dr']`.
+    shift : :obj:`bool`, default=True
+        If False, the input is taken to be in FFT order rather than
+        centered.
+    backend : :obj:`str`, optional
+        The FFT backend of NumPy arrays; see ``fft_backends.for_array``.
+        JAX arrays are transformed in a compiled, batched 'jax' FFT.
 
     Returns
     -------
@@ -254,26 +386,43 @@ def ifft_2d(psik, delta_r=(1, 1)) -> list:
         The real-space FFT of the input wavefunction.
 
     """
+    fft = _backend(psik, backend)
+    if fft.name == 'jax':
+        return _ifft_2d_jax(psik, delta_r, shift=shift)
+    normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
+    if shift:
+        psik = _transform(psik, fft.ifftshift)
+    return _transform(psik, lambda pk: fft.ifftn(pk) / normalization)
+
+
+@partial(jax.jit, static_argnames=('shift',))
+def _fft_2d_jax(psi, delta_r, shift=True):
+    """``fft_2d`` of JAX arrays, batched over the packed components."""
+    fft = fft_backends.get_backend('jax')
+    normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)
+    psik = fft.fftn(pack(psi)) * normalization
+    if shift:
+        psik = fft.fftshift(psik)
+    if isinstance(psi, list):
+        psik = unpack(psik)
+    return psik
 
-    if isinstance(psik[0], np.ndarray):
-        normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
-        psik = [np.fft.ifftshift(pk) for pk in psik]
-        psi = [np.fft.ifftn(p) / normalization for p in psik]
-
-    elif isinstance(psik[0], torch.Tensor):
-        normalization = prod(delta_r) / (2 * np.pi)  #: FFT normalization factor
-        psik = [torch.fft.ifftshift(pk) for pk in psik]
-        psi = [torch.fft.ifftn(p) / normalization for p in psik]
-    else:
-        normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)  #: FFT normalization factor
-        psik = [jnp.fft.ifftshift(pk) for pk in psik]
-        psi = [jnp.fft.ifftn(p) / normalization for p in psik]
 
-        return psi
+@partial(jax.jit, static_argnames=('shift',))
+def _ifft_2d_jax(psik, delta_r, shift=True):
+    """``ifft_2d`` of JAX arrays, batched over the packed components."""
+    fft = fft_backends.get_backend('jax')
+    normalization = (delta_r[0]*delta_r[1]) / (2 * jnp.pi)
+    psi = pack(psik)
+    if shift:
+        psi = fft.ifftshift(psi)
+    psi = fft.ifftn(psi) / normalization
+    if isinstance(psik, list):
+        psi = unpack(psi)
     return psi
 
 
-def norm(psi, vol_elem, atom_num, pop_frac=None):
+def norm(psi, vol_elem, atom_num, pop_frac=None, acc_dtype=None):
     """
     Normalize spinor wavefunction to the expected atom numbers and populations.
 
@@ -285,13 +434,18 @@ def norm(psi, vol_elem, atom_num, pop_frac=None):
     Parameters
     ----------
     psi : :obj:`list` of NumPy :obj:`arrays` or PyTorch :obj:`Tensors`.
-        The wavefunction to normalize.
+        The wavefunction to normalize; may also be a packed JAX
+        :obj:`Array`, in which case packed arrays are returned.
     vol_elem : :obj:`float`
         Volume element for either real- or k-space.
     atom_num : :obj:`int`
         The total expected atom number.
     pop_frac : array-like, optional
         The expected population fractions in each spin component.
+    acc_dtype : :obj:`str`, optional
+        For a packed JAX :obj:`Array`, the dtype in which the density is
+        summed, e.g. 'float64' for a single-precision wavefunction. The
+        results keep the precision of `psi`.
 
     Returns
     -------
@@ -322,15 +476,16 @@ def norm(psi, vol_elem, atom_num, pop_frac=None):
             raise NotImplementedError("Normalizing to the expected population "
                                       "fractions is not implemented for "
                                       "PyTorch tensors.")
-    else:
+    elif isinstance(psi, list):
         norm_factor = jnp.sum(dens[0] + dens[1]) * vol_elem / atom_num
-        # psi_norm = [psi[0]/jnp.sqrt(norm_factor),psi[1]/jnp.sqrt(norm_factor)]
-        psi_norm = []
-        for p in psi:
-            # print(p/jnp.sqrt(norm_factor))
-            psi_norm.append(p / jnp.sqrt(norm_factor))
-        # psi_norm = [p / jnp.sqrt(norm_factor) for p in psi]
+        psi_norm = [p / jnp.sqrt(norm_factor) for p in psi]
         dens_norm = [d / norm_factor for d in dens]
+    else:
+        # Packed spinor: a single reduction over all components.
+        norm_factor = jnp.sum(dens, dtype=acc_dtype) * vol_elem / atom_num
+        norm_factor = norm_factor.astype(dens.dtype)
+        psi_norm = psi / jnp.sqrt(norm_factor)
+        dens_norm = dens / norm_factor
     return psi_norm, dens_norm
 
 
@@ -622,6 +777,26 @@ def coupling_op(t_step, coupling=None, expon=torch.tensor(0)):
     return coupl_op
 
 
+def apply_coupling(coupl_op, psi):
+    """Apply a 2x2 coupling operator to a packed spinor.
+
+    Parameters
+    ----------
+    coupl_op : JAX :obj:`Array`
+        The packed (2, 2, Ny, Nx) coupling operator, e.g. ``pack`` of the
+        result of ``coupling_op``.
+    psi : JAX :obj:`Array`
+        The packed (2, Ny, Nx) spinor wavefunction.
+
+    Returns
+    -------
+    psi_coupl : JAX :obj:`Array`
+        The packed spinor after the coupling operation.
+
+    """
+    return jnp.einsum('ij...,j...->i...', coupl_op, psi)
+
+
 def prod(factors):
     """General function for multiplying the elements of a 1D data structure.
 
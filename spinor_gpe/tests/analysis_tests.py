@@ -0,0 +1,48 @@
+"""Test script for the analysis.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import jax.numpy as jnp  # noqa: E402
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import analysis  # noqa: E402
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_analyze_samples():
+    """Compare the streamed time series with per-frame calculations."""
+    ps = make_spinor()
+    n_samples = 6
+    res, prop = ps.real(DT, n_samples, is_sampling=True, n_samples=n_samples,
+                        progress_rate=0)
+    res.space = ps.space
+    series = res.analyze_samples(spin=ps, chunk=4)
+    times, psiks = res.load_samples()
+    assert np.array_equal(series['times'], times)
+    assert series['com'].shape == (n_samples, 2, 2)
+
+    for i, psik in enumerate(psiks):
+        psi = ttools.ifft_2d(list(psik), ps.space['dr'])
+        dens = ttools.density(psi)
+        assert np.allclose(series['pops'][i],
+                           ttools.calc_pops(psi, ps.space['dv_r']))
+        com_x = [np.sum(d * ps.space['x_mesh']) / np.sum(d) for d in dens]
+        assert np.allclose(series['com'][i, :, 0], com_x)
+        overlap = np.sum(dens[0] * dens[1])
+        sep = 1 - overlap / np.sqrt(np.sum(dens[0]**2) * np.sum(dens[1]**2))
+        assert np.isclose(series['separation'][i], sep)
+        energies = prop.energy_terms(ttools.fft_order(jnp.asarray(psik)))
+        assert np.allclose(series['energies'][i], energies)
+    # The chunking does not change the results.
+    whole = analysis.analyze(np.asarray(psiks), ps.space, chunk=64)
+    assert np.allclose(whole['width'], series['width'])
+    print("Test `test_analyze_samples` passed.")
+
+
+if __name__ == "__main__":
+    test_analyze_samples()
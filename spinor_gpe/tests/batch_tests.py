@@ -0,0 +1,82 @@
+"""Test script for the batch_propagator.py module.
+
+A small parameter sweep is propagated as one batch and compared against
+separate propagations of each member.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.pspinor import batch_propagator as bprop  # noqa: E402
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+from spinor_gpe.pspinor import op_cache  # noqa: E402
+from spinor_gpe.pspinor import compile_cache  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor)
+
+MESH = (32, 32)
+DT = 1/50
+
+
+@cleans_data
+def test_sweep_matches_serial():
+    """Compare a batched coupling sweep with serial propagations."""
+    ps = make_spinor(coupling=False)
+    ps.coupling_setup(wavel=790.1e-9, kin_shift=True)
+    values = np.array([0.0, 0.5, 1.0]) * ps.EL_recoil
+    couplings = [np.ones_like(ps.space['x_mesh']) * v for v in values]
+    g_scs = [dict(ps.g_sc, ud=ps.g_sc['ud'] * f) for f in (1.0, 0.5, 1.5)]
+
+    n_steps = 4
+    n_cached = len(op_cache.OPERATORS)
+    prop = bprop.BatchPropagator.from_sweep(
+        ps, DT, n_steps, {'coupling': couplings, 'g_sc': g_scs})
+    # The members' operators are not kept alive by the cache.
+    assert len(op_cache.OPERATORS) == n_cached
+    assert prop.is_coupling is True
+    res = prop.prop_loop(n_steps)
+
+    assert res.batch_size == 3
+    assert res.pops['vals'].shape == (n_steps, 3, 2)
+    assert res.eng_final.shape == (3, 4)
+    for i, (coupl, g_sc) in enumerate(zip(couplings, g_scs)):
+        ps.coupling = coupl
+        ps.g_sc = g_sc
+        single = tprop.TensorPropagator(ps, DT, n_steps)
+        psik = ttools.centered(single.scan_steps(single.psik, n_steps)[0])
+        member = res.select(i)
+        assert np.allclose(np.array(member.psik), psik, rtol=1e-10,
+                           atol=1e-10)
+        assert member.pops['vals'].shape == (n_steps, 2)
+    print("Test `test_sweep_matches_serial` passed.")
+
+
+@cleans_data
+def test_batch_options():
+    """Compile one step kernel for the batch, not one per member."""
+    ps = make_spinor()
+    g_scs = [dict(ps.g_sc, ud=ps.g_sc['ud'] * f) for f in (1.0, 0.5)]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        try:
+            prop = bprop.BatchPropagator.from_sweep(
+                ps, DT, 4, {'g_sc': g_scs}, aot=True,
+                compile_cache=cache_dir, checkpoint_rate=2)
+            assert len(os.listdir(os.path.join(cache_dir, 'aot'))) == 1
+        finally:
+            compile_cache.disable_persistent_cache()
+        assert prop.checkpoint_rate == 2 and prop.progress_rate == 0
+        assert all(m.checkpoint_rate == 0 for m in prop.members)
+        expected = prop.full_step(prop.psik)
+        prop._set_step_fn()  # pylint: disable=protected-access
+        assert np.allclose(prop.full_step(prop.psik), expected)
+    print("Test `test_batch_options` passed.")
+
+
+if __name__ == "__main__":
+    test_sweep_matches_serial()
+    test_batch_options()
@@ -0,0 +1,82 @@
+"""Test script for the spinor_gpe.bench package."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.bench import cli  # noqa: E402
+from spinor_gpe.bench import roofline  # noqa: E402
+from spinor_gpe.bench import store as bstore  # noqa: E402
+
+
+def test_run_and_compare():
+    """Run all cases on a small grid, and flag a slower run."""
+    with tempfile.TemporaryDirectory() as path:
+        assert cli.main(['--store', path, 'run', '--grids', '16x16', '--batch',
+                         '1', '2', '--repeats', '3', '--label', 'base',
+                         '--stream-size', '4096']) == 0
+        results = bstore.ResultStore(path)
+        base = results.load('base')
+        assert base['schema'] == bstore.SCHEMA_VERSION
+        assert len(base['results']) == 6 * 2
+        assert all(r['median'] > 0 and np.isfinite(r['throughput'])
+                   for r in base['results'])
+        assert base['stream'] > 0
+
+        # A run is not flagged against itself.
+        assert cli.main(['--store', path, 'compare', 'base', 'base']) == 0
+
+        slow = [dict(r, median=2 * r['median'] + 1, mad=0.0)
+                if r['case'] == 'fft' else r for r in base['results']]
+        results.save(slow, 'slow')
+        assert results.runs()[-1] == 'slow'
+        rows = bstore.compare(base, results.load('slow'))
+        flagged = {row['key'][0] for row in rows
+                   if row['status'] == 'regression'}
+        assert flagged == {'fft'}
+        assert cli.main(['--store', path, 'compare', 'base']) == 1
+    print("Test `test_run_and_compare` passed.")
+
+
+def test_roofline():
+    """Count the operations of the cases, and report a run's roofline."""
+    n_points = 16 * 32
+    cost = roofline.case_cost('fft', (16, 32), 'complex64', batch=3)
+    assert np.isclose(cost['flops'], 5 * n_points * np.log2(n_points) * 6)
+    assert cost['bytes'] == 2 * n_points * 6 * 8
+
+    step = roofline.case_cost('full_step', (16, 32))
+    loop = roofline.case_cost('loop', (16, 32), loop_steps=4)
+    assert loop['flops'] == 4 * step['flops']
+    assert 0 < step['fft_flops'] < step['flops']
+    uncoupled = roofline.case_cost('full_step', (16, 32), coupled=False,
+                                   imag=False)
+    assert uncoupled['bytes'] < step['bytes']
+
+    result = {'median': 1e-3, **step}
+    point = roofline.roofline(result, bandwidth=step['bytes'] / 1e-3)
+    assert np.isclose(point['stream'], 1) and point['bound'] == 'memory'
+    point = roofline.roofline(result, bandwidth=100 * step['bytes'] / 1e-3)
+    assert point['bound'] == 'overhead'
+    result = {'median': 1e-3, **cost}
+    point = roofline.roofline(result, bandwidth=100 * cost['bytes'] / 1e-3)
+    assert point['bound'] == 'fft'
+
+    with tempfile.TemporaryDirectory() as path:
+        assert cli.main(['--store', path, 'run', '--cases', 'hadamard',
+                         'loop', '--grids', '16x16', '--repeats', '3',
+                         '--no-stream']) == 0
+        assert bstore.ResultStore(path).load(
+            bstore.ResultStore(path).runs()[-1])['stream'] is None
+        # The bandwidth is measured when the run lacks it.
+        assert cli.main(['--store', path, 'roofline', '--stream-size',
+                         '4096']) == 0
+    print("Test `test_roofline` passed.")
+
+
+if __name__ == "__main__":
+    test_run_and_compare()
+    test_roofline()
@@ -0,0 +1,135 @@
+"""Test script for the checkpoint.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import checkpoint  # noqa: E402
+from spinor_gpe.pspinor import sampling as psampling  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_resume():
+    """Resume an interrupted loop, with and without sampling."""
+    n_steps = 12
+    for sampling in ({}, {'is_sampling': True, 'n_samples': 6,
+                          'sample_chunk': 2}):
+        ps = make_spinor()
+        kwargs = dict(time='real', progress_rate=0, checkpoint_rate=4,
+                      energy_rate=3, **sampling)
+        ref = tprop.TensorPropagator(ps, DT, n_steps, **kwargs)
+        ref = ref.prop_loop(n_steps)
+        path = checkpoint.checkpoint_path(ps.paths)
+        assert not os.path.exists(path)
+
+        # Interrupt the loop during its third segment.
+        prop = tprop.TensorPropagator(ps, DT, n_steps, **kwargs)
+        name = 'sample_steps' if sampling else 'scan_steps'
+        steps_fn = getattr(prop, name)
+        calls = []
+
+        def interrupted(*args, fn=steps_fn, calls=calls):
+            calls.append(None)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return fn(*args)
+        setattr(prop, name, interrupted)
+        try:
+            prop.prop_loop(n_steps)
+        except KeyboardInterrupt:
+            pass
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        assert checkpoint.load_checkpoint(path)['step'] in (4, 8)
+
+        prop = tprop.TensorPropagator(ps, DT, n_steps, resume=True, **kwargs)
+        res = prop.prop_loop(n_steps)
+        assert np.array_equal(res.psik, ref.psik)
+        assert np.array_equal(res.pops['vals'], ref.pops['vals'])
+        assert np.array_equal(res.energies['vals'], ref.energies['vals'])
+        if sampling:
+            times, psiks = res.load_samples()
+            ref_times, ref_psiks = ref.load_samples()
+            assert np.array_equal(times, ref_times)
+            assert np.array_equal(psiks, ref_psiks)
+        assert not os.path.exists(path)
+    print("Test `test_resume` passed.")
+
+
+@cleans_data
+def test_unwritten_samples():
+    """A checkpoint only records samples that are on disk."""
+    n_steps = 12
+    ps = make_spinor()
+    kwargs = dict(time='real', progress_rate=0, checkpoint_rate=4,
+                  is_sampling=True, n_samples=6, sample_chunk=2)
+    prop = tprop.TensorPropagator(ps, DT, n_steps, **kwargs)
+    calls = []
+
+    def interrupted(*args, fn=prop.sample_steps):
+        calls.append(None)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return fn(*args)
+    prop.sample_steps = interrupted
+    try:
+        prop.prop_loop(n_steps)
+    except KeyboardInterrupt:
+        pass
+    path = checkpoint.checkpoint_path(ps.paths)
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.05)
+    state = checkpoint.load_checkpoint(path)
+    store = psampling.SnapshotStore(str(state['sampled_path']))
+    assert len(store) >= state['n_samples'] > 0
+
+    # Samples lost after the checkpoint was written are detected on resume.
+    store.truncate(int(state['n_samples']) - 1)
+    try:
+        tprop.TensorPropagator(ps, DT, n_steps, resume=True,
+                               **kwargs).prop_loop(n_steps)
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError("Resumed with missing samples.")
+    print("Test `test_unwritten_samples` passed.")
+
+
+@cleans_data
+def test_segments():
+    """Loops end at drift checks and checkpoints, which keep their rates."""
+    n_steps = 20
+    prop = tprop.TensorPropagator(make_spinor(), DT, n_steps, time='real',
+                                  progress_rate=0, drift_rate=10,
+                                  checkpoint_rate=4)
+    counts, checked = [], []
+
+    def scan(psik, count, start, fn=prop.scan_steps):
+        counts.append(count)
+        return fn(psik, count, start)
+
+    def check(pops, eng_start=None, fn=prop.check_drift):
+        checked.append(sum(counts))
+        return fn(pops, eng_start)
+    prop.scan_steps, prop.check_drift = scan, check
+    prop.prop_loop(n_steps)
+    assert counts == [4, 4, 2, 2, 4, 4]
+    assert [count for _, count in prop.loop_segments(n_steps)] == counts
+    assert checked == [10, 20]
+    print("Test `test_segments` passed.")
+
+
+if __name__ == "__main__":
+    test_resume()
+    test_unwritten_samples()
+    test_segments()
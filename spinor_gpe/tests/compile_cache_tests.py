@@ -0,0 +1,108 @@
+"""Test script for the compile_cache.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.abspath('../..'))
+
+import jax  # noqa: E402
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import compile_cache  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_aot_step_roundtrip():
+    """Check that a serialized step kernel matches the jitted step."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        prop = tprop.TensorPropagator(make_spinor(), DT, 1)
+        expected = prop.full_step(prop.psik)
+
+        compiled = compile_cache.load_step(prop, cache_dir)
+        files = os.listdir(os.path.join(cache_dir, 'aot'))
+        assert files == [f"full_step-{compile_cache.step_signature(prop)}-"
+                         f"{compile_cache.jax.default_backend()}-"
+                         f"jax{compile_cache.jax.__version__}-"
+                         f"r{compile_cache.KERNEL_REVISION}.pkl"]
+
+        loaded = compile_cache.load_step(prop, cache_dir)
+        assert loaded is not compiled
+        assert np.array_equal(loaded(prop.psik, *prop.step_args()), expected)
+    print("Test `test_aot_step_roundtrip` passed.")
+
+
+@cleans_data
+def test_uncoupled_signature():
+    """Check that the uncoupled step skips the coupling operator."""
+    prop = tprop.TensorPropagator(make_spinor(coupling=False), DT, 1)
+    assert prop.ops['coupl'] is None
+    assert '-uncoupled-magic_gamma-imag-' in compile_cache.step_signature(
+        prop)
+
+    ident = np.broadcast_to(np.eye(2)[:, :, None, None],
+                            (2, 2, *prop.psik.shape[1:]))
+    args = list(prop.step_args())
+    args[0] = {**args[0], 'coupl': (ident,) * len(args[0]['dt'])}
+    assert np.allclose(prop.full_step(prop.psik),
+                       tprop.full_step(prop.psik, *args),
+                       rtol=1e-12, atol=1e-12)
+    print("Test `test_uncoupled_signature` passed.")
+
+
+@cleans_data
+def test_time_signature():
+    """Check that real- and imaginary-time kernels are cached apart."""
+    spin = make_spinor()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        imag = tprop.TensorPropagator(spin, DT, 1, aot=True,
+                                      compile_cache=cache_dir)
+        real = tprop.TensorPropagator(spin, DT, 1, time='real', aot=True,
+                                      compile_cache=cache_dir)
+        sig_imag = compile_cache.step_signature(imag)
+        sig_real = compile_cache.step_signature(real)
+        assert '-imag-' in sig_imag and '-real-' in sig_real
+        assert len(os.listdir(os.path.join(cache_dir, 'aot'))) == 2
+        expected = tprop.full_step(real.psik, *real.step_args())
+        assert np.allclose(real.full_step(real.psik), expected)
+    compile_cache.disable_persistent_cache()
+    assert jax.config.jax_compilation_cache_dir is None
+    print("Test `test_time_signature` passed.")
+
+
+@cleans_data
+def test_loop_cached():
+    """Check that a later propagation loads its loop from the cache."""
+    events = []
+
+    def listener(event, **_):
+        events.append(event)
+
+    jax.monitoring.register_event_listener(listener)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                # Drops the in-memory caches, as in a new process.
+                jax.clear_caches()
+                # The progress bar is off by default, so the loop is cached.
+                prop = tprop.TensorPropagator(make_spinor(), DT, 20,
+                                              compile_cache=cache_dir)
+                assert prop.progress_rate == 0
+                events.clear()
+                prop.prop_loop(20)
+        hits = events.count('/jax/compilation_cache/cache_hits')
+        misses = events.count('/jax/compilation_cache/cache_misses')
+        assert hits > 0 and misses == 0, (hits, misses)
+    finally:
+        jax.monitoring.unregister_event_listener(listener)
+        compile_cache.disable_persistent_cache()
+    print("Test `test_loop_cached` passed.")
+
+
+if __name__ == "__main__":
+    test_aot_step_roundtrip()
+    test_uncoupled_signature()
+    test_time_signature()
+    test_loop_cached()
@@ -0,0 +1,59 @@
+"""Test script for the diagnostics.py module."""
+# pylint: disable=wrong-import-position
+import csv
+import json
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import jax.numpy as jnp  # noqa: E402
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import diagnostics  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_monitor_sinks():
+    """Stream observables into memory, CSV, and JSON Lines sinks."""
+    ps = make_spinor()
+    n_steps, rate = 12, 4
+    csv_path = os.path.join(ps.paths['data'], 'diag.csv')
+    jsonl_path = os.path.join(ps.paths['data'], 'diag.jsonl')
+    observables = {'pops': 'pops', 'energy': 'energy', 'com': 'com',
+                   'norm_drift': 'norm_drift',
+                   'peak': lambda psik, args: jnp.max(jnp.abs(psik))}
+    monitor = diagnostics.Monitor(
+        observables, rate=rate,
+        sinks=[diagnostics.MemorySink(), diagnostics.CSVSink(csv_path),
+               diagnostics.JSONLSink(jsonl_path)])
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='real',
+                                  monitor=monitor, energy_rate=rate,
+                                  progress_rate=0)
+    res = prop.prop_loop(n_steps)
+    monitor.close()
+
+    data = monitor.sinks[0].data
+    assert monitor.n_rows == n_steps // rate
+    assert np.array_equal(data['step'], [4, 8, 12])
+    assert np.allclose(data['time'], res.energies['times'])
+    assert np.allclose(data['pops'], res.pops['vals'][rate - 1::rate])
+    assert np.allclose(data['energy'], res.energies['vals'])
+    assert np.allclose(data['norm_drift'], 0, atol=1e-10)
+    assert data['com'].shape == (3, 2, 2)
+
+    with open(csv_path, newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0][:4] == ['step', 'time', 'pops_0', 'pops_1']
+    assert 'com_1_0' in rows[0] and len(rows) == 4
+    assert np.allclose(np.array(rows[1:], dtype=float)[:, 2:4], data['pops'])
+    with open(jsonl_path) as file:
+        lines = [json.loads(line) for line in file]
+    assert np.allclose([line['energy'] for line in lines], data['energy'])
+    print("Test `test_monitor_sinks` passed.")
+
+
+if __name__ == "__main__":
+    test_monitor_sinks()
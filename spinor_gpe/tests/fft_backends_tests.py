@@ -0,0 +1,128 @@
+"""Test script for the FFT backends of the tensor_tools module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import jax.numpy as jnp  # noqa: E402
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+
+from spinor_gpe.pspinor import fft_backends  # noqa: E402
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+
+SHAPE = (32, 64)
+DELTA_R = (0.25, 0.125)
+
+
+def _spinor(seed=0):
+    """A random two-component wavefunction."""
+    rng = np.random.default_rng(seed)
+    return [rng.normal(size=SHAPE) + 1j * rng.normal(size=SHAPE)
+            for _ in range(2)]
+
+
+def test_host_backends():
+    """Every available host backend matches NumPy, and round-trips."""
+    psi = _spinor()
+    ref = [np.fft.fftshift(np.fft.fftn(p)) * np.prod(DELTA_R) / (2 * np.pi)
+           for p in psi]
+    names = fft_backends.available()
+    assert 'numpy' in names and 'scipy' in names
+    assert 'jax' not in names and 'jax' in fft_backends.available(False)
+    for name in names:
+        psik = ttools.fft_2d(psi, DELTA_R, backend=name)
+        assert isinstance(psik, list) and isinstance(psik[0], np.ndarray)
+        assert all(np.allclose(pk, rk) for pk, rk in zip(psik, ref)), name
+        back = ttools.ifft_2d(psik, DELTA_R, backend=name)
+        assert all(np.allclose(b, p) for b, p in zip(back, psi)), name
+
+    # Packed arrays stay packed.
+    packed = ttools.fft_2d(np.stack(psi), DELTA_R, shift=False,
+                           backend='scipy')
+    assert packed.shape == (2, *SHAPE)
+    assert np.allclose(packed, np.fft.ifftshift(ref, axes=(-2, -1)))
+    print("Test `test_host_backends` passed.")
+
+
+def test_array_types():
+    """JAX arrays and PyTorch tensors keep their types, in 1D and 2D."""
+    psi = _spinor(1)
+    for axis in (0, 1):
+        ref = ttools.fft_1d(psi, DELTA_R, axis=axis, backend='numpy')
+        jax_k = ttools.fft_1d([jnp.asarray(p) for p in psi], DELTA_R, axis)
+        torch_k = ttools.fft_1d([torch.from_numpy(p) for p in psi], DELTA_R,
+                                axis)
+        packed_k = ttools.fft_1d(jnp.asarray(np.stack(psi)), DELTA_R, axis)
+        assert isinstance(jax_k[0], jnp.ndarray)
+        assert isinstance(torch_k[0], torch.Tensor)
+        for i in range(2):
+            assert np.allclose(jax_k[i], ref[i])
+            assert np.allclose(torch_k[i].numpy(), ref[i])
+            assert np.allclose(packed_k[i], ref[i])
+        back = ttools.ifft_1d(jax_k, DELTA_R, axis)
+        assert all(np.allclose(b, p) for b, p in zip(back, psi))
+
+    # Two 1D transforms make a 2D transform.
+    twice = ttools.fft_1d(ttools.fft_1d(psi, DELTA_R, 0), DELTA_R, 1)
+    assert all(np.allclose(t, k) for t, k
+               in zip(twice, ttools.fft_2d(psi, DELTA_R))), "1D x 1D != 2D"
+    psik = ttools.fft_2d([jnp.asarray(p) for p in psi], DELTA_R)
+    assert all(np.allclose(pk, rk) for pk, rk in zip(psik, twice))
+    psik = ttools.fft_2d([torch.from_numpy(p) for p in psi], DELTA_R)
+    assert all(np.allclose(pk.numpy(), rk) for pk, rk in zip(psik, twice))
+    print("Test `test_array_types` passed.")
+
+
+def test_selection():
+    """The default backend of host arrays is fixed, or opts in to timing."""
+    times = fft_backends.benchmark(SHAPE, n_repeats=2)
+    assert set(times) == set(fft_backends.available())
+    assert all(t > 0 for t in times.values())
+    name = fft_backends.fastest(SHAPE)
+    assert name in times and fft_backends.fastest(SHAPE) == name
+    assert fft_backends.for_array(np.zeros(SHAPE)).name == (
+        fft_backends.DEFAULT_HOST)
+    assert fft_backends.for_array(np.zeros(SHAPE), 'auto').name == name
+    assert fft_backends.for_array(jnp.zeros(SHAPE)).name == 'jax'
+
+    try:
+        fft_backends.set_default('auto')
+        assert fft_backends.for_array(np.zeros(SHAPE)).name == name
+        fft_backends.set_default('numpy')
+        assert fft_backends.for_array(np.zeros(SHAPE)).name == 'numpy'
+        for bad in ('jax', 'no_such_backend'):
+            try:
+                fft_backends.set_default(bad)
+            except AssertionError:
+                pass
+            else:
+                raise AssertionError(f"Set the default to '{bad}'.")
+    finally:
+        fft_backends.set_default()
+
+    # A registered backend is a candidate of the selection.
+    class Slow(fft_backends.NumpyBackend):
+        """A slower NumPy backend."""
+
+        name = 'slow'
+
+        def fftn(self, arr, axes=fft_backends.AXES_2D):
+            for _ in range(5):
+                out = np.fft.fftn(arr, axes=axes)
+            return out
+
+    fft_backends.register(Slow())
+    try:
+        assert 'slow' in fft_backends.benchmark(SHAPE, n_repeats=2)
+        assert fft_backends.fastest(SHAPE) != 'slow'
+    finally:
+        del fft_backends.BACKENDS['slow']
+        fft_backends._FASTEST.clear()  # pylint: disable=protected-access
+    print("Test `test_selection` passed.")
+
+
+if __name__ == "__main__":
+    test_host_backends()
+    test_array_types()
+    test_selection()
@@ -0,0 +1,54 @@
+"""Test script for the op_cache.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import op_cache  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_propagators_share_operators():
+    """Check that operators are reused until the Hamiltonian changes."""
+    op_cache.OPERATORS.clear()
+    ps = make_spinor()
+    first = tprop.TensorPropagator(ps, DT, 10)
+    second = tprop.TensorPropagator(ps, DT, 20)
+    assert second.ops['kin'] is first.ops['kin']
+    assert second.kin_eng_spin is first.kin_eng_spin
+
+    ps.coupling_uniform(0.25 * ps.EL_recoil)
+    changed = tprop.TensorPropagator(ps, DT, 10)
+    uncached = tprop.TensorPropagator(ps, DT, 10, op_cache=False)
+    assert changed.ops['coupl'] is not first.ops['coupl']
+    assert uncached.ops['coupl'] is not changed.ops['coupl']
+    assert np.array_equal(uncached.ops['coupl'], changed.ops['coupl'])
+    assert len(op_cache.OPERATORS) == 2
+    print("Test `test_propagators_share_operators` passed.")
+
+
+def test_lru_eviction():
+    """Check that the least recently used entries are evicted first."""
+    cache = op_cache.OperatorCache(max_bytes=3 * 8 * 100)
+    for key in 'abc':
+        cache.get(key, lambda: np.zeros(100))
+    cache.get('a', lambda: None)
+    cache.get('d', lambda: np.zeros(100))
+
+    assert 'b' not in cache and 'a' in cache and 'd' in cache
+    assert cache.nbytes == 3 * 8 * 100
+    assert (cache.hits, cache.misses) == (1, 4)
+
+    cache.get('big', lambda: np.zeros(1000))
+    assert 'big' not in cache and len(cache) == 3
+    print("Test `test_lru_eviction` passed.")
+
+
+if __name__ == "__main__":
+    test_propagators_share_operators()
+    test_lru_eviction()
@@ -0,0 +1,42 @@
+"""Test script for the profiling.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import profiling  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+@cleans_data
+def test_profile_step():
+    """Time the phases of a step, and trace a propagation loop."""
+    for coupling, time in ((True, 'imag'), (False, 'real')):
+        prop = tprop.TensorPropagator(make_spinor(coupling), DT, 4,
+                                      time=time, progress_rate=0,
+                                      profile=True)
+        report = prop.profile_step(n_repeats=3)
+        phases = report['phases']
+        assert ('coupling' in phases) == coupling
+        assert ('norm' in phases) == (time == 'imag')
+        # Magic-gamma steps have three real-space sub-steps.
+        assert phases['fft']['calls'] == 3 and phases['kinetic']['calls'] == 4
+        assert all(p['time'] > 0 and p['bytes'] > 0 for p in phases.values())
+        assert report['full_step']['time'] > 0
+        table = profiling.format_report(report)
+        assert 'full_step' in table and 'interaction' in table
+
+    prop.prop_loop(4)
+    traces = [f for _, _, files in os.walk(profiling.trace_dir(prop.paths))
+              for f in files]
+    assert any(f.endswith('.xplane.pb') for f in traces)
+    assert np.isfinite(report['full_step']['bandwidth'])
+    print("Test `test_profile_step` passed.")
+
+
+if __name__ == "__main__":
+    test_profile_step()
@@ -0,0 +1,81 @@
+"""Test script for the prop_result.py module."""
+# pylint: disable=wrong-import-position
+import os
+import shutil
+import sys
+import warnings
+sys.path.insert(0, os.path.abspath('../..'))
+
+import matplotlib  # noqa: E402
+from matplotlib import pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import prop_result  # noqa: E402
+from spinor_gpe.pspinor import sampling  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+def test_rebin():
+    """Rebin stacked arrays and lists of components by averaging."""
+    arr = np.arange(2 * 4 * 6, dtype=float).reshape(2, 4, 6)
+    binned = prop_result.rebin(arr, (2, 3))
+    assert binned.shape == (2, 2, 3)
+    assert np.isclose(binned[0, 0, 0], arr[0, :2, :2].mean())
+    assert np.allclose(prop_result.rebin(list(arr), (2, 3)), binned)
+    # Larger shapes leave the grid as it is.
+    assert prop_result.rebin(arr, (8, 8)) is arr
+    print("Test `test_rebin` passed.")
+
+
+@cleans_data
+def test_movie_images():
+    """Render movie frames in a thread pool and in the calling thread."""
+    ps = make_spinor()
+    n_samples = 6
+    res, _ = ps.imaginary(DT, n_samples, is_sampling=True,
+                          n_samples=n_samples, progress_rate=0)
+    res.paths, res.space = ps.paths, ps.space
+
+    backend, figures = matplotlib.get_backend(), plt.get_fignums()
+    images = np.stack(list(res.movie_images(new_shape=(16, 16), n_workers=1,
+                                            batch=4)))
+    assert images.shape[0] == n_samples and images.dtype == np.uint8
+    # Rendering in-process leaves pyplot as it was.
+    assert matplotlib.get_backend() == backend
+    assert plt.get_fignums() == figures
+    assert not np.array_equal(images[0], images[-1])
+    pooled = np.stack(list(res.movie_images(new_shape=(16, 16), n_workers=2,
+                                            batch=2)))
+    assert np.array_equal(images, pooled)
+    assert plt.get_fignums() == figures
+    print("Test `test_movie_images` passed.")
+
+
+@cleans_data
+def test_empty_movie():
+    """Warn, rather than fail, when a movie has no frames."""
+    ps = make_spinor()
+    res, _ = ps.imaginary(DT, 2, is_sampling=True, n_samples=2,
+                          progress_rate=0)
+    res.paths, res.space = ps.paths, ps.space
+    sampling.SnapshotStore(res.sampled_path).truncate(0)
+
+    which = shutil.which
+    # The frames run out before ffmpeg would be started.
+    shutil.which = lambda name: '/usr/bin/' + name
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            res.make_movie(new_shape=(16, 16), n_workers=1)
+    finally:
+        shutil.which = which
+    assert any('No wavefunctions were sampled' in str(w.message)
+               for w in caught)
+    print("Test `test_empty_movie` passed.")
+
+
+if __name__ == "__main__":
+    test_rebin()
+    test_movie_images()
+    test_empty_movie()
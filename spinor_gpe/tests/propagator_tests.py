@@ -0,0 +1,330 @@
+"""Test script for the tensor_propagator.py module.
+
+Small grids are propagated for a handful of steps, and the compiled loops are
+checked self-consistently against the single-step functions they replace.
+"""
+# pylint: disable=wrong-import-position
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import batch_propagator as bprop  # noqa: E402
+from spinor_gpe.pspinor import pspinor as spin  # noqa: E402
+from spinor_gpe.pspinor import splitting  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.pspinor import tensor_tools as ttools  # noqa: E402
+
+MESH = (32, 32)
+DT = 1/50
+#: The temporary data directories of the spinors of the running test.
+DATA_DIRS = []
+
+
+def make_spinor(coupling=True):
+    """Create a small `PSpinor` in a temporary data directory.
+
+    The directory is removed when the test, decorated with `cleans_data`,
+    returns.
+    """
+    path = tempfile.mkdtemp() + os.sep
+    DATA_DIRS.append(path)
+    ps = spin.PSpinor(path, overwrite=True, atom_num=1e3, mesh_points=MESH,
+                      r_sizes=(8, 8))
+    if coupling:
+        ps.coupling_setup(wavel=790.1e-9, kin_shift=True)
+        ps.coupling_uniform(0.5 * ps.EL_recoil)
+    return ps
+
+
+def cleans_data(test):
+    """Remove the data directories that `test` creates with `make_spinor`."""
+    @functools.wraps(test)
+    def wrapped(*args, **kwargs):
+        try:
+            return test(*args, **kwargs)
+        finally:
+            while DATA_DIRS:
+                shutil.rmtree(DATA_DIRS.pop(), ignore_errors=True)
+    return wrapped
+
+
+@cleans_data
+def test_scan_matches_full_step():
+    """Compare the compiled loop with repeated `full_step` calls."""
+    ps = make_spinor()
+    n_steps = 5
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='imag')
+
+    psik_loop = prop.psik
+    for _ in range(n_steps):
+        psik_loop = prop.full_step(psik_loop)
+    psik_scan, pops = prop.scan_steps(prop.psik, n_steps)
+
+    for pk_loop, pk_scan in zip(psik_loop, psik_scan):
+        assert np.allclose(pk_loop, pk_scan, rtol=1e-12, atol=1e-12)
+    assert pops.shape == (n_steps, 2)
+    assert np.allclose(pops.sum(axis=1), ps.atom_num)
+    print("Test `test_scan_matches_full_step` passed.")
+
+
+@cleans_data
+def test_fused_full_step():
+    """Compare the fused `full_step` with its separate Strang sub-steps."""
+    weights = {'magic_gamma': [splitting.MAGIC_GAMMA,
+                               1 - 2 * splitting.MAGIC_GAMMA,
+                               splitting.MAGIC_GAMMA],
+               'yoshida6': splitting.get_scheme('yoshida6').real}
+    for coupling in (True, False):
+        for time, scheme in (('imag', 'magic_gamma'), ('real', 'magic_gamma'),
+                             ('real', 'yoshida6')):
+            prop = tprop.TensorPropagator(make_spinor(coupling), DT, 1,
+                                          time=time, scheme=scheme)
+            psik = prop.psik
+            for weight in weights[scheme]:
+                ops = tprop.step_operators(
+                    prop.t_step * weight, prop.kin_eng_spin,
+                    prop.pot_eng_spin,
+                    prop.coupling if coupling else None, prop.expon,
+                    scheme='strang')
+                eng = {k: None if v is None else v[0]
+                       for k, v in ops.items()}
+                psik = prop.single_step(eng['dt'], eng, psik)
+            assert np.allclose(prop.full_step(prop.psik), psik, rtol=1e-10,
+                               atol=1e-10)
+    print("Test `test_fused_full_step` passed.")
+
+
+@cleans_data
+def test_real_time_renorm():
+    """Check the unnormalized real-time loop and its drift corrections."""
+    ps = make_spinor()
+    n_steps, rate = 12, 4
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='real')
+    psik, pops = prop.scan_steps(prop.psik, n_steps)
+    assert np.allclose(pops.sum(axis=1), ps.atom_num, rtol=1e-10)
+
+    corrected = tprop.TensorPropagator(ps, DT, n_steps, time='real',
+                                       renorm_rate=rate)
+    psik_c, pops_c = corrected.scan_steps(corrected.psik, n_steps)
+    assert np.allclose(psik_c, psik, rtol=1e-10, atol=1e-10)
+    # Corrected steps restore the atom number up to rounding.
+    assert np.allclose(pops_c[rate - 1::rate].sum(axis=1), ps.atom_num,
+                       rtol=1e-14)
+    print("Test `test_real_time_renorm` passed.")
+
+
+@cleans_data
+def test_prop_loop_pops():
+    """Check the populations and progress reporting of `prop_loop`."""
+    ps = make_spinor()
+    n_steps = 8
+    res, prop = ps.imaginary(DT, n_steps, progress_rate=3)
+
+    assert prop.progress_rate == 3
+    assert res.pops['vals'].shape == (n_steps, 2)
+    assert np.allclose(np.sum(res.pops['vals'], axis=1), ps.atom_num)
+    print("Test `test_prop_loop_pops` passed.")
+
+
+@cleans_data
+def test_sampling_ring_buffer():
+    """Check that sampled wavefunctions match an unsampled propagation."""
+    ps = make_spinor()
+    n_steps, n_samples = 12, 6
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='imag')
+    psik = prop.psik
+    expected = []
+    for i in range(n_steps):
+        if i % (n_steps // n_samples) == 0:
+            expected.append(np.array(ttools.centered(psik)))
+        psik = prop.full_step(psik)
+
+    # A chunk of 4 leaves a partial chunk at the end of the record.
+    res, _ = ps.imaginary(DT, n_steps, is_sampling=True, n_samples=n_samples,
+                          sample_chunk=4)
+    times, psiks = res.load_samples()
+
+    assert psiks.shape == (n_samples, 2, *MESH[::-1])
+    assert len(times) == n_samples
+    assert np.allclose(psiks, np.array(expected), rtol=1e-12, atol=1e-12)
+    print("Test `test_sampling_ring_buffer` passed.")
+
+
+@cleans_data
+def test_packed_list_adapter():
+    """Compare packed and :obj:`list`-based calls of the step functions."""
+    ps = make_spinor()
+    prop = tprop.TensorPropagator(ps, DT, 1, time='imag')
+
+    psik_list = prop.full_step(ttools.unpack(prop.psik))
+    psik_packed = prop.full_step(prop.psik)
+
+    assert isinstance(psik_list, list) and len(psik_list) == 2
+    assert psik_packed.shape == (2, *MESH[::-1])
+    assert np.array_equal(ttools.pack(psik_list), psik_packed)
+
+    psi_list = ttools.ifft_2d(psik_list, prop.space['dr'])
+    psi_packed = ttools.ifft_2d(psik_packed, prop.space['dr'])
+    assert np.allclose(ttools.pack(psi_list), psi_packed)
+    print("Test `test_packed_list_adapter` passed.")
+
+
+@cleans_data
+def test_fft_order_layout():
+    """Check that only the propagator's internal k-space arrays are shifted."""
+    ps = make_spinor()
+    res, prop = ps.imaginary(DT, 4)
+
+    # Results are centered, and consistent with their real-space wavefunction.
+    assert np.allclose(ttools.pack(res.psik),
+                       ttools.fft_2d(ttools.pack(res.psi), prop.space['dr']))
+    assert np.allclose(ttools.fft_order(ttools.pack(res.psik)), prop.psik)
+    assert np.allclose(ttools.centered(prop.kin_eng_spin),
+                       ttools.pack(ps.kin_eng_spin))
+    # Unshifted transforms of FFT-ordered arrays agree with shifted ones.
+    psi = ttools.ifft_2d(prop.psik, prop.space['dr'], shift=False)
+    assert np.allclose(psi, ttools.pack(res.psi))
+    print("Test `test_fft_order_layout` passed.")
+
+
+@cleans_data
+def test_converge_early_stop():
+    """Check that imaginary-time propagation stops once converged."""
+    ps = make_spinor()
+    n_steps, check_rate = 400, 20
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='imag', tol=1e-3,
+                                  check_rate=check_rate)
+    psik_start = prop.psik
+    res = prop.prop_loop(n_steps)
+    conv = res.convergence
+
+    assert conv['converged'] and res.n_iter < n_steps
+    assert res.n_iter % check_rate == 0
+    assert conv['vals'][-1] < 1e-3 <= conv['vals'][-2]
+    assert res.pops['vals'].shape == (res.n_iter, 2)
+
+    # The converged state matches a plain loop of the same length.
+    psik_scan, _ = prop.scan_steps(psik_start, res.n_iter)
+    assert np.allclose(ttools.pack(res.psik), ttools.centered(psik_scan),
+                       rtol=1e-12,
+                       atol=1e-12)
+    print("Test `test_converge_early_stop` passed.")
+
+
+@cleans_data
+def test_adaptive_time_step():
+    """Check that the adaptive time step relaxes below the fixed-step energy."""
+    ps = make_spinor()
+    n_steps = 2000
+
+    def final_energy(prop):
+        eng = tprop.energy_terms(prop.psik, prop.kin_eng_spin,
+                                 prop.pot_eng_spin, prop.coupling, prop.expon,
+                                 prop.g_sc['uu'], prop.g_sc['ud'],
+                                 prop.g_sc['dd'], prop.space['dr'],
+                                 prop.space['dv_r'], prop.space['dv_k'])
+        return float(np.sum(eng))
+
+    fixed = tprop.TensorPropagator(ps, DT, n_steps, tol=1e-5, check_rate=20)
+    res_fixed = fixed.prop_loop(n_steps)
+    prop = tprop.TensorPropagator(ps, DT, n_steps, tol=1e-5, check_rate=20,
+                                  adaptive=True)
+    res = prop.prop_loop(n_steps)
+    t_steps = res.convergence['t_steps']
+
+    assert res.convergence['converged']
+    assert res.n_iter <= res_fixed.n_iter
+    assert t_steps[0] == DT and t_steps[-1] == DT / 16
+    assert np.isclose(np.abs(prop.t_step), DT / 16)
+    assert np.all(np.diff(res.pops['times']) > 0)
+    assert len(res.pops['times']) == len(res.pops['vals'])
+    assert final_energy(prop) < final_energy(fixed)
+    print("Test `test_adaptive_time_step` passed.")
+
+
+@cleans_data
+def test_single_precision():
+    """Compare single- and double-precision propagation, and the fallback."""
+    ps = make_spinor()
+    n_steps = 20
+    double = tprop.TensorPropagator(ps, DT, n_steps)
+    single = tprop.TensorPropagator(ps, DT, n_steps, precision='single')
+    assert single.ops['coupl'][0].dtype == np.complex64
+
+    psik_double, _ = double.scan_steps(double.psik, n_steps)
+    psik_single, pops = single.scan_steps(single.psik, n_steps)
+    assert psik_single.dtype == np.complex64 and pops.dtype == np.float64
+    assert np.allclose(psik_single, psik_double,
+                       atol=1e-4 * np.abs(psik_double).max())
+
+    # An unreachable tolerance forces the switch to double precision.
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='real',
+                                  precision='single', drift_rate=10,
+                                  drift_tol=1e-12)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        res = prop.prop_loop(n_steps)
+    assert 'falling back' in str(caught[0].message)
+    assert prop.precision == 'double' and prop.psik.dtype == np.complex128
+    assert res.pops['vals'].shape == (n_steps, 2)
+    print("Test `test_single_precision` passed.")
+
+
+@cleans_data
+def test_energy_logging():
+    """Compare the energies logged in the loop with `energy_terms`."""
+    ps = make_spinor()
+    n_steps, rate = 12, 4
+    prop = tprop.TensorPropagator(ps, DT, n_steps, time='real',
+                                  energy_rate=rate, progress_rate=0)
+    psik = prop.psik
+    expected = []
+    for _ in range(n_steps // rate):
+        psik, _ = prop.scan_steps(psik, rate)
+        expected.append(prop.energy_terms(psik))
+    res = prop.prop_loop(n_steps)
+
+    assert np.allclose(res.energies['times'], np.arange(1, 4) * rate * DT)
+    assert np.allclose(res.energies['vals'], expected, rtol=1e-10)
+    # The final energy comes from the same spectral functional.
+    assert np.isclose(res.eng_final[0], np.sum(expected[-1]), rtol=1e-10)
+    assert np.allclose(res.eng_final[1:], expected[-1][:3], rtol=1e-10)
+    print("Test `test_energy_logging` passed.")
+
+
+@cleans_data
+def test_unknown_option():
+    """Reject misspelled options, also through `PSpinor` and batches."""
+    ps = make_spinor()
+    calls = [lambda: tprop.TensorPropagator(ps, DT, 4, checkpoint_rte=2),
+             lambda: ps.imaginary(DT, 4, precison='single'),
+             lambda: bprop.BatchPropagator([ps, ps], DT, 4, aot_=True)]
+    for call in calls:
+        try:
+            call()
+        except AssertionError as ex:
+            assert 'Unknown propagator options' in str(ex)
+        else:
+            raise AssertionError("Accepted a misspelled option.")
+    print("Test `test_unknown_option` passed.")
+
+
+if __name__ == "__main__":
+    test_scan_matches_full_step()
+    test_fused_full_step()
+    test_real_time_renorm()
+    test_prop_loop_pops()
+    test_sampling_ring_buffer()
+    test_packed_list_adapter()
+    test_fft_order_layout()
+    test_converge_early_stop()
+    test_adaptive_time_step()
+    test_single_precision()
+    test_energy_logging()
+    test_unknown_option()
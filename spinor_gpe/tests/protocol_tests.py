@@ -0,0 +1,68 @@
+"""Test script for the protocol.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import protocol  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor)
+
+DT = 1 / 500
+
+
+def test_schedules():
+    """Evaluate piecewise schedules and a protocol on the host."""
+    seq = protocol.Protocol(coupling=protocol.ramp([0, 1], [0, 2]),
+                            detuning=0.5,
+                            trap=protocol.steps([0, 1], [1, 0]))
+    factors = seq.sample([-1, 0.25, 1, 2])
+    assert np.allclose(factors['coupling'], [0, 0.5, 2, 2])
+    assert np.allclose(factors['detuning'], 0.5)
+    assert np.allclose(factors['trap'], [1, 1, 0, 0])
+    print("Test `test_schedules` passed.")
+
+
+@cleans_data
+def test_constant_protocol():
+    """A protocol of constant factors reproduces a static propagation."""
+    ps = make_spinor()
+    ps.detuning_uniform(0.2 * ps.EL_recoil)
+    n_steps = 20
+    kwargs = {'time': 'real', 'progress_rate': 0}
+    prop = tprop.TensorPropagator(ps, DT, n_steps, **kwargs)
+    prop_seq = tprop.TensorPropagator(ps, DT, n_steps,
+                                      protocol=protocol.Protocol(), **kwargs)
+    psik, _ = prop.scan_steps(prop.psik, n_steps)
+    psik_seq, _ = prop_seq.scan_steps(prop_seq.psik, n_steps)
+    assert np.allclose(psik, psik_seq, rtol=1e-12, atol=1e-12)
+    print("Test `test_constant_protocol` passed.")
+
+
+@cleans_data
+def test_switch_off():
+    """Switching off the coupling matches two consecutive propagations."""
+    ps = make_spinor()
+    n_on, n_off = 10, 15
+    kwargs = {'time': 'real', 'progress_rate': 0}
+    seq = protocol.Protocol(coupling=protocol.steps([0, n_on * DT], [1, 0]))
+    prop_seq = tprop.TensorPropagator(ps, DT, n_on + n_off, protocol=seq,
+                                      **kwargs)
+    psik_seq, _ = prop_seq.scan_steps(prop_seq.psik, n_on + n_off)
+
+    prop_on = tprop.TensorPropagator(ps, DT, n_on, **kwargs)
+    psik, _ = prop_on.scan_steps(prop_on.psik, n_on)
+    ps.coupling_uniform(0)
+    prop_off = tprop.TensorPropagator(ps, DT, n_off, **kwargs)
+    psik, _ = prop_off.scan_steps(psik, n_off)
+    assert np.allclose(psik, psik_seq, rtol=1e-10, atol=1e-10)
+    print("Test `test_switch_off` passed.")
+
+
+if __name__ == "__main__":
+    test_schedules()
+    test_constant_protocol()
+    test_switch_off()
@@ -0,0 +1,88 @@
+"""Test script for the sampling.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+import tempfile
+import warnings
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import sampling  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor, DT)
+
+
+def test_snapshot_store():
+    """Append to stores and read them back, with and without compression."""
+    rng = np.random.default_rng(0)
+    frames = rng.normal(size=(5, 2, 4, 6)) + 1j * rng.normal(size=(5, 2, 4, 6))
+    with tempfile.TemporaryDirectory() as folder:
+        for compression in (None, 'zlib', 'lzma'):
+            path = os.path.join(folder, f'psik-{compression}.snap')
+            store = sampling.SnapshotStore.create(path, frames.shape[1:],
+                                                  compression=compression)
+            store.append(frames[:3], [0, 1, 2])
+            store.append(frames[3:], [3, 4])
+
+            store = sampling.SnapshotStore(path)
+            assert store.shape == frames.shape
+            assert np.array_equal(store.times, np.arange(5))
+            assert np.array_equal(store[-1], frames[-1])
+            assert np.array_equal(store[1:4], frames[1:4])
+            assert np.array_equal(store[::2], frames[::2])
+            assert np.array_equal(np.asarray(store), frames)
+            assert isinstance(store[:], np.memmap) == (compression is None)
+
+        # Widening the dtype keeps the stored samples.
+        path = os.path.join(folder, 'psik-single.snap')
+        store = sampling.SnapshotStore.create(path, frames.shape[1:],
+                                              np.complex64, 'zlib')
+        store.append(frames[:3], [0, 1, 2])
+        store.astype(np.complex128)
+        store.append(frames[3:], [3, 4])
+        store = sampling.SnapshotStore(path)
+        assert store.dtype == np.complex128 and len(store) == 5
+        assert np.array_equal(store[:3], frames[:3].astype(np.complex64))
+        assert np.array_equal(store[3:], frames[3:])
+        assert not os.path.exists(path + '.tmp')
+    print("Test `test_snapshot_store` passed.")
+
+
+@cleans_data
+def test_compressed_sampling():
+    """Sample a propagation into a compressed store."""
+    n_steps, n_samples = 8, 4
+    results = [make_spinor().imaginary(DT, n_steps, is_sampling=True,
+                                       n_samples=n_samples, sample_chunk=3,
+                                       progress_rate=0,
+                                       compression=compression)[0]
+               for compression in (None, 'zlib')]
+    times, psiks = results[0].load_samples()
+    times_zip, psiks_zip = results[1].load_samples(mmap=False)
+    assert np.array_equal(times, times_zip)
+    assert np.array_equal(psiks_zip, psiks)
+    print("Test `test_compressed_sampling` passed.")
+
+
+@cleans_data
+def test_fallback_sampling():
+    """Samples taken after a fallback are stored in double precision."""
+    n_steps = 8
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        res, prop = make_spinor().real(DT, n_steps, is_sampling=True,
+                                       n_samples=4, sample_chunk=2,
+                                       progress_rate=0, precision='single',
+                                       drift_rate=4, drift_tol=1e-12)
+    assert any('falling back' in str(w.message) for w in caught)
+    assert prop.precision == 'double'
+    times, psiks = res.load_samples()
+    assert len(times) == 4 and psiks.dtype == np.complex128
+    print("Test `test_fallback_sampling` passed.")
+
+
+if __name__ == "__main__":
+    test_snapshot_store()
+    test_compressed_sampling()
+    test_fallback_sampling()
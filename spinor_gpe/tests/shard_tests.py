@@ -0,0 +1,52 @@
+"""Test script for the shard_tools.py module.
+
+Several CPU devices are emulated so that the split-grid propagation can be
+compared against the single-device propagation on any host. The XLA flag
+only takes effect if this script is run before JAX has been initialized.
+"""
+# pylint: disable=wrong-import-position
+import os
+import sys
+os.environ.setdefault('XLA_FLAGS',
+                      '--xla_force_host_platform_device_count=4')
+sys.path.insert(0, os.path.abspath('../..'))
+
+import jax  # noqa: E402
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor)
+
+MESH = (32, 32)
+DT = 1/50
+N_DEV = min(4, len(jax.devices()))
+
+
+@cleans_data
+def test_sharded_matches_single():
+    """Compare split-grid propagation with single-device propagation."""
+    ps = make_spinor()
+    ps.rot_coupling = False
+
+    n_steps = 4
+    single = tprop.TensorPropagator(ps, DT, n_steps)
+    psik, pops = single.scan_steps(single.psik, n_steps)
+
+    sharded = tprop.TensorPropagator(ps, DT, n_steps, mesh=N_DEV)
+    assert len(sharded.psik.sharding.device_set) == N_DEV
+    psik_sh, pops_sh = sharded.scan_steps(sharded.psik, n_steps)
+
+    assert np.allclose(psik_sh, psik, rtol=1e-10, atol=1e-10)
+    assert np.allclose(pops_sh, pops, rtol=1e-10)
+    assert np.allclose(sharded.full_step(sharded.psik),
+                       single.full_step(single.psik), rtol=1e-10, atol=1e-10)
+
+    res, _ = ps.real(DT / 100, n_steps, is_sampling=True, n_samples=2,
+                     mesh=N_DEV)
+    assert res.load_samples()[1].shape == (2, 2, *MESH[::-1])
+    print(f"Test `test_sharded_matches_single` passed on {N_DEV} devices.")
+
+
+if __name__ == "__main__":
+    test_sharded_matches_single()
@@ -0,0 +1,51 @@
+"""Test script for the splitting.py module."""
+# pylint: disable=wrong-import-position
+import os
+import sys
+sys.path.insert(0, os.path.abspath('../..'))
+
+import numpy as np  # noqa: E402
+
+from spinor_gpe.pspinor import splitting  # noqa: E402
+from spinor_gpe.pspinor import tensor_propagator as tprop  # noqa: E402
+from spinor_gpe.tests.propagator_tests import (  # noqa: E402
+    cleans_data, make_spinor)
+
+
+@cleans_data
+def test_propagator_orders():
+    """Check the convergence order of each scheme in real time."""
+    ps = make_spinor(coupling=False)
+    duration = 0.4
+
+    def run(scheme, n_steps):
+        prop = tprop.TensorPropagator(ps, duration / n_steps, n_steps,
+                                      time='real', progress_rate=0,
+                                      scheme=scheme)
+        return np.asarray(prop.scan_steps(prop.psik, n_steps)[0])
+
+    ref = run('yoshida6', 256)
+    for name, scheme in splitting.SCHEMES.items():
+        errs = [np.abs(run(name, n) - ref).max() for n in (16, 32)]
+        assert abs(np.log2(errs[0] / errs[1]) - scheme.order) < 0.5, name
+    print("Test `test_propagator_orders` passed.")
+
+
+def test_best_scheme():
+    """Check the FFT cost model and the registry lookups."""
+    schemes = splitting.SCHEMES
+    assert schemes['strang'].n_ffts == 2
+    assert schemes['forest_ruth'].kin[0] == splitting.FR_THETA / 2
+    # Tight tolerances favor a high order.
+    assert splitting.best_scheme(1e-12, 1).order == 6
+    assert splitting.best_scheme(1e-12, 1, positive=True).positive
+    for scheme in schemes.values():
+        t_step = scheme.max_step(1e-6, 10)
+        assert np.isclose(10 * scheme.error_const * t_step**scheme.order,
+                          1e-6)
+    print("Test `test_best_scheme` passed.")
+
+
+if __name__ == "__main__":
+    test_propagator_orders()
+    test_best_scheme()